@@ -52,7 +52,6 @@ class ascii2dtm(FusionAlgorithm):
     MULTIPLIER = 'MULTIPLIER'
     OFFSET = 'OFFSET'
     NAN = 'NAN'
-    VERSION64 = 'VERSION64'
     OUTPUT = 'OUTPUT'
 
     def name(self):
@@ -122,9 +121,7 @@ class ascii2dtm(FusionAlgorithm):
                                                      self.tr('Vertical datum'),
                                                      options=[i[0] for i in self.vdatums],
                                                      defaultValue=0))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
         
         params = []
         params.append(QgsProcessingParameterNumber(self.MULTIPLIER,
@@ -156,10 +153,7 @@ class ascii2dtm(FusionAlgorithm):
             raise QgsProcessingException(self.invalidRasterError(parameters, self.INPUT))
 
         arguments = []
-        if self.VERSION64:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'ASCII2DTM64.exe') + '"')
-        else:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'ASCII2DTM.exe') + '"')
+        arguments.append(self.fusionExecutable('ASCII2DTM', parameters, context, feedback))
         
 
         if self.MULTIPLIER in parameters and parameters[self.MULTIPLIER] is not None:
@@ -180,7 +174,7 @@ class ascii2dtm(FusionAlgorithm):
         arguments.append(self.vdatums[self.parameterAsEnum(parameters, self.VDATUM, context)][1])
         arguments.append(inLayer.source())
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         results = {}
         for output in self.outputDefinitions():
@@ -27,6 +27,7 @@ __copyright__ = '(C) 2012, Victor Olaya'
 # This will get replaced with a git SHA1 when you do a git archive
 __revision__ = '$Format:%H$'
 
+import math
 import os
 from qgis.core import (QgsProcessingException,
                        QgsProcessingParameterDefinition,
@@ -40,7 +41,7 @@ from qgis.core import (QgsProcessingException,
                       )
 
 from processing_fusion.fusionAlgorithm import FusionAlgorithm
-from processing_fusion import fusionUtils
+from processing_fusion import fusionTiles, fusionUtils
 
 
 class CanopyModel(FusionAlgorithm):
@@ -57,7 +58,9 @@ class CanopyModel(FusionAlgorithm):
     SLOPE = 'SLOPE'
     CLASS = 'CLASS'
     ASCII = 'ASCII'
-    VERSION64 = 'VERSION64'
+    TILED = 'TILED'
+    TILESIZE = 'TILESIZE'
+    BALANCED = 'BALANCED'
 
     def name(self):
         return 'canopymodel'
@@ -78,7 +81,10 @@ class CanopyModel(FusionAlgorithm):
         return self.tr('CanopyModel creates a canopy surface model using a LIDAR point cloud. By default, the algorithm used by CanopyModel assigns the elevation of the highest return within each grid cell to the grid cell center.'
                     '\n'
                     '\n'
-                    'Multiple files needs to be added manually using a semicolon (;) as separator or use a wildcard (*) to select all las-files in a directory (e.g., /lasfiles/*.las).')
+                    'Multiple files needs to be added manually using a semicolon (;) as separator or use a wildcard (*) to select all las-files in a directory (e.g., /lasfiles/*.las).'
+                    '\n'
+                    '\n'
+                    'Processing in tiles requires the /nofill modifier. CanopyModel fills voids from the surrounding cells however far they extend, which no tile halo can cover, so without /nofill the surface is created in a single run.')
 
     def __init__(self):
         super().__init__()
@@ -94,8 +100,7 @@ class CanopyModel(FusionAlgorithm):
             self.XYUNITS, self.tr('XY Units'), self.UNITS))
         self.addParameter(QgsProcessingParameterEnum(
             self.ZUNITS, self.tr('Z Units'), self.UNITS))
-        self.addParameter(QgsProcessingParameterBoolean(
-            self.VERSION64, self.tr('Use 64-bit version'), True))
+        self.addBuildParameter()
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Output surface'),
                                                                 self.tr('DTM files (*.dtm *.DTM)')))
@@ -123,42 +128,64 @@ class CanopyModel(FusionAlgorithm):
         self.addParameter(slope)
         self.addParameter(QgsProcessingParameterBoolean(
             self.ASCII, self.tr('Add an ASCII output'), False))
+        tiled = QgsProcessingParameterBoolean(
+            self.TILED, self.tr('Process in tiles running in parallel'), False, optional = True)
+        tiled.setFlags(tiled.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
+        self.addParameter(tiled)
+        tileSize = QgsProcessingParameterNumber(
+            self.TILESIZE, self.tr('Tile size (0 for automatic)'), QgsProcessingParameterNumber.Type.Double,
+            minValue = 0, defaultValue = 0, optional = True)
+        tileSize.setFlags(tileSize.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
+        self.addParameter(tileSize)
+        balanced = QgsProcessingParameterBoolean(
+            self.BALANCED, self.tr('Balance tiles by point count'), False, optional = True)
+        balanced.setFlags(balanced.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
+        self.addParameter(balanced)
         self.addAdvancedModifiers()
-        
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
 
     def processAlgorithm(self, parameters, context, feedback):
-        version64 = self.parameterAsBool(parameters, self.VERSION64, context)
-        if version64:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'CanopyModel64.exe') + '"']
-        else:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'CanopyModel.exe') + '"']
-        arguments.append('/verbose')
+        switches = ['/verbose']
         ground = self.parameterAsString(parameters, self.GROUND, context).strip()
         if ground:
-            arguments.append('/ground:' + ground)
+            switches.append('/ground:' + ground)
         median = self.parameterAsString(parameters, self.MEDIAN, context).strip()
         if median:
-            arguments.append('/median:' + median)
+            switches.append('/median:' + median)
         smooth= self.parameterAsString(parameters, self.SMOOTH, context).strip()
         if smooth:
-            arguments.append('/smooth:' + smooth)
+            switches.append('/smooth:' + smooth)
         slope = self.parameterAsBool(parameters, self.SLOPE, context)
         if slope:
-            arguments.append('/slope') 
+            switches.append('/slope') 
         class_var = self.parameterAsString(parameters, self.CLASS, context).strip()
         if class_var:
-            arguments.append('/class:' + class_var)
+            switches.append('/class:' + class_var)
         asciioutput = self.parameterAsBool(parameters, self.ASCII, context)
         if asciioutput:
-            arguments.append('/ascii')
+            switches.append('/ascii')
         
-        self.addAdvancedModifiersToCommands(arguments, parameters, context)
+        self.addAdvancedModifiersToCommands(switches, parameters, context)
 
+        if '/nofill' in self.modifierSwitches(parameters, context):
+            if self.processInTiles('CanopyModel', parameters, context, feedback):
+                return self.processTiles(switches, parameters, context, feedback)
+        elif self.parameterAsBool(parameters, self.TILED, context):
+            feedback.reportError(self.tr('Filled voids may reach beyond the halo of a tile, processing in tiles '
+                                         'requires the /nofill modifier. Running CanopyModel in a single run'))
+
+        arguments = [self.fusionExecutable('CanopyModel', parameters, context, feedback)] + switches
+        arguments.extend(self.gridSwitches(parameters, context, feedback,
+                                           self.parameterAsDouble(parameters, self.CELLSIZE, context)))
         outputFile = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
         arguments.append('"%s"' % outputFile)
+        self.addModelArguments(arguments, parameters, context)
+        self.addInputFilesToCommands(arguments, parameters, self.INPUT, context)        
+
+        self.runCommands(arguments, parameters, context, feedback)
+
+        return self.prepareReturn(parameters)
+
+    def addModelArguments(self, arguments, parameters, context):
         arguments.append(str(self.parameterAsDouble(parameters, self.CELLSIZE, context)))
         arguments.append(self.UNITS[self.parameterAsEnum(parameters, self.XYUNITS, context)][0])
         arguments.append(self.UNITS[self.parameterAsEnum(parameters, self.ZUNITS, context)][0])
@@ -166,8 +193,71 @@ class CanopyModel(FusionAlgorithm):
         arguments.append('0')
         arguments.append('0')
         arguments.append('0')
-        self.addInputFilesToCommands(arguments, parameters, self.INPUT, context)        
 
-        fusionUtils.execute(arguments, feedback)
+    def windowCells(self, parameters, name, context):
+        """
+        Number of cells a filter window reaches beyond its center cell.
+        """
+        value = self.parameterAsString(parameters, name, context).strip()
+        if not value:
+            return 0
+        try:
+            size = int(float(value))
+        except ValueError:
+            raise QgsProcessingException(self.tr('Invalid filter window size: {}').format(value))
+        return max(size, 1) // 2
+
+    def haloCells(self, parameters, context):
+        """
+        Width in cells of the halo a tile needs so that filtering gives its
+        core cells the values of a single run. The median and the mean
+        filter are applied one after the other and the slope looks at the
+        neighbouring cells, so their reaches add up. One more cell keeps
+        the points on the halo edge. Void filling has no bounded reach, so
+        tiles are only used with /nofill.
+        """
+        reach = self.windowCells(parameters, self.MEDIAN, context)
+        reach += self.windowCells(parameters, self.SMOOTH, context)
+        if self.parameterAsBool(parameters, self.SLOPE, context):
+            reach += 1
+        return reach + 1
+
+    def processTiles(self, switches, parameters, context, feedback):
+        """
+        Runs CanopyModel for grid-aligned tiles with a halo in parallel,
+        crops the halo and mosaics the tile surfaces. All tiles use grids on
+        the same lattice, so with voids left unfilled (/nofill) the mosaic
+        equals a single run over the grid of the whole extent.
+        """
+        cellSize = self.parameterAsDouble(parameters, self.CELLSIZE, context)
+        tileSize = self.parameterAsDouble(parameters, self.TILESIZE, context)
+        outputFile = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
+        halo = self.haloCells(parameters, context) * cellSize
+        grid, tiles, executable = self.inputTiles('CanopyModel', parameters, context, feedback,
+                                                  cellSize, tileSize, buffer=halo,
+                                                  balanced=self.parameterAsBool(parameters, self.BALANCED, context))
+        feedback.pushInfo(self.tr('Tiles have a halo of {} cells').format(int(math.ceil(halo / cellSize))))
+
+        commandLists = []
+        directories = []
+        outputs = []
+        for tile in tiles:
+            directory = self.tileDirectory(tile)
+            tileOutput = os.path.join(directory, os.path.basename(outputFile))
+            xmin, ymin, xmax, ymax = tile.bounds(halo)
+            commands = [executable] + switches
+            commands.append('/grid:{},{},{},{}'.format(xmin, ymin, xmax - xmin, ymax - ymin))
+            commands.append('"%s"' % tileOutput)
+            self.addModelArguments(commands, parameters, context)
+            self.addFilesToCommands(commands, tile.files)
+            commandLists.append(commands)
+            directories.append(directory)
+            outputs.append([tileOutput])
+
+        self.executeJobs(commandLists, feedback, [t.name() for t in tiles], outputs,
+                         [self.tileInfo(t, cellSize, halo) for t in tiles])
+        if feedback.isCanceled():
+            return {}
 
+        fusionTiles.stitchOutputs(grid, tiles, directories, os.path.dirname(outputFile), feedback)
         return self.prepareReturn(parameters)
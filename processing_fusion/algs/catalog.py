@@ -24,6 +24,7 @@ __copyright__ = '(C) 2014, Agresta S. Coop'
 __revision__ = '$Format:%H$'
 
 import os
+import re
 from qgis.core import (QgsProcessingException,
                        QgsProcessingParameterDefinition,
                        QgsProcessingParameterEnum,
@@ -36,7 +37,7 @@ from qgis.core import (QgsProcessingException,
                       )
 
 from processing_fusion.fusionAlgorithm import FusionAlgorithm
-from processing_fusion import fusionUtils
+from processing_fusion import fusionCatalog, fusionUtils
 
 
 class Catalog(FusionAlgorithm):
@@ -67,6 +68,10 @@ class Catalog(FusionAlgorithm):
     DENSITY = 'DENSITY'
     FIRSTDENSITY = 'FIRSTDENSITY'
     INTENSITY = 'INTENSITY'
+    NATIVE = 'NATIVE'
+    # Catalog.exe switches of the additional modifiers the native catalog
+    # honours, the coverage shapefile is always written
+    NATIVE_SWITCHES = ('/density', '/first', '/intensity', '/coverage')
 
     def initAlgorithm(self, config=None):
 
@@ -89,6 +94,11 @@ class Catalog(FusionAlgorithm):
             self.INTENSITY, self.tr('Intensity - area, min, max (set blank if not used)'), '', optional = True)
         intensity.setFlags(intensity.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
         self.addParameter(intensity)
+
+        native = QgsProcessingParameterBoolean(
+            self.NATIVE, self.tr('Use the native parallel catalog instead of Catalog.exe'), False, optional = True)
+        native.setFlags(native.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
+        self.addParameter(native)
         
         self.addAdvancedModifiers()
 
@@ -97,6 +107,9 @@ class Catalog(FusionAlgorithm):
                                                                 'las'))
 
     def processAlgorithm(self, parameters, context, feedback):
+        if self.parameterAsBool(parameters, self.NATIVE, context):
+            return self.processNative(parameters, context, feedback)
+
         commands = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'Catalog.exe') + '"']
 
         intensity = self.parameterAsString(parameters, self.INTENSITY, context).strip()
@@ -116,7 +129,45 @@ class Catalog(FusionAlgorithm):
         outputFile = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
         commands.append('"%s"' % outputFile)
         
-        fusionUtils.execute(commands, feedback)
+        self.runCommands(commands, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
 
+    def processNative(self, parameters, context, feedback):
+        """
+        Writes the catalog report with fusionCatalog, reading the points
+        of the files in parallel processes when images are requested.
+        Images may also be requested in the additional modifiers, other
+        Catalog.exe switches are rejected.
+        """
+        unsupported = sorted(self.modifierSwitches(parameters, context).difference(self.NATIVE_SWITCHES))
+        if unsupported:
+            raise QgsProcessingException(self.tr('The native catalog does not support {}, '
+                                                 'use Catalog.exe for them').format(', '.join(unsupported)))
+        values = {}
+        modifiers = self.parameterAsString(parameters, self.ADVANCED_MODIFIERS, context)
+        for switch, value in re.findall(r'(?:^|\s)/(\w+):(\S+)', modifiers):
+            values[switch.lower()] = value
+        for kind, name in (('density', self.DENSITY), ('first', self.FIRSTDENSITY), ('intensity', self.INTENSITY)):
+            value = self.parameterAsString(parameters, name, context).strip()
+            if value:
+                values[kind] = value
+
+        specs = []
+        for kind in fusionCatalog.IMAGES:
+            if kind in values:
+                try:
+                    specs.append(fusionCatalog.parseImageSpec(kind, values[kind]))
+                except ValueError as e:
+                    raise QgsProcessingException(str(e))
+
+        files = self.inputFiles(parameters, context, expandLists=True)
+        if not files:
+            raise QgsProcessingException(self.tr('No input files'))
+        headers = self.lasHeaders(files, feedback)
+        outputFile = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
+        written = fusionCatalog.runCatalog(files, headers, outputFile, specs, fusionUtils.maxJobs(), feedback)
+        for path in written:
+            feedback.pushInfo(self.tr('Wrote {}').format(path))
+
+        return self.prepareReturn(parameters)
@@ -70,7 +70,6 @@ class ClipData(FusionAlgorithm):
     HEIGHT = 'HEIGHT'
     IGNOREOVERLAP = 'IGNOREOVERLAP'
     CLASS = 'CLASS'
-    VERSION64 = 'VERSION64'
 
     def initAlgorithm(self, config=None):
         self.shape = ((self.tr('Rectangle'), '0'),
@@ -84,9 +83,7 @@ class ClipData(FusionAlgorithm):
                                                      options=[i[0] for i in self.shape],
                                                      optional = True,
                                                      defaultValue=0))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Output'),
                                                                 self.tr('LAS files (*.las *.LAS)')))
@@ -126,11 +123,7 @@ class ClipData(FusionAlgorithm):
         self.addAdvancedModifiers()
 
     def processAlgorithm(self, parameters, context, feedback):
-        version64 = self.parameterAsBool(parameters, self.VERSION64, context)
-        if version64:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'ClipData64.exe') + '"']
-        else:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'ClipData.exe') + '"']
+        arguments = [self.fusionExecutable('ClipData', parameters, context, feedback)]
         self.addAdvancedModifiersToCommands(arguments, parameters, context)
         
         arguments.append('/shape:' + str(self.parameterAsEnum(parameters, self.SHAPE, context)))
@@ -147,17 +140,26 @@ class ClipData(FusionAlgorithm):
         class_var = self.parameterAsString(parameters, self.CLASS, context).strip()
         if class_var:
             arguments.append('/class:' + class_var)
-        self.addInputFilesToCommands(arguments, parameters, self.INPUT, context)        
-        
+
+        # only pass the files that can hold points of the clip, ClipData
+        # would otherwise open every file of the collection
+        extent = self.parameterAsExtent(parameters, self.EXTENT, context)
+        files = self.inputFiles(parameters, context, expandLists=True)
+        bounds = (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum())
+        clipped = self.filesIntersecting(files, bounds, feedback)
+        if not clipped:
+            raise QgsProcessingException(self.tr('None of the input files intersects the extent'))
+        feedback.pushInfo(self.tr('{} of {} input files intersect the extent').format(len(clipped), len(files)))
+        self.addFilesToCommands(arguments, clipped)
+
         outputFile = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
         arguments.append('"%s"' % outputFile)
 
-        extent = self.parameterAsExtent(parameters, self.EXTENT, context)
         arguments.append(extent.xMinimum())
         arguments.append(extent.yMinimum())
         arguments.append(extent.xMaximum())
         arguments.append(extent.yMaximum())
         
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
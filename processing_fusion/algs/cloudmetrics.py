@@ -53,7 +53,6 @@ class CloudMetrics(FusionAlgorithm):
     HTMIN = 'HTMIN'
     PROFILEAREA = 'PROFILEAREA'
     IGNOREOVERLAP = 'IGNOREOVERLAP'
-    VERSION64 = 'VERSION64'
 
     def name(self):
         return 'CloudMetrics'
@@ -81,9 +80,7 @@ class CloudMetrics(FusionAlgorithm):
         self.addParameter(QgsProcessingParameterFile(self.INPUT,
                                                      self.tr('Input LAS layer'),
                                                      fileFilter = '(*.las *.laz)'))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
         self.addParameter(QgsProcessingParameterBoolean(self.NEW,
                                                         self.tr('Overwrite existing output file with the same name'),
                                                         defaultValue=False))
@@ -126,11 +123,7 @@ class CloudMetrics(FusionAlgorithm):
         self.addAdvancedModifiers()
 
     def processAlgorithm(self, parameters, context, feedback):
-        version64 = self.parameterAsBool(parameters, self.VERSION64, context)
-        if version64:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'CloudMetrics64.exe') + '"']
-        else:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'CloudMetrics.exe') + '"']
+        arguments = [self.fusionExecutable('CloudMetrics', parameters, context, feedback)]
 
         above = self.parameterAsString(parameters, self.ABOVE, context).strip()
         if above:
@@ -159,6 +152,6 @@ class CloudMetrics(FusionAlgorithm):
         outputFile = self.parameterAsFileOutput(parameters, self.OUTPUT_CSV, context)
         arguments.append('"%s"' % outputFile)
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
@@ -59,7 +59,6 @@ class Cover(FusionAlgorithm):
     CLASS = 'CLASS'
     PENETRATION = 'PENETRATION'
     UPPER = 'UPPER'
-    VERSION64 = 'VERSION64'
     OUTPUT = 'OUTPUT'
 
     def name(self):
@@ -176,9 +175,7 @@ class Cover(FusionAlgorithm):
 
         self.addAdvancedModifiers()
         
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
 
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Output'),
@@ -189,10 +186,7 @@ class Cover(FusionAlgorithm):
     def processAlgorithm(self, parameters, context, feedback):
         arguments = []
         
-        if self.VERSION64:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'Cover64.exe') + '"')
-        else:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'Cover.exe') + '"')
+        arguments.append(self.fusionExecutable('Cover', parameters, context, feedback))
 
         if self.ALL in parameters and parameters[self.ALL]:
             arguments.append('/all')
@@ -209,6 +203,8 @@ class Cover(FusionAlgorithm):
             arguments.append('/upper:{}'.format(self.parameterAsInt(parameters, self.UPPER, context)))
 
         self.addAdvancedModifiersToCommands(arguments, parameters, context)
+        arguments.extend(self.gridSwitches(parameters, context, feedback,
+                                           self.parameterAsDouble(parameters, self.CELLSIZE, context)))
         
         arguments.append(self.parameterAsFile(parameters, self.GROUND, context))
         arguments.append(self.parameterAsFileOutput(parameters, self.OUTPUT, context))
@@ -225,7 +221,7 @@ class Cover(FusionAlgorithm):
         # fileList = fusionUtils.layersToFile('DataFiles.txt', self, parameters, self.INPUT, context)
         # arguments.append(fileList)
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         results = {}
         for output in self.outputDefinitions():
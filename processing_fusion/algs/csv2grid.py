@@ -113,7 +113,7 @@ class csv2grid(FusionAlgorithm):
         arguments.append(str(self.parameterAsInt(parameters, self.COLUMN, context)))
         arguments.append(self.parameterAsOutputLayer(parameters, self.OUTPUT, context))
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         results = {}
         for output in self.outputDefinitions():
@@ -51,7 +51,6 @@ class DensityMetrics(FusionAlgorithm):
     FIRST = 'FIRST'
     IGNOREOVERLAP = 'IGNOREOVERLAP'
     CLASS = 'CLASS'
-    VERSION64 = 'VERSION64'
 
     def name(self):
         return 'densitymetrics'
@@ -98,9 +97,7 @@ class DensityMetrics(FusionAlgorithm):
         self.addParameter(QgsProcessingParameterBoolean(self.FIRST,
                                                         self.tr('Use only first returns'),
                                                         defaultValue=False))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Base name for output files')))
 
@@ -122,10 +119,7 @@ class DensityMetrics(FusionAlgorithm):
 
     def processAlgorithm(self, parameters, context, feedback):
         arguments = []
-        if self.VERSION64 in parameters and parameters[self.VERSION64]:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'DensityMetrics64.exe') + '"')
-        else:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'DensityMetrics.exe') + '"')
+        arguments.append(self.fusionExecutable('DensityMetrics', parameters, context, feedback))
 
         if self.FIRST in parameters and parameters[self.FIRST]:
             arguments.append('/first')
@@ -156,6 +150,6 @@ class DensityMetrics(FusionAlgorithm):
 
         # self.addInputFilesToCommands(arguments, parameters, self.INPUT, context)        
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
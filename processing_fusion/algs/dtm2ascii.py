@@ -36,7 +36,7 @@ from qgis.core import (QgsProcessingException,
                       )
 
 from processing_fusion.fusionAlgorithm import FusionAlgorithm
-from processing_fusion import fusionUtils
+from processing_fusion import fusionConvert, fusionUtils
 
 
 class dtm2ascii(FusionAlgorithm):
@@ -45,6 +45,7 @@ class dtm2ascii(FusionAlgorithm):
     CSV = 'CSV'
     RASTER = 'RASTER'
     MULTIPLIER = 'MULTIPLIER'
+    NATIVE = 'NATIVE'
     OUTPUT = 'OUTPUT'
 
     def name(self):
@@ -64,7 +65,12 @@ class dtm2ascii(FusionAlgorithm):
 
     def shortHelpString(self):
         return self.tr('Converts data stored in the PLANS DTM format '
-                       'into ASCII raster files.')
+                       'into ASCII raster files.'
+                       '\n'
+                       '\n'
+                       'The native converter streams the DTM instead of running DTM2ASCII, with memory use that does not '
+                       'depend on the size of the grid. Several DTMs separated by ";" or given by a wildcard are converted '
+                       'concurrently, each to a file named after the DTM in the folder of the output.')
 
     def __init__(self):
         super().__init__()
@@ -89,6 +95,10 @@ class dtm2ascii(FusionAlgorithm):
                                                    QgsProcessingParameterNumber.Type.Double,
                                                    defaultValue=None,
                                                    optional=True))
+        params.append(QgsProcessingParameterBoolean(self.NATIVE,
+                                                    self.tr('Use the native converter instead of DTM2ASCII'),
+                                                    defaultValue=False,
+                                                    optional=True))
 
         for p in params:
             p.setFlags(p.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
@@ -98,6 +108,9 @@ class dtm2ascii(FusionAlgorithm):
                                                                   self.tr('Output')))
 
     def processAlgorithm(self, parameters, context, feedback):
+        if self.parameterAsBool(parameters, self.NATIVE, context):
+            return self.processNative(parameters, context, feedback)
+
         arguments = []
         arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), self.name()) + '"')
 
@@ -116,7 +129,7 @@ class dtm2ascii(FusionAlgorithm):
         arguments.append(self.parameterAsFile(parameters, self.INPUT, context))
         arguments.append(self.parameterAsOutputLayer(parameters, self.OUTPUT, context))
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         results = {}
         for output in self.outputDefinitions():
@@ -125,3 +138,38 @@ class dtm2ascii(FusionAlgorithm):
                 results[outputName] = parameters[outputName]
 
         return results
+
+    def processNative(self, parameters, context, feedback):
+        """
+        Converts the DTMs with fusionConvert, several at a time.
+        """
+        csv = self.parameterAsBool(parameters, self.CSV, context)
+        raster = self.parameterAsBool(parameters, self.RASTER, context)
+        if csv and raster:
+            raise QgsProcessingException(self.tr('Switches "/csv" and "/raster" are mutually exclusive.'))
+        multiplier = None
+        if self.MULTIPLIER in parameters and parameters[self.MULTIPLIER] is not None:
+            multiplier = self.parameterAsDouble(parameters, self.MULTIPLIER, context)
+
+        files = self.inputFiles(parameters, context)
+        if not files:
+            raise QgsProcessingException(self.tr('No input files'))
+        outputFile = self.parameterAsOutputLayer(parameters, self.OUTPUT, context)
+        if len(files) == 1:
+            pairs = [(files[0], outputFile)]
+        else:
+            directory, extension = os.path.dirname(outputFile), os.path.splitext(outputFile)[1] or '.asc'
+            pairs = [(f, os.path.join(directory, os.path.splitext(os.path.basename(f))[0] + extension))
+                     for f in files]
+
+        written, errors = fusionConvert.convertDtms(
+            pairs, fusionConvert.dtmToAscii, fusionUtils.maxJobs(), feedback, processes=True,
+            mode='csv' if csv else 'raster' if raster else 'grid', multiplier=multiplier)
+        for path, error in errors:
+            feedback.reportError(self.tr('Could not convert {}: {}').format(path, error))
+        if not written:
+            raise QgsProcessingException(self.tr('No DTM was converted'))
+        for path in written:
+            feedback.pushInfo(self.tr('Wrote {}').format(path))
+
+        return {self.OUTPUT: written[0]}
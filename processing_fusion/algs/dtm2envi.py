@@ -94,7 +94,7 @@ class dtm2envi(FusionAlgorithm):
         arguments.append(self.parameterAsFile(parameters, self.INPUT, context))
         arguments.append(self.parameterAsOutputLayer(parameters, self.OUTPUT, context))
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         results = {}
         for output in self.outputDefinitions():
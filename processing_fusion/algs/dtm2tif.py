@@ -30,18 +30,23 @@ import os
 from qgis.core import (QgsProcessingException,
                        QgsProcessingParameterDefinition,
                        QgsProcessingParameterBoolean,
+                       QgsProcessingParameterEnum,
                        QgsProcessingParameterFile,
                        QgsProcessingParameterRasterDestination
                       )
 
 from processing_fusion.fusionAlgorithm import FusionAlgorithm
-from processing_fusion import fusionUtils
+from processing_fusion import fusionConvert, fusionUtils
 
 
 class dtm2tif(FusionAlgorithm):
 
     INPUT = 'INPUT'
     MASK = 'MASK'
+    NATIVE = 'NATIVE'
+    FORMAT = 'FORMAT'
+    COMPRESSION = 'COMPRESSION'
+    OVERVIEWS = 'OVERVIEWS'
     OUTPUT = 'OUTPUT'
 
     def name(self):
@@ -61,7 +66,12 @@ class dtm2tif(FusionAlgorithm):
 
     def shortHelpString(self):
         return self.tr('Converts data stored in the PLANS DTM format '
-                       'into TIFF image with world file.')
+                       'into TIFF image with world file.'
+                       '\n'
+                       '\n'
+                       'The native converter writes tiled, compressed GeoTIFF or Cloud Optimized GeoTIFF with overviews '
+                       'using GDAL instead of DTM2TIF. Several DTMs separated by ";" or given by a wildcard are converted '
+                       'concurrently, each to a file named after the DTM in the folder of the output.')
 
     def __init__(self):
         super().__init__()
@@ -77,6 +87,24 @@ class dtm2tif(FusionAlgorithm):
                                                     self.tr('Produces a mask image showing the areas in the DTM with valid data'),
                                                     defaultValue=None,
                                                     optional=True))
+        params.append(QgsProcessingParameterBoolean(self.NATIVE,
+                                                    self.tr('Use the native converter instead of DTM2TIF'),
+                                                    defaultValue=False,
+                                                    optional=True))
+        params.append(QgsProcessingParameterEnum(self.FORMAT,
+                                                 self.tr('Format (native converter)'),
+                                                 options=fusionConvert.FORMATS,
+                                                 defaultValue=0,
+                                                 optional=True))
+        params.append(QgsProcessingParameterEnum(self.COMPRESSION,
+                                                 self.tr('Compression (native converter)'),
+                                                 options=fusionConvert.COMPRESSIONS,
+                                                 defaultValue=0,
+                                                 optional=True))
+        params.append(QgsProcessingParameterBoolean(self.OVERVIEWS,
+                                                    self.tr('Build overviews (native converter)'),
+                                                    defaultValue=True,
+                                                    optional=True))
         for p in params:
             p.setFlags(p.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
             self.addParameter(p)
@@ -85,6 +113,9 @@ class dtm2tif(FusionAlgorithm):
                                                                   self.tr('Output')))
 
     def processAlgorithm(self, parameters, context, feedback):
+        if self.parameterAsBool(parameters, self.NATIVE, context):
+            return self.processNative(parameters, context, feedback)
+
         arguments = []
         arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), self.name()) + '"')
 
@@ -94,7 +125,7 @@ class dtm2tif(FusionAlgorithm):
         arguments.append(self.parameterAsFile(parameters, self.INPUT, context))
         arguments.append(self.parameterAsOutputLayer(parameters, self.OUTPUT, context))
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         results = {}
         for output in self.outputDefinitions():
@@ -103,3 +134,35 @@ class dtm2tif(FusionAlgorithm):
                 results[outputName] = parameters[outputName]
 
         return results
+
+    def processNative(self, parameters, context, feedback):
+        """
+        Converts the DTMs with fusionConvert, several at a time.
+        """
+        if fusionConvert.gdal is None:
+            raise QgsProcessingException(self.tr('The native converter needs the GDAL Python bindings'))
+        files = self.inputFiles(parameters, context)
+        if not files:
+            raise QgsProcessingException(self.tr('No input files'))
+        outputFile = self.parameterAsOutputLayer(parameters, self.OUTPUT, context)
+        if len(files) == 1:
+            pairs = [(files[0], outputFile)]
+        else:
+            directory, extension = os.path.dirname(outputFile), os.path.splitext(outputFile)[1] or '.tif'
+            pairs = [(f, os.path.join(directory, os.path.splitext(os.path.basename(f))[0] + extension))
+                     for f in files]
+
+        written, errors = fusionConvert.convertDtms(
+            pairs, fusionConvert.dtmToTiff, fusionUtils.maxJobs(), feedback,
+            cog=self.parameterAsEnum(parameters, self.FORMAT, context) == 1,
+            compression=fusionConvert.COMPRESSIONS[self.parameterAsEnum(parameters, self.COMPRESSION, context)],
+            overviews=self.parameterAsBool(parameters, self.OVERVIEWS, context),
+            mask=self.parameterAsBool(parameters, self.MASK, context))
+        for path, error in errors:
+            feedback.reportError(self.tr('Could not convert {}: {}').format(path, error))
+        if not written:
+            raise QgsProcessingException(self.tr('No DTM was converted'))
+        for path in written:
+            feedback.pushInfo(self.tr('Wrote {}').format(path))
+
+        return {self.OUTPUT: written[0]}
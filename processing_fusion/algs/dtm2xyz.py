@@ -35,7 +35,7 @@ from qgis.core import (QgsProcessingException,
                       )
 
 from processing_fusion.fusionAlgorithm import FusionAlgorithm
-from processing_fusion import fusionUtils
+from processing_fusion import fusionConvert, fusionUtils
 
 
 class dtm2xyz(FusionAlgorithm):
@@ -44,6 +44,7 @@ class dtm2xyz(FusionAlgorithm):
     CSV = 'CSV'
     VOID = 'VOID'
     NOHEADER = 'NOHEADER'
+    NATIVE = 'NATIVE'
     OUTPUT = 'OUTPUT'
 
     def name(self):
@@ -63,7 +64,12 @@ class dtm2xyz(FusionAlgorithm):
 
     def shortHelpString(self):
         return self.tr('Converts data stored in the PLANS DTM format '
-                       'into ASCII text file containing XYZ points.')
+                       'into ASCII text file containing XYZ points.'
+                       '\n'
+                       '\n'
+                       'The native converter writes the points a block at a time instead of running DTM2XYZ. Several '
+                       'DTMs separated by ";" or given by a wildcard are converted concurrently, each to a file named '
+                       'after the DTM in the folder of the output.')
 
     def __init__(self):
         super().__init__()
@@ -87,6 +93,10 @@ class dtm2xyz(FusionAlgorithm):
                                                     self.tr('Do not include the column headings in CSV output'),
                                                     defaultValue=None,
                                                     optional=True))
+        params.append(QgsProcessingParameterBoolean(self.NATIVE,
+                                                    self.tr('Use the native converter instead of DTM2XYZ'),
+                                                    defaultValue=False,
+                                                    optional=True))
         for p in params:
             p.setFlags(p.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
             self.addParameter(p)
@@ -95,6 +105,9 @@ class dtm2xyz(FusionAlgorithm):
                                                                   self.tr('Output')))
 
     def processAlgorithm(self, parameters, context, feedback):
+        if self.parameterAsBool(parameters, self.NATIVE, context):
+            return self.processNative(parameters, context, feedback)
+
         arguments = []
         arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), self.name()) + '"')
 
@@ -111,7 +124,7 @@ class dtm2xyz(FusionAlgorithm):
         arguments.append(self.parameterAsFile(parameters, self.INPUT, context))
         arguments.append(self.parameterAsOutputLayer(parameters, self.OUTPUT, context))
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         results = {}
         for output in self.outputDefinitions():
@@ -120,3 +133,32 @@ class dtm2xyz(FusionAlgorithm):
                 results[outputName] = parameters[outputName]
 
         return results
+
+    def processNative(self, parameters, context, feedback):
+        """
+        Converts the DTMs with fusionConvert, several at a time.
+        """
+        files = self.inputFiles(parameters, context)
+        if not files:
+            raise QgsProcessingException(self.tr('No input files'))
+        outputFile = self.parameterAsOutputLayer(parameters, self.OUTPUT, context)
+        if len(files) == 1:
+            pairs = [(files[0], outputFile)]
+        else:
+            directory, extension = os.path.dirname(outputFile), os.path.splitext(outputFile)[1] or '.xyz'
+            pairs = [(f, os.path.join(directory, os.path.splitext(os.path.basename(f))[0] + extension))
+                     for f in files]
+
+        written, errors = fusionConvert.convertDtms(
+            pairs, fusionConvert.dtmToXyz, fusionUtils.maxJobs(), feedback, processes=True,
+            csv=self.parameterAsBool(parameters, self.CSV, context),
+            header=not self.parameterAsBool(parameters, self.NOHEADER, context),
+            voids=self.parameterAsBool(parameters, self.VOID, context))
+        for path, error in errors:
+            feedback.reportError(self.tr('Could not convert {}: {}').format(path, error))
+        if not written:
+            raise QgsProcessingException(self.tr('No DTM was converted'))
+        for path in written:
+            feedback.pushInfo(self.tr('Wrote {}').format(path))
+
+        return {self.OUTPUT: written[0]}
@@ -30,7 +30,6 @@ from qgis.core import (QgsProcessingException,
                        QgsProcessingParameterDefinition,
                        QgsProcessingParameterEnum,
                        QgsProcessingParameterNumber,
-                       QgsProcessingParameterBoolean,
                        QgsProcessingParameterRasterLayer,
                        QgsProcessingParameterFileDestination,
                        QgsProcessingParameterFile
@@ -46,7 +45,6 @@ class FilterData(FusionAlgorithm):
     VALUE = 'VALUE'
     SHAPE = 'SHAPE'
     WINDOWSIZE = 'WINDOWSIZE'
-    VERSION64 = 'VERSION64'
 
     def name(self):
         return 'filterdata'
@@ -81,20 +79,14 @@ class FilterData(FusionAlgorithm):
             self.WINDOWSIZE, self.tr('Window size'), 
             QgsProcessingParameterNumber.Type.Double, 
             defaultValue = 10))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Output filtered LAS file'),
                                                                 self.tr('LAS files (*.las *.LAS)')))
         self.addAdvancedModifiers()
 
     def processAlgorithm(self, parameters, context, feedback):
-        version64 = self.parameterAsBool(parameters, self.VERSION64, context)
-        if version64:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'FilterData64.exe') + '"']
-        else:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'FilterData.exe') + '"']
+        arguments = [self.fusionExecutable('FilterData', parameters, context, feedback)]
         self.addAdvancedModifiersToCommands(arguments, parameters, context)
         arguments.append('outlier')
         arguments.append(str(self.parameterAsDouble(parameters, self.VALUE, context)))
@@ -105,6 +97,6 @@ class FilterData(FusionAlgorithm):
 
         self.addInputFilesToCommands(arguments, parameters, self.INPUT, context)        
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
@@ -82,7 +82,7 @@ class FirstLastReturn(FusionAlgorithm):
         commands.append('"%s"' % outputFile)
         self.addInputFilesToCommands(commands, parameters, self.INPUT, context)        
 
-        fusionUtils.execute(commands, feedback)
+        self.runCommands(commands, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
 
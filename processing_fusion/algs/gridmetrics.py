@@ -40,7 +40,7 @@ from qgis.core import (QgsProcessingException,
                       )
 
 from processing_fusion.fusionAlgorithm import FusionAlgorithm
-from processing_fusion import fusionUtils
+from processing_fusion import fusionTiles, fusionUtils
 
 
 class GridMetrics(FusionAlgorithm):
@@ -58,7 +58,9 @@ class GridMetrics(FusionAlgorithm):
     ASCII = 'ASCII'
     HTMIN = 'HTMIN'
     CLASS = 'CLASS'
-    VERSION64 = 'VERSION64'
+    TILED = 'TILED'
+    TILESIZE = 'TILESIZE'
+    BALANCED = 'BALANCED'
 
     def name(self):
         return 'gridmetrics'
@@ -100,9 +102,7 @@ class GridMetrics(FusionAlgorithm):
                                                        QgsProcessingParameterNumber.Type.Double,
                                                        minValue=0,
                                                        defaultValue=10.0))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue = True))
+        self.addBuildParameter()
 
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Output table with grid metrics'),
@@ -142,6 +142,20 @@ class GridMetrics(FusionAlgorithm):
                                                    self.tr('Use only a specific LAS class'),
                                                    defaultValue='',
                                                    optional = True))
+        params.append(QgsProcessingParameterBoolean(self.TILED,
+                                                    self.tr('Process in tiles running in parallel'),
+                                                    defaultValue=False,
+                                                    optional = True))
+        params.append(QgsProcessingParameterNumber(self.TILESIZE,
+                                                   self.tr('Tile size (0 for automatic)'),
+                                                   QgsProcessingParameterNumber.Type.Double,
+                                                   minValue=0,
+                                                   defaultValue=0,
+                                                   optional = True))
+        params.append(QgsProcessingParameterBoolean(self.BALANCED,
+                                                    self.tr('Balance tiles by point count'),
+                                                    defaultValue=False,
+                                                    optional = True))
 
         for p in params:
             p.setFlags(p.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
@@ -151,11 +165,7 @@ class GridMetrics(FusionAlgorithm):
 
 
     def processAlgorithm(self, parameters, context, feedback):
-        version64 = self.parameterAsBool(parameters, self.VERSION64, context)
-        if version64:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'GridMetrics64.exe') + '"']
-        else:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'GridMetrics.exe') + '"']
+        arguments = []
 
         self.addAdvancedModifiersToCommands(arguments, parameters, context)
 
@@ -179,12 +189,59 @@ class GridMetrics(FusionAlgorithm):
         class_var = self.parameterAsString(parameters, self.CLASS, context).strip()
         if class_var:
             arguments.append('/class:' + class_var)
+
+        if self.processInTiles('GridMetrics', parameters, context, feedback):
+            return self.processTiles(arguments, parameters, context, feedback)
+
+        arguments.extend(self.gridSwitches(parameters, context, feedback,
+                                           self.parameterAsDouble(parameters, self.CELLSIZE, context)))
+        arguments.insert(0, self.fusionExecutable('GridMetrics', parameters, context, feedback))
         arguments.append(self.parameterAsString(parameters, self.GROUND, context))
         arguments.append(str(self.parameterAsDouble(parameters, self.HEIGHT, context)))
         arguments.append(str(self.parameterAsDouble(parameters, self.CELLSIZE, context)))
         arguments.append('"%s"' % self.parameterAsFileOutput(parameters, self.OUTPUT, context))
         self.addInputFilesToCommands(arguments, parameters, self.INPUT, context) 
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
+
+        return self.prepareReturn(parameters)
 
+    def processTiles(self, switches, parameters, context, feedback):
+        """
+        Runs GridMetrics for grid-aligned tiles in parallel and stitches
+        the tables and rasters of the tiles. Metrics of a cell only depend
+        on the points in the cell, a buffer of one cell keeps points on the
+        tile edges.
+        """
+        cellSize = self.parameterAsDouble(parameters, self.CELLSIZE, context)
+        tileSize = self.parameterAsDouble(parameters, self.TILESIZE, context)
+        outputFile = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
+        grid, tiles, executable = self.inputTiles('GridMetrics', parameters, context, feedback,
+                                                  cellSize, tileSize, buffer=cellSize,
+                                                  balanced=self.parameterAsBool(parameters, self.BALANCED, context))
+
+        commandLists = []
+        directories = []
+        outputs = []
+        for tile in tiles:
+            directory = self.tileDirectory(tile)
+            tileOutput = os.path.join(directory, os.path.basename(outputFile))
+            commands = [executable] + switches
+            commands.append('/grid:{},{},{},{}'.format(tile.xmin, tile.ymin, tile.width(), tile.height()))
+            commands.append('/buffer:{}'.format(cellSize))
+            commands.append(self.parameterAsString(parameters, self.GROUND, context))
+            commands.append(str(self.parameterAsDouble(parameters, self.HEIGHT, context)))
+            commands.append(str(cellSize))
+            commands.append('"%s"' % tileOutput)
+            self.addFilesToCommands(commands, tile.files)
+            commandLists.append(commands)
+            directories.append(directory)
+            outputs.append([tileOutput])
+
+        self.executeJobs(commandLists, feedback, [t.name() for t in tiles], outputs,
+                         [self.tileInfo(t, cellSize, cellSize) for t in tiles])
+        if feedback.isCanceled():
+            return {}
+
+        fusionTiles.stitchOutputs(grid, tiles, directories, os.path.dirname(outputFile), feedback)
         return self.prepareReturn(parameters)
@@ -32,7 +32,6 @@ from qgis.core import (QgsProcessingException,
                        QgsProcessingParameterDefinition,
                        QgsProcessingParameterEnum,
                        QgsProcessingParameterNumber,
-                       QgsProcessingParameterBoolean,
                        QgsProcessingParameterString,
                        QgsProcessingParameterRasterLayer,
                        QgsProcessingParameterFileDestination,
@@ -57,7 +56,6 @@ class GridSurfaceCreate(FusionAlgorithm):
     SLOPE = 'SLOPE'
     MINIMUM = 'MINIMUM'
     CLASS = 'CLASS'
-    VERSION64 = 'VERSION64'
 
 
     def name(self):
@@ -92,9 +90,7 @@ class GridSurfaceCreate(FusionAlgorithm):
             self.XYUNITS, self.tr('XY Units'), self.UNITS))
         self.addParameter(QgsProcessingParameterEnum(
             self.ZUNITS, self.tr('Z Units'), self.UNITS))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT_DTM,
                                                                 self.tr('Output surface'),
                                                                 self.tr('DTM files (*.dtm *.DTM)')))
@@ -126,11 +122,7 @@ class GridSurfaceCreate(FusionAlgorithm):
         self.addAdvancedModifiers()
 
     def processAlgorithm(self, parameters, context, feedback):
-        version64 = self.parameterAsBool(parameters, self.VERSION64, context)
-        if version64:
-            commands = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'GridSurfaceCreate64.exe') + '"']
-        else:
-            commands = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'GridSurfaceCreate.exe') + '"']
+        commands = [self.fusionExecutable('GridSurfaceCreate', parameters, context, feedback)]
         spike = self.parameterAsString(parameters, self.SPIKE, context).strip()
         if spike:
             commands.append('/spike:' + spike)
@@ -164,6 +156,6 @@ class GridSurfaceCreate(FusionAlgorithm):
 
         self.addInputFilesToCommands(commands, parameters, self.INPUT, context)        
 
-        fusionUtils.execute(commands, feedback)
+        self.runCommands(commands, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
@@ -73,7 +73,6 @@ class GridSurfaceStats(FusionAlgorithm):
     DTM = 'DTM'
     ASCII = 'ASCII'
     AREA = 'AREA'
-    VERSION64 = 'VERSION64'
 
     def initAlgorithm(self, config=None):
         self.addParameter(QgsProcessingParameterFile(self.INPUT,
@@ -88,9 +87,7 @@ class GridSurfaceStats(FusionAlgorithm):
         self.addParameter(QgsProcessingParameterBoolean(self.ASCII,
                                                         self.tr('Output raster data in ASCII raster format instead of PLANS DTM format'),
                                                         defaultValue=False))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Output surface'),
                                                                 self.tr('DTM files (*.dtm *.DTM)')))
@@ -117,11 +114,7 @@ class GridSurfaceStats(FusionAlgorithm):
         self.addAdvancedModifiers()
 
     def processAlgorithm(self, parameters, context, feedback):
-        version64 = self.parameterAsBool(parameters, self.VERSION64, context)
-        if version64:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'GridSurfaceStats64.exe') + '"']
-        else:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'GridSurfaceStats.exe') + '"']
+        arguments = [self.fusionExecutable('GridSurfaceStats', parameters, context, feedback)]
                    
         dtm = self.parameterAsString(parameters, self.DTM, context)
         if dtm:
@@ -142,6 +135,6 @@ class GridSurfaceStats(FusionAlgorithm):
 
         arguments.append(self.parameterAsInt(parameters, self.SAMPLEFACTOR, context))
         
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
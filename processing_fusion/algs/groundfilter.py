@@ -37,7 +37,7 @@ from qgis.core import (QgsProcessingException,
                       )
 
 from processing_fusion.fusionAlgorithm import FusionAlgorithm
-from processing_fusion import fusionUtils
+from processing_fusion import fusionTiles, fusionUtils
 
 class GroundFilter(FusionAlgorithm):
 
@@ -51,7 +51,12 @@ class GroundFilter(FusionAlgorithm):
     CLASS ='CLASS'
     FINALSMOOTH = 'FINALSMOOTH'
     IGNOREOVERLAP = 'IGNOREOVERLAP'
-    VERSION64 = 'VERSION64'
+    TILED = 'TILED'
+    TILESIZE = 'TILESIZE'
+    BALANCED = 'BALANCED'
+
+    # smallest buffer around tiles, in cells of the intermediate surfaces
+    MIN_BUFFER_CELLS = 5
 
     def name(self):
         return 'groundfilter'
@@ -93,9 +98,7 @@ class GroundFilter(FusionAlgorithm):
         self.addParameter(QgsProcessingParameterBoolean(self.SURFACE,
                                                         self.tr('Create .dtm surface'),
                                                         defaultValue = False))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Output ground LAS file'),
                                                                 self.tr('LAS files (*.las *.LAS)')))
@@ -126,6 +129,20 @@ class GroundFilter(FusionAlgorithm):
                                                         self.tr('Ignore points with the overlap flag set '),
                                                         defaultValue=False,
                                                         optional = True))
+        params.append(QgsProcessingParameterBoolean(self.TILED,
+                                                    self.tr('Process in tiles running in parallel'),
+                                                    defaultValue=False,
+                                                    optional = True))
+        params.append(QgsProcessingParameterNumber(self.TILESIZE,
+                                                   self.tr('Tile size (0 for automatic)'),
+                                                   QgsProcessingParameterNumber.Type.Double,
+                                                   minValue=0,
+                                                   defaultValue=0,
+                                                   optional = True))
+        params.append(QgsProcessingParameterBoolean(self.BALANCED,
+                                                    self.tr('Balance tiles by point count'),
+                                                    defaultValue=False,
+                                                    optional = True))
 
         for p in params:
             p.setFlags(p.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
@@ -135,11 +152,7 @@ class GroundFilter(FusionAlgorithm):
         self.addAdvancedModifiers()
     
     def processAlgorithm(self, parameters, context, feedback):
-        version64 = self.parameterAsBool(parameters, self.VERSION64, context)
-        if version64:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'GroundFilter64.exe') + '"']
-        else:
-            arguments = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'GroundFilter.exe') + '"']
+        arguments = []
 
         if self.parameterAsBool(parameters, self.SURFACE, context):
             arguments.append('/surface')
@@ -164,11 +177,87 @@ class GroundFilter(FusionAlgorithm):
 
         self.addAdvancedModifiersToCommands(arguments, parameters, context)
 
+        if self.processInTiles('GroundFilter', parameters, context, feedback):
+            return self.processTiles(arguments, parameters, context, feedback)
+
+        arguments.insert(0, self.fusionExecutable('GroundFilter', parameters, context, feedback))
         outputFile = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
         arguments.append('"%s"' % outputFile)
         arguments.append(str(self.parameterAsDouble(parameters, self.CELLSIZE, context)))
         self.addInputFilesToCommands(arguments, parameters, self.INPUT, context)        
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
+
+        return self.prepareReturn(parameters)
+
+    def bufferCells(self, parameters, context):
+        """
+        Width in intermediate cells of the buffer around a tile. The
+        filter fits surfaces to the points around each cell over several
+        iterations, so tiles get the reach of the smoothing windows and at
+        least MIN_BUFFER_CELLS cells of context.
+        """
+        reach = 0
+        for name in (self.MEDIAN, self.SMOOTH):
+            value = self.parameterAsString(parameters, name, context).strip()
+            if value:
+                try:
+                    reach += max(int(float(value)), 1) // 2
+                except ValueError:
+                    raise QgsProcessingException(self.tr('Invalid filter window size: {}').format(value))
+        return max(reach + 1, self.MIN_BUFFER_CELLS)
+
+    def processTiles(self, switches, parameters, context, feedback):
+        """
+        Filters buffered tiles in parallel, each keeping the ground points
+        of its core only, and merges the ground points of the tiles with
+        MergeData. Surfaces written with /surface are stitched.
+        """
+        cellSize = self.parameterAsDouble(parameters, self.CELLSIZE, context)
+        tileSize = self.parameterAsDouble(parameters, self.TILESIZE, context)
+        outputFile = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
+        buffer = self.bufferCells(parameters, context) * cellSize
+        grid, tiles, executable = self.inputTiles('GroundFilter', parameters, context, feedback,
+                                                  cellSize, tileSize, buffer=buffer,
+                                                  balanced=self.parameterAsBool(parameters, self.BALANCED, context))
+
+        # /trim keeps points on its bounds, moving the bounds half a unit of
+        # the point coordinates to the south west puts a point on the edge
+        # between two tiles into one of them
+        headers = self.inputHeaders(parameters, context)[0]
+        resolution = min([s for h in headers for s in h.scale[:2] if s > 0] or [0.001])
+        shift = resolution / 2
+
+        commandLists = []
+        directories = []
+        parts = []
+        for tile in tiles:
+            directory = self.tileDirectory(tile)
+            tileOutput = os.path.join(directory, os.path.basename(outputFile))
+            commands = [executable] + switches
+            commands.append('/extent:{},{},{},{}'.format(*tile.bounds(buffer)))
+            commands.append('/trim:{},{},{},{}'.format(tile.xmin - shift, tile.ymin - shift,
+                                                       tile.xmax - shift, tile.ymax - shift))
+            commands.append('"%s"' % tileOutput)
+            commands.append(str(cellSize))
+            self.addFilesToCommands(commands, tile.files)
+            commandLists.append(commands)
+            directories.append(directory)
+            parts.append(tileOutput)
+
+        self.executeJobs(commandLists, feedback, [t.name() for t in tiles], [[p] for p in parts],
+                         [self.tileInfo(t, cellSize, buffer) for t in tiles])
+        if feedback.isCanceled():
+            return {}
+
+        # tiles without ground points in their core produce no file
+        parts = [p for p in parts if os.path.isfile(p)]
+        if not parts:
+            raise QgsProcessingException(self.tr('No ground points were found'))
+        merge = fusionUtils.mergeCommands(parts, outputFile)
+        self.runCommands(merge, parameters, context, feedback)
 
+        extension = os.path.splitext(outputFile)[1].lower()
+        fusionTiles.stitchOutputs(grid, tiles, directories, os.path.dirname(outputFile), feedback,
+                                  skip=(extension,))
         return self.prepareReturn(parameters)
@@ -108,6 +108,6 @@ class ImageCreate(FusionAlgorithm):
         commands.append(str(self.parameterAsDouble(parameters, self.PIXEL, context)))
         self.addInputFilesToCommands(commands, parameters, self.INPUT, context)        
 
-        fusionUtils.execute(commands, feedback)
+        self.runCommands(commands, parameters, context, feedback)
         
         return self.prepareReturn(parameters)
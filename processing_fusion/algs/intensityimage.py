@@ -104,6 +104,6 @@ class IntensityImage(FusionAlgorithm):
         commands.append('"%s"' % outputFile)
         self.addInputFilesToCommands(commands, parameters, self.INPUT, context)        
 
-        fusionUtils.execute(commands, feedback)
+        self.runCommands(commands, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
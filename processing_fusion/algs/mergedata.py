@@ -84,6 +84,6 @@ class MergeData(FusionAlgorithm):
         outputFile = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
         commands.append('"%s"' % outputFile)
 
-        fusionUtils.execute(commands, feedback)
+        self.runCommands(commands, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
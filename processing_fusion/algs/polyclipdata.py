@@ -25,8 +25,13 @@ __copyright__ = "(C) 2014 by Niccolo' Marchi"
 
 __revision__ = '$Format:%H$'
 
+import math
 import os
 from qgis.core import (QgsProcessingException,
+                       QgsProcessingUtils,
+                       QgsSpatialIndex,
+                       QgsVectorFileWriter,
+                       QgsVectorLayer,
                        QgsProcessingParameterDefinition,
                        QgsProcessingParameterEnum,
                        QgsProcessingParameterNumber,
@@ -50,7 +55,10 @@ class PolyClipData(FusionAlgorithm):
     MASK = 'MASK'
     FIELD = 'FIELD'
     VALUE = 'VALUE'
-    VERSION64 = 'VERSION64'
+    # switches whose result differs when the polygons are clipped in groups:
+    # points outside a group's polygons may lie inside another group's, and
+    # outputs per polygon or in LDA format can not be merged
+    SINGLE_RUN_SWITCHES = ('/outside', '/multifile', '/lda')
 
     def name(self):
         return 'polyclipdata'
@@ -81,9 +89,7 @@ class PolyClipData(FusionAlgorithm):
         # self.addParameter(QgsProcessingParameterFileDestination(self.MASK,
                                                                 # self.tr('Mask layer (Shapefiles only)'),
                                                                 # self.tr('SHP files (*.shp)')))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Output clipped LAS file'),
                                                                 self.tr('LAS files (*.las *.LAS)')))
@@ -96,25 +102,155 @@ class PolyClipData(FusionAlgorithm):
         self.addAdvancedModifiers()
 
     def processAlgorithm(self, parameters, context, feedback):
-        version64 = self.parameterAsBool(parameters, self.VERSION64, context)
-        if version64:
-            commands = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'PolyClipData64.exe') + '"']
-        else:
-            commands = ['"' + os.path.join(fusionUtils.fusionDirectory(), 'PolyClipData.exe') + '"']
+        commands = [self.fusionExecutable('PolyClipData', parameters, context, feedback)]
 
         if self.parameterAsBool(parameters, self.SHAPE, context):
             commands.append('/shape:' + self.parameterAsString(parameters, self.FIELD, context) + ','
                             + self.parameterAsString(parameters, self.VALUE, context))
         self.addAdvancedModifiersToCommands(commands, parameters, context)
         maskfile = Path(self.parameterAsString(parameters, self.MASK, context))
-        # maskfile = self.parameterAsFileOutput(parameters, self.MASK, context)
-        commands.append('"' + str(maskfile) + '"')
-        # maskFile = self.parameterAsFileOutput(parameters, self.MASK, context)
-        # commands.append('"%s"' % maskFile)
         outputFile = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
-        commands.append('"%s"' % outputFile)
-        self.addInputFilesToCommands(commands, parameters, self.INPUT, context)        
-          
-        fusionUtils.execute(commands, feedback)
+
+        mask = QgsVectorLayer(str(maskfile), 'mask', 'ogr')
+        if not mask.isValid():
+            raise QgsProcessingException(self.tr('Could not load mask layer {}').format(maskfile))
+        singleRun = sorted(self.modifierSwitches(parameters, context).intersection(self.SINGLE_RUN_SWITCHES))
+        if singleRun:
+            feedback.pushInfo(self.tr('Clipping all polygons in one run because of {}').format(', '.join(singleRun)))
+            groups = [(None, self.inputFiles(parameters, context, expandLists=True))]
+        else:
+            groups = self.polygonGroups(mask, parameters, context, feedback)
+        if not groups:
+            raise QgsProcessingException(self.tr('None of the mask polygons touches the input files'))
+
+        if len(groups) == 1:
+            commands.append('"' + str(maskfile) + '"')
+            commands.append('"%s"' % outputFile)
+            self.addFilesToCommands(commands, groups[0][1])
+            self.runCommands(commands, parameters, context, feedback)
+            return self.prepareReturn(parameters)
+
+        feedback.pushInfo(self.tr('Clipping {} polygons in {} groups').format(mask.featureCount(), len(groups)))
+        commandLists = []
+        parts = []
+        for i, (ids, files) in enumerate(groups):
+            groupMask = self.writeMask(mask, ids, context)
+            part = QgsProcessingUtils.generateTempFilename('polyclip{}.las'.format(i + 1))
+            groupCommands = commands + ['"%s"' % groupMask, '"%s"' % part]
+            self.addFilesToCommands(groupCommands, files)
+            commandLists.append(groupCommands)
+            parts.append(part)
+
+        self.executeJobs(commandLists, feedback,
+                         labels=['polygons {}'.format(i + 1) for i in range(len(groups))])
+        if feedback.isCanceled():
+            return {}
+
+        # groups without points in their polygons produce no file
+        parts = [p for p in parts if os.path.isfile(p)]
+        if not parts:
+            raise QgsProcessingException(self.tr('No points fall in the mask polygons'))
+        merge = fusionUtils.mergeCommands(parts, outputFile)
+        self.runCommands(merge, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
+
+    def polygonGroups(self, mask, parameters, context, feedback):
+        """
+        Groups the mask polygons by the input files their bounding boxes
+        touch. Returns a list of (feature ids, files), with at most a few
+        groups per concurrent job. Polygons that overlap or touch are kept
+        in one group, otherwise points in the overlap or on the shared
+        edge would be clipped by two runs.
+        """
+        selected = None
+        if self.parameterAsBool(parameters, self.SHAPE, context):
+            # /shape:field#,value selects features by a 1-based field number
+            value = self.parameterAsString(parameters, self.VALUE, context)
+            try:
+                field = int(self.parameterAsString(parameters, self.FIELD, context)) - 1
+            except ValueError:
+                field = None
+            if field is not None and value != '*':
+                selected = (field, value)
+
+        features = []
+        for feature in mask.getFeatures():
+            if selected is not None:
+                attributes = feature.attributes()
+                if selected[0] >= len(attributes) or str(attributes[selected[0]]) != selected[1]:
+                    continue
+            features.append(feature)
+
+        files = self.inputFiles(parameters, context, expandLists=True)
+        boundsList = []
+        for feature in features:
+            box = feature.geometry().boundingBox()
+            boundsList.append((box.xMinimum(), box.yMinimum(), box.xMaximum(), box.yMaximum()))
+        polygonFiles = self.filesIntersectingEach(files, boundsList, feedback)
+
+        # polygons that intersect form one cluster, with the files of all
+        # of them
+        clusters = {}
+        for i, root in enumerate(self.overlappingPolygons(features)):
+            if polygonFiles[i]:
+                cluster = clusters.setdefault(root, ([], {}))
+                cluster[0].append(features[i].id())
+                cluster[1].update(dict.fromkeys(polygonFiles[i]))
+        order = {f: i for i, f in enumerate(files)}
+        groups = {}
+        for fids, clusterFiles in clusters.values():
+            key = tuple(sorted(clusterFiles, key=order.get))
+            groups.setdefault(key, []).extend(fids)
+
+        if not groups:
+            return []
+
+        # combine neighbouring groups so that the processes outnumber the
+        # concurrent jobs only a few times
+        keys = sorted(groups, key=lambda k: order[k[0]])
+        size = math.ceil(len(keys) / (4 * fusionUtils.maxJobs()))
+        result = []
+        for i in range(0, len(keys), size):
+            batch = keys[i:i + size]
+            result.append(([fid for k in batch for fid in groups[k]],
+                           list(dict.fromkeys(f for k in batch for f in k))))
+        return result
+
+    def overlappingPolygons(self, features):
+        """
+        Returns for each feature the index of the first feature of the
+        cluster of intersecting features it belongs to.
+        """
+        index = QgsSpatialIndex()
+        for feature in features:
+            index.addFeature(feature)
+        position = {feature.id(): i for i, feature in enumerate(features)}
+
+        parent = list(range(len(features)))
+
+        def root(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, feature in enumerate(features):
+            geometry = feature.geometry()
+            for fid in index.intersects(geometry.boundingBox()):
+                j = position[fid]
+                if j > i and root(i) != root(j) and geometry.intersects(features[j].geometry()):
+                    a, b = sorted((root(i), root(j)))
+                    parent[b] = a
+        return [root(i) for i in range(len(features))]
+
+    def writeMask(self, mask, ids, context):
+        path = QgsProcessingUtils.generateTempFilename('mask.shp')
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'ESRI Shapefile'
+        options.onlySelectedFeatures = True
+        mask.selectByIds(ids)
+        error = QgsVectorFileWriter.writeAsVectorFormatV3(mask, path, context.transformContext(), options)
+        if error[0] != QgsVectorFileWriter.NoError:
+            raise QgsProcessingException(self.tr('Could not write mask polygons: {}').format(error[1]))
+        return path
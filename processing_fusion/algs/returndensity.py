@@ -50,7 +50,6 @@ class ReturnDensity(FusionAlgorithm):
     FIRST = 'FIRST'
     ASCII = 'ASCII'
     CLASS = 'CLASS'
-    VERSION64 = 'VERSION64'
     OUTPUT = 'OUTPUT'
 
     def name(self):
@@ -85,9 +84,7 @@ class ReturnDensity(FusionAlgorithm):
                                                        minValue=0,
                                                        defaultValue=10.0))
 
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
 
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Output surface'),
@@ -116,10 +113,7 @@ class ReturnDensity(FusionAlgorithm):
     def processAlgorithm(self, parameters, context, feedback):
         arguments = []
 
-        if self.VERSION64:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'ReturnDensity64.exe') + '"')
-        else:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'ReturnDensity.exe') + '"')
+        arguments.append(self.fusionExecutable('ReturnDensity', parameters, context, feedback))
 
         if self.FIRST in parameters and parameters[self.FIRST]:
             arguments.append('/first')
@@ -131,11 +125,13 @@ class ReturnDensity(FusionAlgorithm):
             arguments.append('/class:' + class_var)
 
         #self.addAdvancedModifiersToCommand(arguments)
+        arguments.extend(self.gridSwitches(parameters, context, feedback,
+                                           self.parameterAsInt(parameters, self.CELLSIZE, context)))
         arguments.append(self.parameterAsFileOutput(parameters, self.OUTPUT, context))
         arguments.append(str(self.parameterAsInt(parameters, self.CELLSIZE, context)))
         self.addInputFilesToCommands(arguments, parameters, self.INPUT, context)
         #arguments.append(self.parameterAsFile(parameters, self.INPUT, context))
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    SetProjectGrid.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+from qgis.core import (QgsProcessingAlgorithm,
+                       QgsProcessingParameterBoolean,
+                       QgsProcessingParameterCrs,
+                       QgsProcessingParameterNumber
+                      )
+
+from processing_fusion.fusionAlgorithm import FusionAlgorithm
+from processing_fusion import fusionGrid
+
+
+class SetProjectGrid(FusionAlgorithm):
+
+    ORIGINX = 'ORIGINX'
+    ORIGINY = 'ORIGINY'
+    CELLSIZE = 'CELLSIZE'
+    CRS = 'CRS'
+    CLEAR = 'CLEAR'
+
+    def name(self):
+        return 'setprojectgrid'
+
+    def displayName(self):
+        return self.tr('Set project grid')
+
+    def group(self):
+        return self.tr('Utilities')
+
+    def groupId(self):
+        return 'utilities'
+
+    def tags(self):
+        return [self.tr('lidar'), self.tr('grid'), self.tr('align')]
+
+    def shortHelpString(self):
+        return self.tr('Stores a grid in the project that the outputs of GridMetrics, CanopyModel, Cover and ReturnDensity are aligned to, '
+                       'including their tiled runs. Cells of outputs from separate runs share their edges when their cell size is the grid '
+                       'cell size or a multiple or divisor of it, so they can be mosaicked without resampling.'
+                       '\n'
+                       '\n'
+                       'A cell size of 0 accepts any cell size. Check "Remove the project grid" to go back to grids computed from the data.')
+
+    def __init__(self):
+        super().__init__()
+
+    def flags(self):
+        # the grid is written to the project, which lives in the main thread
+        return super().flags() | QgsProcessingAlgorithm.Flag.FlagNoThreading
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterNumber(
+            self.ORIGINX, self.tr('Origin X'), QgsProcessingParameterNumber.Type.Double, defaultValue = 0.0))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.ORIGINY, self.tr('Origin Y'), QgsProcessingParameterNumber.Type.Double, defaultValue = 0.0))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.CELLSIZE, self.tr('Cellsize'), QgsProcessingParameterNumber.Type.Double,
+            minValue = 0, defaultValue = 0.0))
+        self.addParameter(QgsProcessingParameterCrs(
+            self.CRS, self.tr('CRS of the grid'), 'ProjectCrs', optional = True))
+        self.addParameter(QgsProcessingParameterBoolean(
+            self.CLEAR, self.tr('Remove the project grid'), False))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        project = context.project()
+        if self.parameterAsBool(parameters, self.CLEAR, context):
+            fusionGrid.clearProjectGrid(project)
+            feedback.pushInfo(self.tr('Removed the project grid'))
+            return {}
+
+        crs = self.parameterAsCrs(parameters, self.CRS, context)
+        grid = fusionGrid.ProjectGrid(self.parameterAsDouble(parameters, self.ORIGINX, context),
+                                      self.parameterAsDouble(parameters, self.ORIGINY, context),
+                                      self.parameterAsDouble(parameters, self.CELLSIZE, context),
+                                      crs.authid() if crs.isValid() else '')
+        fusionGrid.setProjectGrid(grid, project)
+        feedback.pushInfo(self.tr('Outputs are aligned to the grid at ({}, {})').format(grid.originX, grid.originY))
+        return {}
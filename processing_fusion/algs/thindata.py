@@ -48,7 +48,6 @@ class ThinData(FusionAlgorithm):
     RSEED = 'RSEED'
     IGNOREOVERLAP = 'IGNOREOVERLAP'
     CLASS = 'CLASS'
-    VERSION64 = 'VERSION64'
     OUTPUT = 'OUTPUT'
 
     def name(self):
@@ -108,9 +107,7 @@ class ThinData(FusionAlgorithm):
             p.setFlags(p.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
             self.addParameter(p)
 
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Output'),
                                                                 self.tr('LAS files (*.las)')))
@@ -118,10 +115,7 @@ class ThinData(FusionAlgorithm):
     def processAlgorithm(self, parameters, context, feedback):
         arguments = []
         
-        if self.VERSION64:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'ThinData64.exe') + '"')
-        else:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'ThinData.exe') + '"')
+        arguments.append(self.fusionExecutable('ThinData', parameters, context, feedback))
 
         if self.IGNOREOVERLAP in parameters and parameters[self.IGNOREOVERLAP]:
             arguments.append('/ignoreoverlap')
@@ -138,7 +132,7 @@ class ThinData(FusionAlgorithm):
         arguments.append(str(self.parameterAsDouble(parameters, self.CELLSIZE, context)))
         arguments.append(self.parameterAsFile(parameters, self.INPUT, context))
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         results = {}
         for output in self.outputDefinitions():
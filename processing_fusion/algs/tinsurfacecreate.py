@@ -114,6 +114,6 @@ class TinSurfaceCreate(FusionAlgorithm):
 
         self.addInputFilesToCommands(commands, parameters, self.INPUT, context)        
 
-        fusionUtils.execute(commands, feedback)
+        self.runCommands(commands, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
@@ -49,7 +49,6 @@ class TopoMetrics(FusionAlgorithm):
     WSIZE = 'WSIZE'
     OUTPUT = 'OUTPUT'
     SQUARE = 'SQUARE'
-    VERSION64 = 'VERSION64'
 
     def name(self):
         return 'topometrics'
@@ -103,9 +102,7 @@ class TopoMetrics(FusionAlgorithm):
         self.addParameter(QgsProcessingParameterBoolean(self.SQUARE,
                                                         self.tr('Use a square-shaped mask when computing the TPI'),
                                                         defaultValue=False))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
         self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT,
                                                                 self.tr('Output file with tabular metric information'),
                                                                 self.tr('CSV files (*.csv *.CSV)')))
@@ -114,10 +111,7 @@ class TopoMetrics(FusionAlgorithm):
 
     def processAlgorithm(self, parameters, context, feedback):
         arguments = []
-        if self.VERSION64 in parameters and parameters[self.VERSION64]:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'TopoMetrics64.exe') + '"')
-        else:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'TopoMetrics.exe') + '"')
+        arguments.append(self.fusionExecutable('TopoMetrics', parameters, context, feedback))
 
         if self.SQUARE in parameters and parameters[self.SQUARE]:
             arguments.append('/square')
@@ -132,6 +126,6 @@ class TopoMetrics(FusionAlgorithm):
 
         arguments.append(self.parameterAsFileOutput(parameters, self.OUTPUT, context))       
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         return self.prepareReturn(parameters)
@@ -51,7 +51,6 @@ class TreeSeg(FusionAlgorithm):
     LASPTS = 'LASPTS'
     SEGMENTPTS = 'SEGMENTPTS'
     SHAPE = 'SHAPE'
-    VERSION64 = 'VERSION64'
     OUTPUT = 'OUTPUT'
 
     def name(self):
@@ -87,9 +86,7 @@ class TreeSeg(FusionAlgorithm):
                                                        QgsProcessingParameterNumber.Type.Integer,
                                                        minValue = 0,
                                                        defaultValue=0))
-        self.addParameter(QgsProcessingParameterBoolean(self.VERSION64,
-                                                        self.tr('Use 64-bit version'),
-                                                        defaultValue=True))
+        self.addBuildParameter()
 
 
         ground = QgsProcessingParameterFile(self.GROUND,
@@ -136,10 +133,7 @@ class TreeSeg(FusionAlgorithm):
     def processAlgorithm(self, parameters, context, feedback):
         arguments = []
 
-        if self.VERSION64:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'TreeSeg64.exe') + '"')
-        else:
-            arguments.append('"' + os.path.join(fusionUtils.fusionDirectory(), 'TreeSeg.exe') + '"')
+        arguments.append(self.fusionExecutable('TreeSeg', parameters, context, feedback))
 
         if self.HEIGHT_NORM in parameters and parameters[self.HEIGHT_NORM]:
             arguments.append('/height')
@@ -173,7 +167,7 @@ class TreeSeg(FusionAlgorithm):
         # fileList = fusionUtils.layersToFile('xyzDataFiles.txt', self, parameters, self.INPUT, context)
         # arguments.append(fileList)
 
-        fusionUtils.execute(arguments, feedback)
+        self.runCommands(arguments, parameters, context, feedback)
 
         results = {}
         for output in self.outputDefinitions():
@@ -25,14 +25,26 @@ __copyright__ = '(C) 2019, Alexander Bruy'
 
 __revision__ = '$Format:%H$'
 
+import glob
 import os
+import re
 
 from qgis.PyQt.QtCore import QCoreApplication
 from qgis.PyQt.QtGui import QIcon
 
-from qgis.core import QgsProcessingAlgorithm, QgsProcessingParameterString, QgsProcessingParameterDefinition
+from qgis.core import (QgsProcessingAlgorithm,
+                       QgsProcessingException,
+                       QgsProcessingParameterEnum,
+                       QgsProcessingParameterString,
+                       QgsProcessingParameterDefinition,
+                       QgsProcessingUtils
+                      )
+from processing.core.ProcessingConfig import ProcessingConfig
 
-from processing_fusion import fusionUtils
+from processing_fusion import fusionDtm, fusionGrid, fusionMemory, fusionStats, fusionTiles, fusionUtils
+from processing_fusion.fusionCache import listedFiles, normalizedPath
+from processing_fusion.fusionServer import jobExecutor
+from processing_fusion.lasHeader import headerBounds, readHeaders
 
 pluginPath = os.path.dirname(__file__)
 
@@ -40,10 +52,20 @@ pluginPath = os.path.dirname(__file__)
 class FusionAlgorithm(QgsProcessingAlgorithm):
 
     ADVANCED_MODIFIERS = 'ADVANCED_MODIFIERS'
+    BUILD = 'BUILD'
+    # choices of the BUILD parameter
+    BUILD_AUTO = 0
+    BUILD_32 = 1
+    BUILD_64 = 2
+    # switches that set the grid of gridded products
+    GRID_SWITCHES = ('/grid:', '/gridxy:', '/align:', '/extent:')
 
     def __init__(self):
         super().__init__()
         self.output_values = {}
+        self.output_files = []
+        # LAS headers of the inputs by file list, read once per run
+        self.headerCache = {}
 
     def createInstance(self):
         return type(self)()
@@ -54,22 +76,436 @@ class FusionAlgorithm(QgsProcessingAlgorithm):
         param.setFlags(param.flags() | QgsProcessingParameterDefinition.Flag.FlagAdvanced)
         self.addParameter(param)
 
+    def addBuildParameter(self):
+        self.addParameter(QgsProcessingParameterEnum(
+            self.BUILD, self.tr('FUSION build'),
+            [self.tr('Automatic, from input size and available memory'), self.tr('32-bit'), self.tr('64-bit')],
+            defaultValue=self.BUILD_AUTO))
+
+    def fusionBuild(self, parameters, context):
+        """
+        Returns the build chosen with the BUILD parameter. Runs set up
+        before it replaced the VERSION64 option choose a build with that
+        option.
+        """
+        if self.BUILD not in parameters and parameters.get('VERSION64') is not None:
+            return self.BUILD_64 if parameters['VERSION64'] else self.BUILD_32
+        if self.parameterDefinition(self.BUILD) is None:
+            return self.BUILD_32
+        return self.parameterAsEnum(parameters, self.BUILD, context)
+
     def addAdvancedModifiersToCommands(self, commands, parameters, context):
         s = self.parameterAsString(parameters, self.ADVANCED_MODIFIERS, context).strip()
         if s:
             commands.append(s)
 
+    def modifierSwitches(self, parameters, context):
+        """
+        Returns the names of the switches in the additional modifiers in
+        lower case, e.g. {'/outside', '/class'}.
+        """
+        if self.parameterDefinition(self.ADVANCED_MODIFIERS) is None:
+            return set()
+        modifiers = self.parameterAsString(parameters, self.ADVANCED_MODIFIERS, context)
+        return set(s.lower() for s in re.findall(r'(?:^|\s)(/\w+)', modifiers))
+
     def addInputFilesToCommands(self, commands, parameters, parameterName, context):
         files = self.parameterAsString(parameters, parameterName, context).split(';')
+        self.addFilesToCommands(commands, files)
+
+    def parameterAsFileOutput(self, parameters, name, context):
+        outputFile = super().parameterAsFileOutput(parameters, name, context)
+        self.output_files.append(outputFile)
+        return outputFile
+
+    def parameterAsOutputLayer(self, parameters, name, context):
+        outputFile = super().parameterAsOutputLayer(parameters, name, context)
+        self.output_files.append(outputFile)
+        return outputFile
+
+    def inputFiles(self, parameters, context, parameterName='INPUT', expandLists=False):
+        """
+        Returns the files of a file input parameter, with wildcards expanded
+        and optionally with list files replaced by the files they list.
+        """
+        if self.parameterDefinition(parameterName) is None:
+            return []
+        files = []
+        for f in self.parameterAsString(parameters, parameterName, context).split(';'):
+            f = f.strip().strip('"')
+            if not f:
+                continue
+            if glob.has_magic(f):
+                files.extend(sorted(glob.glob(f)))
+            elif expandLists and f.lower().endswith('.txt') and os.path.isfile(f):
+                names = listedFiles(f)
+                files.extend(names if names is not None else [f])
+            else:
+                files.append(f)
+        return files
+
+    def addFilesToCommands(self, commands, files):
         if len(files) == 1:
             commands.append('"%s"' % files[0])
         else:
             commands.append(fusionUtils.filenamesToFile(files))
 
+    def filesIntersecting(self, files, bounds, feedback=None):
+        """
+        Returns the files whose header extent intersects bounds (xmin, ymin,
+        xmax, ymax). Files without a readable header are kept, FUSION
+        decides about them.
+        """
+        return self.filesIntersectingEach(files, [bounds], feedback)[0]
+
+    def filesIntersectingEach(self, files, boundsList, feedback=None):
+        """
+        Like filesIntersecting() for many bounds at once, returning a list
+        of files for each of them.
+        """
+        headers = self.lasHeaders(files, feedback)
+        catalog = fusionUtils.lasCatalog()
+        if catalog is not None:
+            # keep the order of the files, R-tree results come unordered
+            order = {normalizedPath(f): i for i, f in enumerate(files)}
+            unknown = [i for i, h in enumerate(headers) if h is None]
+            result = []
+            for bounds in boundsList:
+                found = [order[p] for p in catalog.intersecting(bounds) if p in order]
+                result.append([files[i] for i in sorted(set(found + unknown))])
+            return result
+
+        result = []
+        for xmin, ymin, xmax, ymax in boundsList:
+            result.append([f for f, h in zip(files, headers)
+                           if h is None or (h.minX <= xmax and h.maxX >= xmin and h.minY <= ymax and h.maxY >= ymin)])
+        return result
+
+    def lasHeaders(self, files, feedback=None):
+        """
+        Returns the headers of LAS/LAZ files in the order of the files, None
+        for files that are not point clouds. Headers come from the catalog
+        when it is enabled, which reads only new and changed files. The
+        headers of a list of files are read once per run, every instance of
+        the algorithm runs once.
+        """
+        key = tuple(files)
+        if key not in self.headerCache:
+            catalog = fusionUtils.lasCatalog()
+            if catalog is None:
+                self.headerCache[key] = readHeaders(files)
+            else:
+                catalog.update(files, feedback)
+                headers = catalog.headers(files)
+                self.headerCache[key] = [headers.get(normalizedPath(f)) for f in files]
+        return self.headerCache[key]
+
+    def inputHeaders(self, parameters, context, feedback=None):
+        """
+        Returns the headers of the point cloud inputs, list files expanded
+        and files that are not point clouds left out, and their combined
+        extent (xmin, ymin, xmax, ymax), or None without headers.
+        """
+        files = self.inputFiles(parameters, context, expandLists=True)
+        headers = [h for h in self.lasHeaders(files, feedback) if h is not None]
+        return headers, headerBounds(headers)
+
+    def memoryPlan(self, tool, parameters, context, cells=None, points=None):
+        """
+        Estimates the memory a run of a tool needs from the LAS headers of
+        its inputs and the grid it produces, unless both the number of
+        points and of cells are given. Returns None when the inputs give
+        no estimate.
+        """
+        if points is None or cells is None:
+            headers, bounds = self.inputHeaders(parameters, context)
+            points = sum(h.pointCount for h in headers)
+
+            if cells is None:
+                if self.parameterDefinition('CELLSIZE') is not None and bounds is not None:
+                    cells = fusionMemory.gridCells(bounds, self.parameterAsDouble(parameters, 'CELLSIZE', context))
+                else:
+                    cells = sum(fusionMemory.gridFileCells(f)
+                                for f in self.inputFiles(parameters, context, expandLists=True))
+            if not headers and not cells:
+                return None
+
+        has32, has64 = self.fusionBuilds(tool)
+        return fusionMemory.plan(tool.lower(), points, cells, has32, has64)
+
+    def fusionBuilds(self, tool):
+        """
+        Returns whether the 32-bit and the 64-bit build of a tool are
+        installed.
+        """
+        directory = fusionUtils.fusionDirectory()
+        has32 = os.path.isfile(os.path.join(directory, tool + '.exe'))
+        has64 = os.path.isfile(os.path.join(directory, tool + '64.exe'))
+        if not has32 and not has64:
+            # the installation is not visible from here, e.g. on remote workers
+            has32 = has64 = True
+        return has32, has64
+
+    def fusionExecutable(self, tool, parameters, context, feedback, cells=None, points=None):
+        """
+        Returns the quoted path of the 32-bit or 64-bit build of a FUSION
+        tool. With automatic selection, the default, the build is chosen
+        from the estimated memory use. Runs that probably do not fit in
+        memory even then are reported.
+        """
+        build = self.fusionBuild(parameters, context)
+        use64 = build == self.BUILD_64
+        if build == self.BUILD_AUTO:
+            memoryPlan = self.memoryPlan(tool, parameters, context, cells, points)
+            if memoryPlan is not None:
+                use64 = memoryPlan.use64
+                feedback.pushInfo(self.tr('{}: {}').format(tool, memoryPlan.describe()))
+                if memoryPlan.pieces > 1:
+                    # only the largest tile is given by its cells and points
+                    tile = cells is not None and points is not None
+                    feedback.reportError(self.memoryHint(tool, memoryPlan.pieces, tile))
+
+        executable = tool + ('64.exe' if use64 else '.exe')
+        return '"' + os.path.join(fusionUtils.fusionDirectory(), executable) + '"'
+
+    def memoryHint(self, tool, pieces, tile=False):
+        """
+        Returns the warning for a run that probably does not fit in memory,
+        pointing to smaller tiles when it is a tile.
+        """
+        if tile:
+            return self.tr('The tiles of {} probably do not fit in memory, '
+                           'set a smaller tile size').format(tool)
+        return self.tr('The inputs of {} probably do not fit in memory, '
+                       'consider splitting them into {} parts').format(tool, pieces)
+
+    def processInTiles(self, tool, parameters, context, feedback):
+        """
+        Returns whether to process in tiles: when the TILED parameter is
+        set, or when the build is chosen automatically and a single run
+        probably does not fit in memory.
+        """
+        if self.parameterAsBool(parameters, 'TILED', context):
+            return True
+        if self.fusionBuild(parameters, context) != self.BUILD_AUTO:
+            return False
+        memoryPlan = self.memoryPlan(tool, parameters, context)
+        if memoryPlan is None or memoryPlan.pieces <= 1:
+            return False
+        feedback.pushInfo(self.tr('{}: {}, processing in tiles').format(tool, memoryPlan.describe()))
+        return True
+
+    def inputTiles(self, tool, parameters, context, feedback, cellSize, tileSize=0, buffer=0, balanced=False):
+        """
+        Splits the extent of the input files into tiles aligned to the
+        cells of the product, each with the input files that touch the tile
+        and its buffer. Tiles without inputs are dropped. Without a tile
+        size the tile size is tuned, see tunedTileSize(). Balanced tiles
+        are split further with a quadtree, see balancedTiles(). Returns the
+        TileGrid, the tiles and the executable suited to the largest tile.
+        """
+        files = self.inputFiles(parameters, context, expandLists=True)
+        headers = self.lasHeaders(files, feedback)
+        known = [h for h in headers if h is not None]
+        if not known:
+            raise QgsProcessingException(self.tr('The extent of the input files is unknown, '
+                                                 'they can not be processed in tiles'))
+        bounds = headerBounds(known)
+
+        if balanced and tileSize <= 0:
+            tileSize = fusionTiles.quadtreeSize(bounds, cellSize)
+        elif tileSize <= 0:
+            tileSize = self.tunedTileSize(tool, known, bounds, cellSize, buffer, feedback)
+        projectGrid = self.projectGrid(context, cellSize, feedback)
+        if projectGrid is not None:
+            grid = fusionTiles.TileGrid(bounds, cellSize, tileSize, projectGrid.originX, projectGrid.originY)
+        else:
+            grid = fusionTiles.TileGrid(bounds, cellSize, tileSize)
+        tiles = grid.tiles()
+        if balanced:
+            tiles = self.balancedTiles(tool, grid, tiles, known, buffer, feedback)
+        tileFiles = self.filesIntersectingEach(files, [t.bounds(buffer) for t in tiles], feedback)
+        headerOf = dict(zip(files, headers))
+        result = []
+        for tile, names in zip(tiles, tileFiles):
+            # files without a header are passed to every tile
+            if any(headerOf[n] is not None for n in names):
+                tile.files = names
+                result.append(tile)
+
+        for tile in result:
+            tile.points = tile.pointEstimate([headerOf[n] for n in tile.files], buffer)
+        points = max(t.points for t in result)
+        cells = fusionMemory.gridCells(result[0].bounds(buffer), cellSize)
+        if balanced:
+            feedback.pushInfo(self.tr('Processing {} tiles of {} to {} estimated points').format(
+                len(result), min(t.points for t in result), points))
+        else:
+            feedback.pushInfo(self.tr('Processing {} tiles of {} x {}').format(len(result), grid.tileSize, grid.tileSize))
+        return grid, result, self.fusionExecutable(tool, parameters, context, feedback, cells, points)
+
+    def projectGrid(self, context, cellSize, feedback):
+        """
+        Returns the grid of the project products are aligned to, or None.
+        Warns when cells of cellSize do not nest with the grid cells or the
+        grid is in another CRS than the project.
+        """
+        project = context.project() if context is not None else None
+        grid = fusionGrid.projectGrid(project)
+        if grid is None:
+            return None
+        if not grid.compatible(cellSize):
+            feedback.reportError(self.tr('The cell size {} does not nest with the cell size {} of the project grid, '
+                                         'cell edges only partly coincide').format(cellSize, grid.cellSize))
+        if project is not None and grid.crs and project.crs().authid() and project.crs().authid() != grid.crs:
+            feedback.reportError(self.tr('The project grid is defined in {}, the project uses {}').format(
+                grid.crs, project.crs().authid()))
+        return grid
+
+    def gridSwitches(self, parameters, context, feedback, cellSize):
+        """
+        Returns the /gridxy switch that snaps the product of a run to the
+        project grid. Returns no switch without a project grid or when the
+        additional modifiers already set the grid.
+        """
+        modifiers = ''
+        if self.parameterDefinition(self.ADVANCED_MODIFIERS) is not None:
+            modifiers = self.parameterAsString(parameters, self.ADVANCED_MODIFIERS, context).lower()
+        if any(s in modifiers for s in self.GRID_SWITCHES):
+            return []
+        grid = self.projectGrid(context, cellSize, feedback)
+        if grid is None:
+            return []
+
+        bounds = self.inputHeaders(parameters, context, feedback)[1]
+        if bounds is None:
+            feedback.reportError(self.tr('The extent of the input files is unknown, '
+                                         'the output is not aligned to the project grid'))
+            return []
+        return ['/gridxy:{},{},{},{}'.format(*grid.snapBounds(bounds, cellSize))]
+
+    def tunedTileSize(self, tool, headers, bounds, cellSize, buffer, feedback):
+        """
+        Picks the tile size from the densest input file, the memory a tool
+        needs per point, measured in the recorded runs when there are
+        enough of them, and the memory available to each concurrent job.
+        Tiles are also small enough to keep all jobs busy.
+        """
+        densities = [h.pointCount / ((h.maxX - h.minX) * (h.maxY - h.minY))
+                     for h in headers if h.maxX > h.minX and h.maxY > h.minY]
+        density = max(densities) if densities else 0
+        statsFile = fusionUtils.statsFile()
+        records = fusionStats.cachedRuns(statsFile) if statsFile else []
+        bytesPerPoint, bytesPerCell, measured = fusionMemory.memoryProfile(tool.lower(), records)
+        jobs = fusionUtils.maxJobs()
+        budget = fusionMemory.memoryBudget(jobs, self.fusionBuilds(tool)[1])
+        tileSize = fusionTiles.autoTileSize(bounds, cellSize, jobs, density, bytesPerPoint, bytesPerCell,
+                                            budget, buffer)
+        feedback.pushInfo(self.tr('Tile size {} for {:.1f} points per unit area, {:.0f} bytes per point ({}), '
+                                  '{} concurrent jobs{}').format(
+            tileSize, density, bytesPerPoint, self.tr('measured') if measured else self.tr('estimated'), jobs,
+            self.tr(' with {:.0f} MB each').format(budget / fusionMemory.MB) if budget else ''))
+        return tileSize
+
+    def balancedTiles(self, tool, grid, tiles, headers, buffer, feedback):
+        """
+        Splits tiles with a quadtree on the points estimated from the LAS
+        headers, until each tile fits in the memory available to a job and
+        holds no more than its share of the points, so all jobs get about
+        the same work.
+        """
+        statsFile = fusionUtils.statsFile()
+        records = fusionStats.cachedRuns(statsFile) if statsFile else []
+        bytesPerPoint, bytesPerCell, measured = fusionMemory.memoryProfile(tool.lower(), records)
+        jobs = fusionUtils.maxJobs()
+        budget = fusionMemory.memoryBudget(jobs, self.fusionBuilds(tool)[1])
+        target = max(sum(h.pointCount for h in headers) / (fusionTiles.TILES_PER_JOB * jobs), 1)
+
+        def tooLarge(points, cells):
+            if budget and points * bytesPerPoint + cells * bytesPerCell > budget:
+                return True
+            return points > target
+
+        feedback.pushInfo(self.tr('Balancing tiles to {:.0f} points each, {:.0f} bytes per point ({}), '
+                                  '{} concurrent jobs{}').format(
+            target, bytesPerPoint, self.tr('measured') if measured else self.tr('estimated'), jobs,
+            self.tr(' with {:.0f} MB each').format(budget / fusionMemory.MB) if budget else ''))
+        return fusionTiles.balancedTiles(grid, tiles, headers, buffer, tooLarge)
+
+    def tileInfo(self, tile, cellSize, buffer=0):
+        """
+        Key values of the run of a tile, recorded with its resource usage.
+        """
+        return {'algorithm': self.name(),
+                'tile': tile.name(),
+                'cellsize': cellSize,
+                'points': tile.points,
+                'cells': fusionMemory.gridCells(tile.bounds(buffer), cellSize)}
+
+    def tileDirectory(self, tile):
+        directory = QgsProcessingUtils.generateTempFilename(tile.name())
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def runInfo(self, parameters, context):
+        """
+        Key values of a run, recorded with its resource usage.
+        """
+        info = {'algorithm': self.name()}
+        for p in self.parameterDefinitions():
+            if p.type() == 'number' and parameters.get(p.name()) is not None:
+                info[p.name().lower()] = self.parameterAsDouble(parameters, p.name(), context)
+        files = self.inputFiles(parameters, context)
+        info['inputCount'] = len(files)
+        info['inputBytes'] = sum(os.path.getsize(f) for f in files if os.path.isfile(f))
+        headers, bounds = self.inputHeaders(parameters, context)
+        if headers:
+            info['points'] = sum(h.pointCount for h in headers)
+            if 'cellsize' in info:
+                info['cells'] = fusionMemory.gridCells(bounds, info['cellsize'])
+        return info
+
+    def runCommands(self, commands, parameters, context, feedback):
+        result = fusionUtils.execute(commands, feedback,
+                                     outputs=self.output_files,
+                                     info=self.runInfo(parameters, context))
+        self.writeSidecars(feedback)
+        return result
+
+    def writeSidecars(self, feedback=None):
+        """
+        Writes a GDAL VRT next to each .dtm output, so the surface opens in
+        QGIS without converting it.
+        """
+        if not ProcessingConfig.getSetting(fusionUtils.FUSION_VRT_SIDECARS):
+            return
+        for path in self.output_files:
+            if not path or os.path.splitext(path)[1].lower() != '.dtm' or not os.path.isfile(path):
+                continue
+            try:
+                fusionDtm.writeVrt(path)
+            except (OSError, ValueError) as e:
+                if feedback is not None:
+                    feedback.reportError(self.tr('No VRT written for {}: {}').format(path, e))
+
+    def executeJobs(self, commandLists, feedback, labels=None, outputs=None, infos=None):
+        """
+        Runs FUSION commands concurrently and returns their jobs. Raises a
+        QgsProcessingException when a job fails, unless the run was
+        canceled.
+        """
+        with jobExecutor(feedback) as executor:
+            for i, commands in enumerate(commandLists):
+                executor.submit(commands, labels[i] if labels else None,
+                                outputs=outputs[i] if outputs else None,
+                                info=infos[i] if infos else None)
+            return executor.gather()
+
     def setOutputValue(self, name, value):
         self.output_values[name] = value
 
     def prepareReturn(self, parameters):
+        self.writeSidecars()
         results = {}
         for o in self.outputDefinitions():
             if o.name() in parameters:
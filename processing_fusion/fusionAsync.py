@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionAsync.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import asyncio
+import collections
+import locale
+import os
+import signal
+import time
+
+from processing_fusion import fusionUtils
+from processing_fusion.fusionCache import OutputWatch, releaseOutputs
+from processing_fusion.fusionLauncher import launchArguments, removeTemporary
+from processing_fusion.fusionStats import ResourceMonitor
+
+
+class FusionResult:
+    """
+    Outcome of an asynchronous FUSION command.
+    """
+
+    def __init__(self, commands, returnCode, elapsed, output, cached=False):
+        self.commands = commands
+        self.returnCode = returnCode
+        self.elapsed = elapsed
+        self.output = output
+        self.cached = cached
+
+    def succeeded(self):
+        return self.returnCode == 0
+
+    def __repr__(self):
+        return '<FusionResult returnCode={} elapsed={:.1f}s>'.format(self.returnCode, self.elapsed)
+
+
+class FusionProcess:
+    """
+    A running FUSION command. Iterating over it with 'async for' yields the
+    output lines, awaiting wait() returns the FusionResult.
+
+        process = await start(commands)
+        async for line in process:
+            ...
+        result = await process.wait()
+    """
+
+    def __init__(self, commands, process, info=None, temporary=None):
+        self.commands = commands
+        self.process = process
+        self.info = info
+        # files written to launch the command, removed once it exited
+        self.temporary = temporary or []
+        self.start = time.monotonic()
+        self.lines = collections.deque(maxlen=fusionUtils.logLines())
+        self.monitor = ResourceMonitor(process.pid)
+        self.encoding = locale.getpreferredencoding(False)
+        self.result = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        line = await self.process.stdout.readline()
+        if not line:
+            # the output ends as the process exits, the high-water marks of
+            # its processes hold the peak of the whole run
+            self.monitor.sample(force=True)
+            raise StopAsyncIteration
+        self.monitor.sample()
+        line = line.decode(self.encoding, errors='replace')
+        self.lines.append(line)
+        return line
+
+    async def wait(self):
+        """
+        Waits for the command to finish, reading any output not consumed
+        yet. Cancelling the awaiting task terminates the process tree.
+        """
+        if self.result is not None:
+            return self.result
+        try:
+            async for line in self:
+                pass
+            returnCode = await self.process.wait()
+        except asyncio.CancelledError:
+            await self.kill()
+            raise
+        finally:
+            if self.process.returncode is not None:
+                removeTemporary(self.temporary)
+
+        record = self.monitor.result()
+        record['exitCode'] = returnCode
+        record['cached'] = False
+        record['canceled'] = False
+        fusionUtils.recordStats(self.commands, self.info, record)
+
+        self.result = FusionResult(self.commands, returnCode, time.monotonic() - self.start,
+                                   ''.join(self.lines))
+        return self.result
+
+    async def kill(self, timeout=fusionUtils.KILL_TIMEOUT):
+        """
+        Terminates the command together with all of its children.
+        """
+        if self.process.returncode is not None:
+            return
+        if os.name == 'nt':
+            killer = await asyncio.create_subprocess_exec('taskkill', '/F', '/T', '/PID', str(self.process.pid),
+                                                          stdout=asyncio.subprocess.DEVNULL,
+                                                          stderr=asyncio.subprocess.DEVNULL)
+            await killer.wait()
+        else:
+            # the group may exit at any point, it is then gone already
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            except ProcessLookupError:
+                pass
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
+        if self.process.returncode is not None:
+            removeTemporary(self.temporary)
+
+
+async def start(commands, info=None):
+    """
+    Starts a FUSION command with asyncio.create_subprocess_exec(), using the
+    runtime selected in the provider settings.
+    """
+    fusionRuntime = fusionUtils.fusionRuntime()
+    loop = asyncio.get_running_loop()
+    # starting a persistent Wine server blocks, keep it off the event loop
+    await loop.run_in_executor(None, fusionRuntime.warm)
+    argv, env, temporary = launchArguments(commands, fusionRuntime)
+    try:
+        process = await asyncio.create_subprocess_exec(*argv,
+                                                       env=env,
+                                                       stdin=asyncio.subprocess.DEVNULL,
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.STDOUT,
+                                                       **fusionUtils.processGroupArguments())
+    except OSError:
+        removeTemporary(temporary)
+        raise
+    return FusionProcess(commands, process, info, temporary)
+
+
+async def executeAsync(commands, outputs=None, info=None):
+    """
+    Runs a FUSION command and returns its FusionResult. Like
+    fusionUtils.execute(), outputs of an identical earlier run are restored
+    from the result cache when it is enabled.
+    """
+    cache = fusionUtils.resultCache() if outputs else None
+    if cache is not None:
+        started = time.monotonic()
+        key = cache.key(commands, outputs)
+        if cache.restore(key, outputs):
+            elapsed = time.monotonic() - started
+            fusionUtils.recordStats(commands, info, {'wall': round(elapsed, 3),
+                                                     'exitCode': 0,
+                                                     'cached': True})
+            return FusionResult(commands, 0, elapsed, '', cached=True)
+        releaseOutputs(outputs)
+
+    with OutputWatch(outputs if cache is not None else []) as watch:
+        process = await start(commands, info)
+        result = await process.wait()
+
+        if cache is not None and result.returnCode == 0:
+            cache.store(key, outputs, watch)
+    return result
+
+
+async def executeMany(commandLists, maxJobs=None):
+    """
+    Runs FUSION commands concurrently on the running event loop, with at
+    most maxJobs processes at a time, and returns their results in order.
+    """
+    semaphore = asyncio.Semaphore(maxJobs or fusionUtils.maxJobs())
+
+    async def run(commands):
+        async with semaphore:
+            return await executeAsync(commands)
+
+    return await asyncio.gather(*(run(commands) for commands in commandLists))
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionCache.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+from processing_fusion.fusionProgress import splitCommands
+
+META_FILE = 'meta.json'
+
+# watches of the runs in progress, see OutputWatch
+RUNNING = []
+RUNNING_LOCK = threading.Lock()
+
+
+def normalizedPath(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def fileFingerprint(path):
+    """
+    Identifies an input file by path, size and modification time, which is
+    what make-like tools rely on. The content itself is not hashed, since
+    hashing multi-gigabyte point clouds would cost as much as running
+    FUSION, so a file rewritten with the same size within the timestamp
+    resolution of the file system is taken as unchanged.
+    """
+    st = os.stat(path)
+    return [normalizedPath(path), st.st_size, st.st_mtime_ns]
+
+
+def listedFiles(path):
+    """
+    Returns the files named in a FUSION list file, such as the ones written
+    by fusionUtils.filenamesToFile() and layersToFile(), or None if the file
+    is not a list file.
+    """
+    if os.path.splitext(path)[1].lower() != '.txt' or os.path.getsize(path) > 10 * 1024 * 1024:
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            names = [line.strip().strip('"') for line in f if line.strip()]
+    except (OSError, UnicodeDecodeError):
+        return None
+    if not names or not all(os.path.isfile(n) for n in names):
+        return None
+    return names
+
+
+class ResultCache:
+    """
+    Cache of FUSION outputs addressed by the arguments and inputs of a run.
+
+    A run is identified by its arguments, where every input file is replaced
+    by its fingerprint (list files by the fingerprints of the files they
+    name, see fileFingerprint()) and every output file by its position. The
+    files a run produces, found by an OutputWatch, are stored under that key
+    and restored with hard links, or copies when linking is not possible,
+    when the same run is requested again. The least recently used entries
+    are removed when the cache grows above maxBytes.
+    """
+
+    def __init__(self, directory, maxBytes):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, commands, outputs):
+        outputIndex = {normalizedPath(o): i for i, o in enumerate(outputs)}
+        parts = []
+        for token in splitCommands(commands):
+            prefix = ''
+            value = token
+            if token.startswith('/') and ':' in token:
+                prefix, value = token.split(':', 1)
+                prefix += ':'
+            parts.append([prefix] + self.argumentFingerprint(value, outputIndex))
+        text = json.dumps(parts, separators=(',', ':'))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def argumentFingerprint(self, value, outputIndex):
+        if not value:
+            return [value]
+        path = normalizedPath(value)
+        if path in outputIndex:
+            return ['output', outputIndex[path]]
+        if os.path.isfile(value):
+            names = listedFiles(value)
+            if names is not None:
+                return ['list'] + [fileFingerprint(n) for n in names]
+            return ['file'] + fileFingerprint(value)
+        if glob.has_magic(value):
+            matches = sorted(f for f in glob.glob(value) if os.path.isfile(f))
+            if matches:
+                return ['glob', value] + [fileFingerprint(f) for f in matches]
+        return [value]
+
+    def entryPath(self, key):
+        return os.path.join(self.directory, key)
+
+    def restore(self, key, outputs):
+        """
+        Restores the outputs of a cached run. Returns False on a cache miss.
+        """
+        entry = self.entryPath(key)
+        try:
+            with open(os.path.join(entry, META_FILE), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        for item in meta['files']:
+            cached = os.path.join(entry, item['name'])
+            try:
+                st = os.stat(cached)
+            except OSError:
+                st = None
+            if st is None or st.st_size != item['size'] or st.st_mtime_ns != item['mtime']:
+                # an output restored by hard link was modified in place
+                self.remove(key)
+                return False
+
+        for item in meta['files']:
+            stem, _ = os.path.splitext(outputs[item['output']])
+            target = stem + item['suffix']
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            if os.path.lexists(target):
+                os.remove(target)
+            linkOrCopy(os.path.join(entry, item['name']), target)
+
+        os.utime(os.path.join(entry, META_FILE))
+        return True
+
+    def store(self, key, outputs, watch):
+        """
+        Adds the files produced for the outputs, as found by the OutputWatch
+        started before the run, to the cache. Besides the outputs
+        themselves these are the files FUSION writes next to them sharing
+        their base name, such as the .asc copy of a surface or the
+        per-variable tables of GridMetrics. Nothing is stored when another
+        run wrote files with the same base names at the same time, as
+        their files can not be told apart.
+        """
+        entry = self.entryPath(key)
+        if os.path.exists(entry) or watch.conflicted:
+            return
+
+        files = []
+        for i, output in enumerate(outputs):
+            stem = os.path.splitext(os.path.basename(output))[0]
+            for path in watch.produced(i):
+                files.append((i, path, os.path.basename(path)[len(stem):]))
+        if not files:
+            return
+
+        staging = os.path.join(self.directory, 'tmp-' + uuid.uuid4().hex)
+        os.makedirs(staging)
+        try:
+            meta = {'files': [], 'size': 0}
+            for n, (i, path, suffix) in enumerate(files):
+                name = '{}{}'.format(n, suffix)
+                linkOrCopy(path, os.path.join(staging, name))
+                st = os.stat(os.path.join(staging, name))
+                meta['files'].append({'output': i, 'suffix': suffix, 'name': name,
+                                      'size': st.st_size, 'mtime': st.st_mtime_ns})
+                meta['size'] += st.st_size
+            with open(os.path.join(staging, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.rename(staging, entry)
+        except OSError:
+            # another job stored the same run first
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def remove(self, key):
+        shutil.rmtree(self.entryPath(key), ignore_errors=True)
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            meta = os.path.join(self.directory, name, META_FILE)
+            try:
+                with open(meta, 'r', encoding='utf-8') as f:
+                    size = json.load(f)['size']
+                used = os.stat(meta).st_mtime
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((used, name, size))
+            total += size
+
+        entries.sort()
+        while entries and total > self.maxBytes:
+            used, name, size = entries.pop(0)
+            self.remove(name)
+            total -= size
+
+
+def outputFiles(output):
+    """
+    Returns the size and modification time of the files next to an output
+    that share its base name, keyed by path.
+    """
+    directory = os.path.dirname(os.path.abspath(output))
+    stem = os.path.splitext(os.path.basename(output))[0]
+    files = {}
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return files
+    for name in names:
+        if not name.startswith(stem) or name[len(stem):len(stem) + 1] not in ('.', '_', '-'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if os.path.isfile(path):
+            files[path] = (st.st_size, st.st_mtime_ns)
+    return files
+
+
+class OutputWatch:
+    """
+    Finds the files a run writes next to its outputs by comparing the
+    directory listing before and after the run. Watches of runs in progress
+    at the same time whose output base names overlap are marked conflicted,
+    since one run may pick up the files of the other.
+
+        with OutputWatch(outputs) as watch:
+            ...run...
+            cache.store(key, outputs, watch)
+    """
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+        self.stems = [os.path.splitext(normalizedPath(o))[0] for o in outputs]
+        self.conflicted = False
+        self.before = [outputFiles(o) for o in outputs]
+
+    def __enter__(self):
+        with RUNNING_LOCK:
+            for other in RUNNING:
+                if self.overlaps(other):
+                    self.conflicted = other.conflicted = True
+            RUNNING.append(self)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        with RUNNING_LOCK:
+            RUNNING.remove(self)
+        return False
+
+    def overlaps(self, other):
+        return any(a.startswith(b) or b.startswith(a) for a in self.stems for b in other.stems)
+
+    def produced(self, index):
+        """
+        Files of output index that appeared or changed since the watch
+        started.
+        """
+        before = self.before[index]
+        return sorted(path for path, signature in outputFiles(self.outputs[index]).items()
+                      if before.get(path) != signature)
+
+
+def linkOrCopy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def releaseOutputs(outputs):
+    """
+    Removes existing outputs that share their data with a cache entry
+    through a hard link, so that FUSION cannot overwrite the cached copy.
+    """
+    for output in outputs:
+        try:
+            if os.stat(output).st_nlink > 1:
+                os.remove(output)
+        except OSError:
+            pass
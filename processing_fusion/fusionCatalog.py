@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionCatalog.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Native replacement of Catalog.exe.
+
+Extents, point counts and returns come from the LAS headers. Points are
+only read when density or intensity images are requested, one file per
+task of a process pool. The report is written next to the output as
+<name>.html with the file summary in <name>.csv and the images as ESRI
+ASCII rasters <name>_return_density.asc, <name>_first_density.asc and
+<name>_intensity.asc.
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import collections
+import csv
+import html
+import math
+import multiprocessing
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy
+
+from processing_fusion import lasPoints
+from processing_fusion.lasHeader import headerBounds, readHeader
+
+# images of the report, by the Catalog.exe switch requesting them
+IMAGES = collections.OrderedDict([('density', 'return_density'),
+                                  ('first', 'first_density'),
+                                  ('intensity', 'intensity')])
+NODATA = -9999
+
+ImageSpec = collections.namedtuple('ImageSpec', ['kind', 'area', 'minValue', 'maxValue'])
+
+
+def parseImageSpec(kind, text):
+    """
+    Parses the 'area,min,max' value of a /density, /first or /intensity
+    switch. 'area' is the area of an image cell, min and max the range of
+    expected values.
+    """
+    try:
+        area, minValue, maxValue = (float(v) for v in text.split(','))
+    except ValueError:
+        raise ValueError('Expected area,min,max for {}: {}'.format(kind, text))
+    if area <= 0:
+        raise ValueError('The cell area of {} must be positive'.format(kind))
+    return ImageSpec(kind, area, minValue, maxValue)
+
+
+class ImageGrid:
+    """
+    Cell lattice of an image covering bounds, with cells of a given area.
+    """
+
+    def __init__(self, spec, bounds):
+        self.spec = spec
+        self.cellSize = math.sqrt(spec.area)
+        xmin, ymin, xmax, ymax = bounds
+        self.originX = math.floor(xmin / self.cellSize) * self.cellSize
+        self.originY = math.floor(ymin / self.cellSize) * self.cellSize
+        self.columns = int((xmax - self.originX) // self.cellSize) + 1
+        self.rows = int((ymax - self.originY) // self.cellSize) + 1
+
+    def description(self):
+        return (self.spec.kind, self.cellSize, self.originX, self.originY, self.columns, self.rows)
+
+
+def fileGrids(path, grids):
+    """
+    Counts the points of a file in the cells of each image. Runs in the
+    worker processes, grids are given by ImageGrid.description(). Returns
+    the path, the window and arrays of each image, or an error message
+    when the file can not be read.
+    """
+    try:
+        header = readHeader(path)
+        parts = []
+        for kind, cellSize, originX, originY, columns, rows in grids:
+            # cells covering the header extent, points outside are clipped to it
+            column = min(max(int((header.minX - originX) // cellSize), 0), columns - 1)
+            row = min(max(int((header.minY - originY) // cellSize), 0), rows - 1)
+            width = min(int((header.maxX - originX) // cellSize), columns - 1) - column + 1
+            height = min(int((header.maxY - originY) // cellSize), rows - 1) - row + 1
+            width = max(width, 1)
+            height = max(height, 1)
+            parts.append((column, row, width, height, numpy.zeros(width * height, dtype=numpy.int64),
+                          numpy.zeros(width * height, dtype=numpy.float64)))
+
+        for chunk in lasPoints.readChunks(path):
+            for (kind, cellSize, originX, originY, columns, rows), part in zip(grids, parts):
+                column, row, width, height, counts, sums = part
+                x = chunk.x
+                y = chunk.y
+                if kind == 'first':
+                    first = chunk.returnNumber <= 1
+                    x = x[first]
+                    y = y[first]
+                cols = numpy.clip(((x - originX) // cellSize).astype(numpy.int64) - column, 0, width - 1)
+                rws = numpy.clip(((y - originY) // cellSize).astype(numpy.int64) - row, 0, height - 1)
+                cells = cols * height + rws
+                counts += numpy.bincount(cells, minlength=len(counts))
+                if kind == 'intensity':
+                    sums += numpy.bincount(cells, weights=chunk.intensity.astype(numpy.float64),
+                                           minlength=len(sums))
+    except lasPoints.READ_ERRORS as e:
+        # the file is listed as unreadable, the other files are still read
+        return path, None, str(e) or type(e).__name__
+    return path, parts, None
+
+
+def processPool(jobs):
+    """
+    Process pool for the point readers. Inside QGIS on Windows the
+    interpreter is not sys.executable, the workers are started with the
+    python of the QGIS installation.
+    """
+    context = multiprocessing.get_context('spawn')
+    if os.name == 'nt':
+        python = os.path.join(sys.exec_prefix, 'python.exe')
+        if os.path.isfile(python):
+            context.set_executable(python)
+    return ProcessPoolExecutor(max_workers=max(jobs, 1), mp_context=context)
+
+
+def fileArea(header):
+    return max(header.maxX - header.minX, 0) * max(header.maxY - header.minY, 0)
+
+
+def fileDensity(header):
+    area = fileArea(header)
+    return header.pointCount / area if area > 0 else 0.0
+
+
+def runCatalog(files, headers, output, specs, jobs=1, feedback=None):
+    """
+    Writes the catalog report of files with their headers (None for files
+    that are not readable), named after output. specs are the ImageSpecs of
+    the images to create. Returns the paths written, the HTML report first.
+    """
+    base = os.path.splitext(output)[0]
+    bounds = headerBounds([h for h in headers if h is not None])
+
+    images = collections.OrderedDict()
+    problems = collections.OrderedDict()
+    for f, h in zip(files, headers):
+        if h is None:
+            problems[f] = 'not a readable LAS file'
+        elif h.pointCount == 0:
+            problems[f] = 'no points'
+
+    if specs and bounds is not None:
+        grids = [ImageGrid(spec, bounds) for spec in specs]
+        readable = [f for f, h in zip(files, headers)
+                    if h is not None and h.pointCount and lasPoints.canRead(h)]
+        for f, h in zip(files, headers):
+            if h is not None and h.pointCount and not lasPoints.canRead(h):
+                problems[f] = 'compressed, install laspy to include it in the images'
+        images = mosaicGrids(readable, grids, jobs, feedback, problems)
+
+    written = [writeSummary(base + '.csv', files, headers)]
+    coverage = writeCoverage(base + '_coverage.shp', files, headers)
+    if coverage is not None:
+        written.append(coverage)
+    for spec in specs:
+        if spec.kind in images:
+            written.append(writeImage('{}_{}.asc'.format(base, IMAGES[spec.kind]), *images[spec.kind]))
+    written.insert(0, writeReport(base + '.html', files, headers, bounds, specs, images, problems, written))
+    return written
+
+
+def mosaicGrids(files, grids, jobs, feedback, problems):
+    """
+    Reads the points of files in a process pool and adds their cell counts
+    to the images. Returns the grid and values of each image by kind.
+    """
+    counts = {g.spec.kind: numpy.zeros((g.columns, g.rows), dtype=numpy.int64) for g in grids}
+    sums = {g.spec.kind: numpy.zeros((g.columns, g.rows), dtype=numpy.float64) for g in grids}
+    descriptions = [g.description() for g in grids]
+    if feedback is not None:
+        feedback.pushInfo('Reading the points of {} files'.format(len(files)))
+
+    with processPool(jobs) as pool:
+        futures = [pool.submit(fileGrids, f, descriptions) for f in files]
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                path, parts, error = future.result()
+                if error is not None:
+                    problems[path] = error
+                    continue
+                for grid, (column, row, width, height, partCounts, partSums) in zip(grids, parts):
+                    kind = grid.spec.kind
+                    window = (slice(column, column + width), slice(row, row + height))
+                    counts[kind][window] += partCounts.reshape((width, height))
+                    sums[kind][window] += partSums.reshape((width, height))
+                if feedback is not None:
+                    if feedback.isCanceled():
+                        break
+                    feedback.setProgress(100.0 * done / len(futures))
+        finally:
+            for future in futures:
+                future.cancel()
+
+    images = collections.OrderedDict()
+    for grid in grids:
+        kind = grid.spec.kind
+        if kind == 'intensity':
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                values = numpy.where(counts[kind] > 0, sums[kind] / counts[kind], NODATA)
+        else:
+            values = counts[kind] / grid.spec.area
+        images[kind] = (grid, values)
+    return images
+
+
+def writeSummary(path, files, headers):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['File', 'Version', 'Point format', 'Compressed', 'Points',
+                         'Return 1', 'Return 2', 'Return 3', 'Return 4', 'Return 5',
+                         'Min X', 'Min Y', 'Min Z', 'Max X', 'Max Y', 'Max Z', 'Area', 'Density'])
+        for name, h in zip(files, headers):
+            if h is None:
+                writer.writerow([name] + [''] * 17)
+                continue
+            returns = list(h.pointsByReturn[:5]) + [0] * (5 - len(h.pointsByReturn[:5]))
+            writer.writerow([name, h.version, h.pointFormat, int(h.compressed), h.pointCount] + returns +
+                            [h.minX, h.minY, h.minZ, h.maxX, h.maxY, h.maxZ,
+                             '%.4f' % fileArea(h), '%.4f' % fileDensity(h)])
+    return path
+
+
+def writeCoverage(path, files, headers):
+    """
+    Writes the extents of the readable files as rectangles to an ESRI
+    shapefile with the file name, point count and density of each. Returns
+    the path of the .shp file, or None when no file is readable.
+    """
+    records = [(name, h) for name, h in zip(files, headers) if h is not None]
+    if not records:
+        return None
+    base = os.path.splitext(path)[0]
+    bounds = headerBounds([h for name, h in records])
+    # one part of five points, the ring runs clockwise
+    recordSize = 4 + 32 + 4 + 4 + 4 + 5 * 16
+    fileWords = (100 + len(records) * (8 + recordSize)) // 2
+
+    def fileHeader(words):
+        return (struct.pack('>i20xi', 9994, words) +
+                struct.pack('<ii4d4d', 1000, 5, bounds[0], bounds[1], bounds[2], bounds[3], 0, 0, 0, 0))
+
+    with open(base + '.shp', 'wb') as shp, open(base + '.shx', 'wb') as shx:
+        shp.write(fileHeader(fileWords))
+        shx.write(fileHeader((100 + 8 * len(records)) // 2))
+        offset = 100
+        for number, (name, h) in enumerate(records, 1):
+            ring = [(h.minX, h.minY), (h.minX, h.maxY), (h.maxX, h.maxY), (h.maxX, h.minY), (h.minX, h.minY)]
+            shp.write(struct.pack('>ii', number, recordSize // 2))
+            shp.write(struct.pack('<i4dii', 5, h.minX, h.minY, h.maxX, h.maxY, 1, 5))
+            shp.write(struct.pack('<i', 0))
+            for x, y in ring:
+                shp.write(struct.pack('<2d', x, y))
+            shx.write(struct.pack('>ii', offset // 2, recordSize // 2))
+            offset += 8 + recordSize
+
+    fields = [(b'FILE', b'C', 254, 0), (b'POINTS', b'N', 18, 0), (b'DENSITY', b'N', 18, 4)]
+    recordLength = 1 + sum(f[2] for f in fields)
+    with open(base + '.dbf', 'wb') as dbf:
+        dbf.write(struct.pack('<BBBBIHH20x', 3, 126, 1, 1, len(records),
+                              32 + 32 * len(fields) + 1, recordLength))
+        for fieldName, fieldType, size, decimals in fields:
+            dbf.write(struct.pack('<11sc4xBB14x', fieldName, fieldType, size, decimals))
+        dbf.write(b'\r')
+        for name, h in records:
+            values = [name.encode('utf-8')[:254].ljust(254),
+                      str(h.pointCount).encode('ascii').rjust(18),
+                      ('%.4f' % fileDensity(h)).encode('ascii').rjust(18)]
+            dbf.write(b' ' + b''.join(values))
+        dbf.write(b'\x1a')
+    with open(base + '.cpg', 'w') as cpg:
+        cpg.write('UTF-8\n')
+    return base + '.shp'
+
+
+def writeImage(path, grid, values):
+    """
+    Writes an image indexed [column, row] from the south as an ESRI ASCII
+    raster.
+    """
+    with open(path, 'w') as f:
+        f.write('ncols {}\n'.format(grid.columns))
+        f.write('nrows {}\n'.format(grid.rows))
+        f.write('xllcorner {!r}\n'.format(grid.originX))
+        f.write('yllcorner {!r}\n'.format(grid.originY))
+        f.write('cellsize {!r}\n'.format(grid.cellSize))
+        f.write('NODATA_value {}\n'.format(NODATA))
+        numpy.savetxt(f, values.T[::-1], fmt='%.6g')
+    return path
+
+
+def outsideRange(spec, values):
+    """
+    Percentages of the cells with data below and above the expected range.
+    """
+    valid = values[values != NODATA] if spec.kind == 'intensity' else values[values > 0]
+    if valid.size == 0:
+        return 0.0, 0.0
+    return (100.0 * numpy.count_nonzero(valid < spec.minValue) / valid.size,
+            100.0 * numpy.count_nonzero(valid > spec.maxValue) / valid.size)
+
+
+def writeReport(path, files, headers, bounds, specs, images, problems, written):
+    known = [h for h in headers if h is not None]
+    points = sum(h.pointCount for h in known)
+    area = sum(fileArea(h) for h in known)
+    density = next((s for s in specs if s.kind == 'density'), None)
+
+    def cell(value):
+        return '<td>{}</td>'.format(html.escape(str(value)))
+
+    lines = ['<html>', '<head><title>Catalog report</title></head>', '<body>',
+             '<h1>Catalog report</h1>',
+             '<table border="1">',
+             '<tr><th>Files</th>{}</tr>'.format(cell(len(files))),
+             '<tr><th>Readable LAS files</th>{}</tr>'.format(cell(len(known))),
+             '<tr><th>Points</th>{}</tr>'.format(cell(points)),
+             '<tr><th>Area of the file extents</th>{}</tr>'.format(cell('%.2f' % area)),
+             '<tr><th>Average density</th>{}</tr>'.format(cell('%.4f' % (points / area if area else 0)))]
+    if bounds is not None:
+        lines.append('<tr><th>Extent</th>{}</tr>'.format(cell('%.2f, %.2f, %.2f, %.2f' % bounds)))
+    lines.append('</table>')
+
+    if images:
+        lines.append('<h2>Images</h2>')
+        lines.append('<table border="1"><tr><th>Image</th><th>Cell area</th><th>Expected range</th>'
+                     '<th>Cells below</th><th>Cells above</th></tr>')
+        for spec in specs:
+            if spec.kind not in images:
+                continue
+            below, above = outsideRange(spec, images[spec.kind][1])
+            lines.append('<tr>{}{}{}{}{}</tr>'.format(
+                cell(IMAGES[spec.kind]), cell(spec.area), cell('%g - %g' % (spec.minValue, spec.maxValue)),
+                cell('%.1f%%' % below), cell('%.1f%%' % above)))
+        lines.append('</table>')
+
+    if problems:
+        lines.append('<h2>Problems</h2>')
+        lines.append('<table border="1"><tr><th>File</th><th>Problem</th></tr>')
+        for name, problem in problems.items():
+            lines.append('<tr>{}{}</tr>'.format(cell(name), cell(problem)))
+        lines.append('</table>')
+
+    lines.append('<h2>Files</h2>')
+    lines.append('<table border="1"><tr><th>File</th><th>Points</th><th>Min X</th><th>Min Y</th>'
+                 '<th>Max X</th><th>Max Y</th><th>Min Z</th><th>Max Z</th><th>Density</th></tr>')
+    for name, h in zip(files, headers):
+        if h is None:
+            continue
+        flag = ''
+        if density is not None and not density.minValue <= fileDensity(h) <= density.maxValue:
+            flag = ' style="color:red"'
+        lines.append('<tr{}>{}{}{}{}{}{}{}{}{}</tr>'.format(
+            flag, cell(name), cell(h.pointCount), cell(h.minX), cell(h.minY), cell(h.maxX), cell(h.maxY),
+            cell(h.minZ), cell(h.maxZ), cell('%.4f' % fileDensity(h))))
+    lines.append('</table>')
+
+    lines.append('<h2>Outputs</h2><ul>')
+    for name in written:
+        lines.append('<li><a href="{0}">{0}</a></li>'.format(html.escape(os.path.basename(name))))
+    lines.extend(['</ul>', '</body>', '</html>'])
+
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionConvert.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Converts PLANS DTM files without the FUSION executables.
+
+DTMs are read through their memory map, see fusionDtm, a band of raster
+lines at a time, so memory does not grow with the grid. Values are stored
+column by column, a band is copied a column segment at a time and
+transposed in memory, and bands are high enough for each segment to fill
+at least a page. GeoTIFF outputs are written by GDAL from these bands
+and compressed in its own threads.
+Text outputs are formatted a block of values at a time with a single
+format operation, in worker processes since formatting holds the
+interpreter lock.
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+from processing_fusion import fusionCatalog, fusionDtm
+
+FORMATS = ['GeoTIFF', 'Cloud Optimized GeoTIFF']
+COMPRESSIONS = ['DEFLATE', 'ZSTD', 'LZW', 'NONE']
+# side of the tiles of GeoTIFF outputs and of the smallest overview
+BLOCK_SIZE = 512
+# values read from a DTM at a time
+CHUNK_VALUES = fusionDtm.CHUNK_VALUES
+# bytes of each column read at least, a band may hold more than
+# CHUNK_VALUES values on wide grids to keep reads from wasting pages
+COLUMN_READ_BYTES = 4096
+# values formatted as text at a time
+TEXT_CHUNK_VALUES = 1 << 18
+MASK_VALID = 255
+ASCII_NODATA = -9999
+ASCII_MODES = ['grid', 'raster', 'csv']
+
+
+def bandLines(header):
+    """
+    Raster lines of a band: about CHUNK_VALUES values, but at least
+    COLUMN_READ_BYTES of each column.
+    """
+    itemSize = header.dtype().itemsize
+    return max(CHUNK_VALUES // max(header.columns, 1), COLUMN_READ_BYTES // itemSize, 1)
+
+
+def lineBlocks(header, lines=None):
+    """
+    Yields the first and last (exclusive) raster line of consecutive bands,
+    lines running north to south.
+    """
+    if lines is None:
+        lines = bandLines(header)
+    for first in range(0, header.rows, lines):
+        yield first, min(first + lines, header.rows)
+
+
+def rasterLines(values, header, first, last):
+    """
+    Returns raster lines first to last (exclusive) of DTM values indexed
+    [column, row] as an array indexed [line, column]. The band is copied
+    from the memory map as contiguous column segments and transposed in
+    memory.
+    """
+    band = numpy.array(values[:, header.rows - last:header.rows - first])
+    return band.T[::-1]
+
+
+def valueFormat(dtype):
+    """
+    Shortest printf format that keeps every value of dtype.
+    """
+    if dtype.kind in 'iu':
+        return '%d'
+    return '%.7g' if dtype.itemsize <= 4 else '%.15g'
+
+
+def textBlocks(values, header, multiplier=None, nodata=None):
+    """
+    Yields blocks of raster lines of DTM values as (first line, array
+    indexed [line, column]), reading the memory map a band at a time.
+    Values are multiplied by multiplier and voids are set to nodata
+    unless they are None.
+    """
+    for first, last in lineBlocks(header):
+        lines = rasterLines(values, header, first, last)
+        if multiplier is not None or nodata is not None:
+            voids = fusionDtm.voidMask(lines)
+            if multiplier is not None:
+                lines = lines * multiplier
+            if nodata is not None:
+                lines = numpy.where(voids, nodata, lines)
+        step = max(TEXT_CHUNK_VALUES // max(header.columns, 1), 1)
+        for start in range(0, lines.shape[0], step):
+            yield first + start, lines[start:start + step]
+
+
+def formatLines(lines, rowFormat):
+    """
+    Formats an array of lines with one printf format per line.
+    """
+    text = '\n'.join([rowFormat] * lines.shape[0]) + '\n'
+    return text % tuple(lines.ravel().tolist())
+
+
+def dtmToAscii(path, target, mode='grid', multiplier=None):
+    """
+    Writes the values of a DTM as an ESRI ASCII raster or a CSV table.
+    The 'grid' mode puts the lower left corner of the raster on the origin
+    of the DTM, like DTM2ASCII, and the 'raster' mode centers the lower
+    left cell on it. A CSV table starts with the X of each column and each
+    line with its Y. Voids are ASCII_NODATA and values are multiplied by
+    multiplier on the fly.
+    """
+    header, values = fusionDtm.openValues(path)
+    if mode not in ASCII_MODES:
+        raise ValueError('Unknown ASCII mode {}'.format(mode))
+    if multiplier is not None and multiplier != 1:
+        fmt = valueFormat(numpy.dtype(numpy.float64))
+    else:
+        multiplier = None
+        fmt = valueFormat(header.dtype())
+    columns = header.columns
+
+    with open(target, 'w', buffering=1 << 20) as out:
+        if mode == 'csv':
+            out.write(',' + ','.join(repr(float(header.columnX(c))) for c in range(columns)) + '\n')
+        else:
+            shift = header.columnSpacing / 2 if mode == 'raster' else 0.0
+            out.write('ncols {}\n'.format(columns))
+            out.write('nrows {}\n'.format(header.rows))
+            out.write('xllcorner {}\n'.format(repr(header.originX - shift)))
+            out.write('yllcorner {}\n'.format(repr(header.originY - shift)))
+            out.write('cellsize {}\n'.format(repr(header.columnSpacing)))
+            out.write('NODATA_value {}\n'.format(ASCII_NODATA))
+
+        rowFormat = ' '.join([fmt] * columns)
+        for first, lines in textBlocks(values, header, multiplier, ASCII_NODATA):
+            if mode == 'csv':
+                ys = header.rowY(header.rows - 1 - numpy.arange(first, first + lines.shape[0]))
+                lines = numpy.column_stack((ys, lines))
+                out.write(formatLines(lines, ','.join(['%.15g'] + [fmt] * columns)))
+            else:
+                out.write(formatLines(lines, rowFormat))
+    del values
+    return target
+
+
+def dtmToXyz(path, target, csv=False, header=True, voids=False):
+    """
+    Writes the grid nodes of a DTM as X Y Z points, or as a CSV table with
+    an X,Y,Z header line unless header is False. Points are written in
+    the order of the file, a block of columns at a time, with coordinates
+    broadcast from the origin and spacing. Voids are dropped unless voids
+    is True, then they are written with ASCII_NODATA.
+    """
+    dtmHeader, values = fusionDtm.openValues(path)
+    separator = ',' if csv else ' '
+    pointFormat = separator.join(['%.15g', '%.15g', valueFormat(dtmHeader.dtype())])
+    rows = numpy.arange(dtmHeader.rows)
+    ys = dtmHeader.rowY(rows)
+    step = max(TEXT_CHUNK_VALUES // max(dtmHeader.rows, 1), 1)
+
+    with open(target, 'w', buffering=1 << 20) as out:
+        if csv and header:
+            out.write('X,Y,Z\n')
+        for first in range(0, dtmHeader.columns, step):
+            block = numpy.array(values[first:first + step])
+            xs = dtmHeader.columnX(numpy.arange(first, first + block.shape[0]))
+            points = numpy.empty((block.size, 3), dtype=numpy.float64)
+            points[:, 0] = numpy.repeat(xs, dtmHeader.rows)
+            points[:, 1] = numpy.tile(ys, block.shape[0])
+            points[:, 2] = block.ravel()
+            void = fusionDtm.voidMask(block).ravel()
+            if voids:
+                points[void, 2] = ASCII_NODATA
+            else:
+                points = points[~void]
+            if len(points):
+                out.write(formatLines(points, pointFormat))
+    del values
+    return target
+
+
+def gdalError(message):
+    error = gdal.GetLastErrorMsg() if gdal is not None else ''
+    return RuntimeError('{}: {}'.format(message, error) if error else message)
+
+
+def tiffOptions(header, cog, compression, threads, mask=False):
+    options = ['COMPRESS=' + compression, 'NUM_THREADS={}'.format(max(threads, 1)), 'BIGTIFF=IF_SAFER']
+    if compression != 'NONE' and not mask:
+        # floating point predictor for float values, horizontal otherwise
+        if cog:
+            options.append('PREDICTOR=YES')
+        else:
+            options.append('PREDICTOR={}'.format(3 if header.valueType >= 2 else 2))
+    if cog:
+        options += ['BLOCKSIZE={}'.format(BLOCK_SIZE),
+                    'RESAMPLING={}'.format('NEAREST' if mask else 'AVERAGE')]
+    else:
+        options += ['TILED=YES', 'BLOCKXSIZE={}'.format(BLOCK_SIZE), 'BLOCKYSIZE={}'.format(BLOCK_SIZE), 'TFW=YES']
+    return options
+
+
+def overviewLevels(header):
+    levels = []
+    level = 2
+    while max(header.columns, header.rows) / level >= BLOCK_SIZE:
+        levels.append(level)
+        level *= 2
+    return levels
+
+
+def writeTiff(path, header, target, options, mask=False):
+    """
+    Writes the values of a DTM, with voids as nodata, or its mask,
+    MASK_VALID for values and 0 for voids, to a tiled GeoTIFF. Values are
+    written a band of raster lines at a time, see rasterLines(), GDAL
+    would read them a line at a time across all columns.
+    """
+    if mask:
+        dataType = gdal.GDT_Byte
+    else:
+        dataType = gdal.GetDataTypeByName(fusionDtm.GDAL_TYPES[header.valueType])
+    driver = gdal.GetDriverByName('GTiff')
+    dataset = driver.Create(target, header.columns, header.rows, 1, dataType, options)
+    if dataset is None:
+        raise gdalError('Can not create {}'.format(target))
+    source = gdal.Open(fusionDtm.vrtXml(path, header, relative=False))
+    if source is None:
+        raise gdalError('Can not read {}'.format(path))
+    dataset.SetGeoTransform(source.GetGeoTransform())
+    if source.GetProjectionRef():
+        dataset.SetProjection(source.GetProjectionRef())
+    source = None
+    band = dataset.GetRasterBand(1)
+    if not mask:
+        band.SetNoDataValue(fusionDtm.VOID)
+    values = fusionDtm.openValues(path, header)[1]
+    for first, last in lineBlocks(header):
+        lines = rasterLines(values, header, first, last)
+        if mask:
+            lines = numpy.where(fusionDtm.voidMask(lines), 0, MASK_VALID).astype(numpy.uint8)
+        band.WriteArray(lines, 0, first)
+    del values
+    return dataset
+
+
+def dtmToTiff(path, target, cog=False, compression='DEFLATE', overviews=True, mask=False, threads=1):
+    """
+    Converts a DTM to a tiled, compressed GeoTIFF or Cloud Optimized
+    GeoTIFF with overviews. A mask holds MASK_VALID for cells with values
+    and 0 for voids instead of the values.
+    """
+    if gdal is None:
+        raise RuntimeError('GDAL is not available')
+    header = fusionDtm.readHeader(path)
+    if header.columns <= 0 or header.rows <= 0:
+        raise ValueError('The DTM {} has no values'.format(path))
+    options = tiffOptions(header, cog, compression, threads, mask)
+    if not overviews:
+        options = [o for o in options if not o.startswith('RESAMPLING=')] + (['OVERVIEWS=NONE'] if cog else [])
+
+    if not cog:
+        dataset = writeTiff(path, header, target, options, mask)
+        levels = overviewLevels(header)
+        if overviews and levels:
+            gdal.SetThreadLocalConfigOption('COMPRESS_OVERVIEW', compression)
+            gdal.SetThreadLocalConfigOption('GDAL_NUM_THREADS', str(max(threads, 1)))
+            dataset.BuildOverviews('NEAREST' if mask else 'AVERAGE', levels)
+        dataset = None
+        return target
+
+    # COG can only be copied from a complete dataset, the values or the
+    # mask are written to a plain GeoTIFF first
+    staging = target + '.staging.tif'
+    source = writeTiff(path, header, staging, ['TILED=YES', 'COMPRESS=DEFLATE', 'BIGTIFF=IF_SAFER',
+                                               'NUM_THREADS={}'.format(max(threads, 1))], mask)
+    try:
+        source.FlushCache()
+        dataset = gdal.Translate(target, source, format='COG', creationOptions=options)
+        if dataset is None:
+            raise gdalError('Can not write {}'.format(target))
+        dataset = None
+    finally:
+        source = None
+        if os.path.exists(staging):
+            os.remove(staging)
+    return target
+
+
+def convertDtms(pairs, convert, jobs=1, feedback=None, processes=False, **options):
+    """
+    Converts (dtm, target) pairs in up to 'jobs' concurrent conversions.
+    With processes, convert(dtm, target, **options) runs in worker
+    processes, for text outputs whose formatting holds the interpreter
+    lock. Otherwise it runs in threads as convert(dtm, target,
+    threads=..., **options), sharing the CPUs between them, for GDAL
+    outputs as GDAL releases the lock. Returns the targets written and
+    the (dtm, error) pairs of failed conversions.
+    """
+    jobs = max(min(jobs, len(pairs)), 1)
+    written = []
+    errors = []
+    if processes:
+        executor = fusionCatalog.processPool(jobs)
+    else:
+        options['threads'] = max((os.cpu_count() or 1) // jobs, 1)
+        executor = ThreadPoolExecutor(max_workers=jobs)
+    with executor:
+        futures = [(dtm, executor.submit(convert, dtm, target, **options))
+                   for dtm, target in pairs]
+        for done, (dtm, future) in enumerate(futures):
+            if feedback is not None and feedback.isCanceled():
+                for _, f in futures:
+                    f.cancel()
+                break
+            try:
+                written.append(future.result())
+            except (OSError, ValueError, RuntimeError) as e:
+                errors.append((dtm, str(e)))
+            if feedback is not None:
+                feedback.setProgress(100 * (done + 1) / len(futures))
+    return written, errors
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionDtm.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Reads and writes PLANS DTM files, the surface format of FUSION.
+
+A .dtm file has a 200 byte little endian header followed by the grid
+values. Values are stored column by column from west to east, each column
+from south to north, starting at the origin in the lower left grid node.
+Voids hold -1 (VOID), the value FUSION writes for them; other negative
+values, such as ground below sea level, are kept as values.
+
+Grids are exposed as numpy memory maps indexed [column, row], so surfaces
+larger than memory are read and written a part at a time by the OS. A GDAL
+VRT sidecar describes the same layout to GDAL, so QGIS opens a .dtm file
+directly without converting it.
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import os
+import struct
+from xml.sax.saxutils import escape
+
+import numpy
+
+HEADER_SIZE = 200
+SIGNATURE = b'PLANS-PC BINARY .DTM'
+VERSION = 3.1
+# value of void cells, written by FUSION and used as the nodata value of
+# VRTs and converted rasters
+VOID = -1
+# GDAL names of the value types
+GDAL_TYPES = {0: 'Int16', 1: 'Int32', 2: 'Float32', 3: 'Float64'}
+# EPSG code before zone 1 and the last zone defined of UTM north by
+# horizontal datum of the header, NAD27 and NAD83
+UTM_EPSG = {1: (26700, 22), 2: (26900, 23)}
+# plan units of the header in metres
+PLAN_UNITS_METRES = 1
+# values handled at a time when filling or scanning a memory mapped grid
+CHUNK_VALUES = 1 << 22
+
+# value types of the header and their little endian storage types
+VALUE_TYPES = {0: numpy.dtype('<i2'),
+               1: numpy.dtype('<i4'),
+               2: numpy.dtype('<f4'),
+               3: numpy.dtype('<f8')}
+
+# name, struct format and offset of the header fields
+FIELDS = [('signature', '21s', 0),
+          ('name', '61s', 21),
+          ('version', 'f', 82),
+          ('originX', 'd', 86),
+          ('originY', 'd', 94),
+          ('minZ', 'd', 102),
+          ('maxZ', 'd', 110),
+          ('rotation', 'd', 118),
+          ('columnSpacing', 'd', 126),
+          ('pointSpacing', 'd', 134),
+          ('columns', 'i', 142),
+          ('rows', 'i', 146),
+          ('planUnits', 'h', 150),
+          ('elevationUnits', 'h', 152),
+          ('valueType', 'h', 154),
+          ('coordinateSystem', 'h', 156),
+          ('zone', 'h', 158),
+          ('horizontalDatum', 'h', 160),
+          ('verticalDatum', 'h', 162),
+          ('bias', 'd', 164)]
+
+
+class DtmHeader:
+    """
+    Header of a PLANS DTM file. 'rows' is the number of points in each
+    column.
+    """
+
+    def __init__(self, **values):
+        self.signature = SIGNATURE
+        self.name = b''
+        self.version = VERSION
+        self.originX = 0.0
+        self.originY = 0.0
+        self.minZ = 0.0
+        self.maxZ = 0.0
+        self.rotation = 0.0
+        self.columnSpacing = 1.0
+        self.pointSpacing = 1.0
+        self.columns = 0
+        self.rows = 0
+        self.planUnits = 0
+        self.elevationUnits = 0
+        self.valueType = 2
+        self.coordinateSystem = 0
+        self.zone = 0
+        self.horizontalDatum = 0
+        self.verticalDatum = 0
+        self.bias = 0.0
+        for key, value in values.items():
+            setattr(self, key, value)
+
+    @classmethod
+    def unpack(cls, data):
+        if len(data) < HEADER_SIZE or not data.startswith(b'PLANS-PC BINARY'):
+            raise ValueError('Not a PLANS DTM file')
+        values = {}
+        for name, fmt, offset in FIELDS:
+            values[name] = struct.unpack_from('<' + fmt, data, offset)[0]
+        values['name'] = values['name'].split(b'\0')[0]
+        # the bias was added in version 3.1 of the format
+        if values['version'] < 3.1:
+            values['bias'] = 0.0
+        return cls(**values)
+
+    def pack(self):
+        data = bytearray(HEADER_SIZE)
+        for name, fmt, offset in FIELDS:
+            struct.pack_into('<' + fmt, data, offset, getattr(self, name))
+        return bytes(data)
+
+    def copy(self, **values):
+        header = DtmHeader(**self.__dict__)
+        for key, value in values.items():
+            setattr(header, key, value)
+        return header
+
+    def dtype(self):
+        try:
+            return VALUE_TYPES[self.valueType]
+        except KeyError:
+            raise ValueError('Unknown DTM value type {}'.format(self.valueType))
+
+    def dataSize(self):
+        return self.columns * self.rows * self.dtype().itemsize
+
+    def columnX(self, column):
+        return self.originX + column * self.columnSpacing
+
+    def rowY(self, row):
+        return self.originY + row * self.pointSpacing
+
+
+def readHeader(path):
+    with open(path, 'rb') as f:
+        return DtmHeader.unpack(f.read(HEADER_SIZE))
+
+
+def writeHeader(path, header):
+    """
+    Rewrites the header of an existing DTM, leaving its values in place.
+    """
+    with open(path, 'r+b') as f:
+        f.write(header.pack())
+
+
+def openValues(path, header=None, mode='r'):
+    """
+    Returns the header of a DTM and its values as a numpy memory map
+    indexed [column, row], rows from south to north. Use mode 'r+' to
+    change values in place.
+    """
+    if header is None:
+        header = readHeader(path)
+    if header.columns <= 0 or header.rows <= 0:
+        return header, numpy.zeros((max(header.columns, 0), max(header.rows, 0)), dtype=header.dtype())
+    if os.path.getsize(path) < HEADER_SIZE + header.dataSize():
+        raise ValueError('The DTM {} is shorter than its header says'.format(path))
+    values = numpy.memmap(path, dtype=header.dtype(), mode=mode, offset=HEADER_SIZE,
+                          shape=(header.columns, header.rows), order='C')
+    return header, values
+
+
+def createDtm(path, header, fill=VOID):
+    """
+    Creates a DTM with header and every value set to fill, and returns
+    its values as a writable memory map indexed [column, row]. Set the
+    values, then call finishDtm() to store the value range.
+    """
+    with open(path, 'wb') as f:
+        f.write(header.pack())
+        f.truncate(HEADER_SIZE + header.dataSize())
+    values = openValues(path, header, 'r+')[1]
+    if fill != 0:
+        # fill a band of columns at a time to keep few pages dirty
+        step = max(CHUNK_VALUES // max(header.rows, 1), 1)
+        for column in range(0, header.columns, step):
+            values[column:column + step] = fill
+    return values
+
+
+def finishDtm(path, header, values):
+    """
+    Flushes the values of a DTM created by createDtm() and stores their
+    range in its header. Returns the updated header.
+    """
+    if isinstance(values, numpy.memmap):
+        values.flush()
+    zRange = None
+    step = max(CHUNK_VALUES // max(header.rows, 1), 1)
+    for column in range(0, header.columns, step):
+        zRange = mergeRanges(zRange, valueRange(values[column:column + step]))
+    if zRange is not None:
+        header = header.copy(minZ=zRange[0], maxZ=zRange[1])
+        writeHeader(path, header)
+    return header
+
+
+def writeDtm(path, header, columns):
+    """
+    Writes a DTM from an iterable of arrays of consecutive columns indexed
+    [column, row], so the grid is never held in memory at once. The value
+    range is taken from the columns. Returns the header written.
+    """
+    zRange = None
+    written = 0
+    dtype = header.dtype()
+    with open(path, 'wb') as f:
+        f.write(header.pack())
+        for values in columns:
+            values = numpy.asarray(values, dtype=dtype)
+            if values.ndim != 2 or values.shape[1] != header.rows:
+                raise ValueError('Columns of {} rows expected'.format(header.rows))
+            values.tofile(f)
+            written += values.shape[0]
+            zRange = mergeRanges(zRange, valueRange(values))
+        if written != header.columns:
+            raise ValueError('{} columns written, the header has {}'.format(written, header.columns))
+        if zRange is not None:
+            header = header.copy(minZ=zRange[0], maxZ=zRange[1])
+            f.seek(0)
+            f.write(header.pack())
+    return header
+
+
+def readColumns(path, header, first=0, last=None):
+    """
+    Reads columns first to last (exclusive) of a DTM as an array indexed
+    [column, row], rows from south to north.
+    """
+    if last is None:
+        last = header.columns
+    return numpy.array(openValues(path, header)[1][first:last])
+
+
+def voidMask(values):
+    """
+    Cells holding VOID. Other negative values, such as ground below sea
+    level, are values, so a mask agrees with the nodata value of VRTs.
+    """
+    return values == VOID
+
+
+def valueRange(values):
+    """
+    Returns the smallest and largest value that is not a void, or None.
+    """
+    valid = values[~voidMask(values)]
+    if valid.size == 0:
+        return None
+    return float(valid.min()), float(valid.max())
+
+
+def mergeRanges(first, second):
+    """
+    Union of two value ranges, either of which may be None.
+    """
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return min(first[0], second[0]), max(first[1], second[1])
+
+
+def vrtPath(path):
+    return os.path.splitext(path)[0] + '.vrt'
+
+
+def headerSrs(header):
+    """
+    Returns the EPSG code of the CRS given by the header, or None. Only
+    UTM zones with EPSG codes on NAD27 and NAD83 in metres are identified.
+    """
+    if header.coordinateSystem != 1 or header.planUnits != PLAN_UNITS_METRES:
+        return None
+    if header.horizontalDatum not in UTM_EPSG:
+        return None
+    base, lastZone = UTM_EPSG[header.horizontalDatum]
+    if not 1 <= header.zone <= lastZone:
+        return None
+    return 'EPSG:{}'.format(base + header.zone)
+
+
+def vrtXml(path, header=None, srs=None, relative=True):
+    """
+    Returns a GDAL VRT that maps the values of a DTM in place. Lines of the
+    raster run north to south, so each line starts at the last value of
+    the first column and steps one value back per line and one column
+    forward per pixel. Values are grid nodes, cells are centered on them.
+    Voids are the nodata value. A VRT that is not stored next to the DTM
+    refers to it by its absolute path.
+    """
+    if header is None:
+        header = readHeader(path)
+    size = header.dtype().itemsize
+    top = header.originY + (header.rows - 0.5) * header.pointSpacing
+    geoTransform = (header.originX - header.columnSpacing / 2, header.columnSpacing, 0.0,
+                    top, 0.0, -header.pointSpacing)
+    srs = srs or headerSrs(header)
+    lines = ['<VRTDataset rasterXSize="{}" rasterYSize="{}">'.format(header.columns, header.rows)]
+    if srs:
+        lines.append('  <SRS>{}</SRS>'.format(escape(srs)))
+    lines += ['  <GeoTransform>{}</GeoTransform>'.format(', '.join(repr(float(v)) for v in geoTransform)),
+              '  <VRTRasterBand dataType="{}" band="1" subClass="VRTRawRasterBand">'.format(
+                  GDAL_TYPES[header.valueType]),
+              '    <NoDataValue>{}</NoDataValue>'.format(VOID),
+              '    <SourceFilename relativeToVRT="{}">{}</SourceFilename>'.format(
+                  1 if relative else 0, escape(os.path.basename(path) if relative else os.path.abspath(path))),
+              '    <ImageOffset>{}</ImageOffset>'.format(HEADER_SIZE + (header.rows - 1) * size),
+              '    <PixelOffset>{}</PixelOffset>'.format(header.rows * size),
+              '    <LineOffset>{}</LineOffset>'.format(-size),
+              '    <ByteOrder>LSB</ByteOrder>',
+              '  </VRTRasterBand>',
+              '</VRTDataset>']
+    return '\n'.join(lines) + '\n'
+
+
+def writeVrt(path, header=None, srs=None):
+    """
+    Writes the VRT of a DTM next to it, see vrtXml(). Returns the path of
+    the VRT.
+    """
+    target = vrtPath(path)
+    with open(target, 'w') as f:
+        f.write(vrtXml(path, header, srs))
+    return target
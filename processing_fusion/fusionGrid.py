@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionGrid.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Project grid that gridded FUSION products are aligned to.
+
+The grid is stored in the QGIS project. Runs of gridded tools snap their
+extent to it, so the cells of products from separate runs, tiles or
+workers coincide and can be mosaicked without resampling.
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import math
+
+from qgis.core import QgsProject
+
+SCOPE = 'fusion'
+# tolerance in cells when snapping coordinates that are on the lattice
+EPSILON = 1e-6
+
+
+class ProjectGrid:
+    """
+    Cell lattice with its origin at (originX, originY). Products with the
+    grid cell size, or a multiple or divisor of it, share cell edges.
+    """
+
+    def __init__(self, originX, originY, cellSize=0.0, crs=''):
+        self.originX = originX
+        self.originY = originY
+        self.cellSize = cellSize
+        self.crs = crs
+
+    def snapBounds(self, bounds, cellSize):
+        """
+        Returns the smallest bounds on the lattice of cellSize from the
+        grid origin that cover bounds (xmin, ymin, xmax, ymax).
+        """
+        xmin, ymin, xmax, ymax = bounds
+        columns = (math.floor((xmin - self.originX) / cellSize + EPSILON),
+                   math.ceil((xmax - self.originX) / cellSize - EPSILON))
+        rows = (math.floor((ymin - self.originY) / cellSize + EPSILON),
+                math.ceil((ymax - self.originY) / cellSize - EPSILON))
+        return (self.originX + columns[0] * cellSize,
+                self.originY + rows[0] * cellSize,
+                self.originX + max(columns[1], columns[0] + 1) * cellSize,
+                self.originY + max(rows[1], rows[0] + 1) * cellSize)
+
+    def compatible(self, cellSize):
+        """
+        True if cells of cellSize nest with the cells of the grid.
+        """
+        if self.cellSize <= 0:
+            return True
+        ratio = max(cellSize, self.cellSize) / min(cellSize, self.cellSize)
+        return abs(ratio - round(ratio)) < EPSILON * ratio
+
+    def __repr__(self):
+        return '<ProjectGrid ({}, {}) {} {}>'.format(self.originX, self.originY, self.cellSize, self.crs)
+
+
+def projectGrid(project=None):
+    """
+    Returns the grid stored in a project, by default the current one, or
+    None when the project has no grid.
+    """
+    project = project or QgsProject.instance()
+    originX, ok = project.readDoubleEntry(SCOPE, '/grid/originX', 0.0)
+    if not ok:
+        return None
+    originY, ok = project.readDoubleEntry(SCOPE, '/grid/originY', 0.0)
+    if not ok:
+        return None
+    cellSize = project.readDoubleEntry(SCOPE, '/grid/cellSize', 0.0)[0]
+    crs = project.readEntry(SCOPE, '/grid/crs', '')[0]
+    return ProjectGrid(originX, originY, cellSize, crs)
+
+
+def setProjectGrid(grid, project=None):
+    project = project or QgsProject.instance()
+    project.writeEntryDouble(SCOPE, '/grid/originX', grid.originX)
+    project.writeEntryDouble(SCOPE, '/grid/originY', grid.originY)
+    project.writeEntryDouble(SCOPE, '/grid/cellSize', grid.cellSize)
+    project.writeEntry(SCOPE, '/grid/crs', grid.crs)
+
+
+def clearProjectGrid(project=None):
+    project = project or QgsProject.instance()
+    project.removeEntry(SCOPE, '/grid')
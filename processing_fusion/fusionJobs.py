@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionJobs.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import abc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.core import (QgsProcessingException,
+                       QgsProcessingFeedback
+                      )
+
+from processing_fusion import fusionUtils
+
+
+class JobFeedback(QgsProcessingFeedback):
+    """
+    Feedback channel of a single job. Messages are forwarded to the parent
+    feedback prefixed with the job label, progress is reported to the
+    executor which combines the progress of all jobs.
+    """
+
+    def __init__(self, executor, label):
+        super().__init__()
+        self.executor = executor
+        self.label = label
+
+    def isCanceled(self):
+        return super().isCanceled() or self.executor.isCanceled()
+
+    def setProgress(self, progress):
+        super().setProgress(progress)
+        self.executor.jobProgressChanged()
+
+    def pushInfo(self, info):
+        self.executor.forward('pushInfo', self.label, info)
+
+    def pushCommandInfo(self, info):
+        self.executor.forward('pushCommandInfo', self.label, info)
+
+    def pushConsoleInfo(self, info):
+        self.executor.forward('pushConsoleInfo', self.label, info)
+
+    def pushDebugInfo(self, info):
+        self.executor.forward('pushDebugInfo', self.label, info)
+
+    def reportError(self, error, fatalError=False):
+        self.executor.forward('reportError', self.label, error)
+
+
+class FusionJob:
+    """
+    A FUSION command submitted to a FusionJobExecutor.
+    """
+
+    def __init__(self, commands, label, feedback, kwargs):
+        self.commands = commands
+        self.label = label
+        self.feedback = feedback
+        self.kwargs = kwargs
+        self.returnCode = None
+        self.exception = None
+        self.elapsed = None
+        self.skipped = False
+        self.future = None
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def succeeded(self):
+        return self.failure() is None
+
+    def failure(self):
+        """
+        Reason the job failed, or None when it ran and exited with 0.
+        """
+        if self.skipped:
+            return 'canceled'
+        if self.exception is not None:
+            return str(self.exception)
+        if self.returnCode != 0:
+            return 'exit code {}'.format(self.returnCode)
+        return None
+
+    def result(self):
+        self.future.result()
+        return self.returnCode
+
+
+class JobExecutor(abc.ABC):
+    """
+    Jobs submitted for execution, with their combined progress and
+    feedback. Each job gets its own feedback object, so that the output of
+    concurrent jobs stays identifiable, and the progress of the parent
+    feedback is the combined progress of all submitted jobs. Subclasses
+    implement submit(), which creates the job and sets its future.
+    """
+
+    def __init__(self, feedback=None):
+        self.feedback = feedback if feedback is not None else QgsProcessingFeedback()
+        self.jobs = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.shutdown()
+        return False
+
+    def isCanceled(self):
+        return self.feedback.isCanceled()
+
+    @abc.abstractmethod
+    def submit(self, commands, label=None, **kwargs):
+        """
+        Creates a job running the commands and returns it, with its future
+        set.
+        """
+
+    def createJob(self, commands, label, kwargs):
+        with self.lock:
+            if label is None:
+                label = 'job {}'.format(len(self.jobs) + 1)
+            job = FusionJob(commands, label, JobFeedback(self, label), kwargs)
+            self.jobs.append(job)
+        return job
+
+    def gather(self, raiseOnError=True):
+        """
+        Waits for all submitted jobs and returns them in submission order.
+        Jobs that raised, exited with a nonzero code or were skipped after
+        a cancel are failures, see FusionJob.failure(). Unless raiseOnError
+        is False they raise a QgsProcessingException, otherwise callers must
+        check each job with FusionJob.succeeded(). Nothing is raised after
+        a cancel, callers check the feedback for it.
+        """
+        for job in list(self.jobs):
+            job.future.result()
+
+        failed = [job for job in self.jobs if not job.succeeded()]
+        if failed and raiseOnError and not self.isCanceled():
+            raise QgsProcessingException(
+                '{} of {} FUSION jobs failed: {}'.format(
+                    len(failed), len(self.jobs),
+                    '; '.join('{}: {}'.format(job.label, job.failure()) for job in failed)))
+        return list(self.jobs)
+
+    def shutdown(self):
+        pass
+
+    def forward(self, method, label, message):
+        with self.lock:
+            getattr(self.feedback, method)('[{}] {}'.format(label, message))
+
+    def jobProgressChanged(self):
+        with self.lock:
+            if not self.jobs:
+                return
+            total = 0.0
+            for job in self.jobs:
+                if job.done():
+                    total += 100.0
+                else:
+                    total += job.feedback.progress()
+            self.feedback.setProgress(total / len(self.jobs))
+
+
+
+class FusionJobExecutor(JobExecutor):
+    """
+    Runs many FUSION commands with a bounded number of concurrent processes.
+    Every job is run through fusionUtils.execute(), keyword arguments given
+    to submit() are passed on to it.
+
+        with FusionJobExecutor(feedback) as executor:
+            for commands in commandLists:
+                executor.submit(commands)
+            jobs = executor.gather()
+    """
+
+    def __init__(self, feedback=None, maxJobs=None):
+        super().__init__(feedback)
+        self.maxJobs = maxJobs if maxJobs else fusionUtils.maxJobs()
+        self.pool = None
+
+    def submit(self, commands, label=None, **kwargs):
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.maxJobs,
+                                           thread_name_prefix='fusion')
+        job = self.createJob(commands, label, kwargs)
+        job.future = self.pool.submit(self._run, job)
+        return job
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+    def _run(self, job):
+        if self.isCanceled():
+            job.skipped = True
+            return
+
+        start = time.monotonic()
+        try:
+            job.returnCode = fusionUtils.execute(job.commands, job.feedback, **job.kwargs)
+        except Exception as e:
+            job.exception = e
+        finally:
+            job.elapsed = time.monotonic() - start
+            job.feedback.setProgress(100)
+
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionLauncher.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import contextlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from processing_fusion.fusionCache import listedFiles
+from processing_fusion.fusionProgress import splitCommands
+
+RUNTIMES = ['Native', 'Wine']
+
+# seconds allowed for starting the persistent wine server
+WINE_START_TIMEOUT = 60
+
+
+class NativeRuntime:
+    """
+    Runs FUSION executables directly.
+    """
+
+    def argv(self, arguments, temporary):
+        return arguments
+
+    def environment(self):
+        return None
+
+    def warm(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class WineRuntime:
+    """
+    Runs FUSION executables through Wine. A persistent wineserver keeps the
+    prefix loaded between commands, so only the first command of a session
+    pays for starting Wine.
+    """
+
+    def __init__(self, wine='wine', prefix=None):
+        self.wine = wine or 'wine'
+        self.prefix = prefix or None
+        self.warmed = False
+        self.lock = threading.Lock()
+
+    def wineserver(self):
+        wine = shutil.which(self.wine) or self.wine
+        sibling = os.path.join(os.path.dirname(wine), 'wineserver')
+        if os.path.isfile(sibling):
+            return sibling
+        return shutil.which('wineserver') or 'wineserver'
+
+    def environment(self):
+        env = dict(os.environ)
+        env.setdefault('WINEDEBUG', '-all')
+        if self.prefix:
+            env['WINEPREFIX'] = self.prefix
+        return env
+
+    def argv(self, arguments, temporary):
+        """
+        Returns the Wine command line of FUSION arguments. Files written
+        for it, list files with converted paths, are added to temporary.
+        """
+        return [self.wine, arguments[0]] + [self.windowsArgument(a, temporary) for a in arguments[1:]]
+
+    def windowsArgument(self, argument, temporary):
+        switch, separator, value = argument.partition(':')
+        if argument.startswith('/') and separator and '/' not in switch[1:]:
+            if isHostPath(value):
+                return '{}:{}'.format(switch, self.windowsPath(value, temporary))
+            return argument
+        if isHostPath(argument):
+            return self.windowsPath(argument, temporary)
+        return argument
+
+    def windowsPath(self, path, temporary):
+        if os.path.isfile(path):
+            names = listedFiles(path)
+            if names is not None:
+                path = self.windowsListFile(path, names, temporary)
+        # Wine maps the host root to drive Z: by default
+        return 'Z:' + os.path.abspath(path).replace('/', '\\')
+
+    def windowsListFile(self, path, names, temporary):
+        """
+        Writes a copy of a list file with Windows paths to the temporary
+        folder, leaving the folder of the list file alone.
+        """
+        stem, ext = os.path.splitext(os.path.basename(path))
+        handle, converted = tempfile.mkstemp(prefix=stem + '_wine_', suffix=ext)
+        temporary.append(converted)
+        with open(handle, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.windowsPath(n, temporary) for n in names))
+        return converted
+
+    def warm(self):
+        with self.lock:
+            if self.warmed:
+                return
+            env = self.environment()
+            subprocess.run([self.wineserver(), '--persistent'], env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           timeout=WINE_START_TIMEOUT)
+            # boot the prefix once, its services stay up with the server
+            subprocess.run([self.wine, 'cmd', '/c', 'exit'], env=env,
+                           stdin=subprocess.DEVNULL,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           timeout=WINE_START_TIMEOUT)
+            self.warmed = True
+
+    def shutdown(self):
+        with self.lock:
+            if not self.warmed:
+                return
+            subprocess.run([self.wineserver(), '--kill'], env=self.environment(),
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           timeout=WINE_START_TIMEOUT)
+            self.warmed = False
+
+
+def isHostPath(value):
+    """
+    True for absolute POSIX paths of existing files or of files in
+    existing directories. FUSION switches such as /ascii have a single
+    slash and are never taken for paths.
+    """
+    if os.name == 'nt' or not value.startswith('/') or value.count('/') < 2:
+        return False
+    return os.path.exists(value) or os.path.isdir(os.path.dirname(value))
+
+
+runtimes = {}
+runtimesLock = threading.Lock()
+
+
+def runtime(name='Native', wine=None, prefix=None):
+    """
+    Returns the shared runtime for the given settings, so that a warm Wine
+    server is reused by all commands of a session.
+    """
+    key = (name, wine, prefix)
+    with runtimesLock:
+        if key not in runtimes:
+            if name == 'Wine':
+                runtimes[key] = WineRuntime(wine, prefix)
+            else:
+                runtimes[key] = NativeRuntime()
+        return runtimes[key]
+
+
+def launchArguments(commands, fusionRuntime):
+    """
+    Returns the argument vector and environment that run a command list in
+    a runtime, and the temporary files written for them, to be removed
+    with removeTemporary() once the command exited. The command list may
+    hold quoted elements and elements with several arguments, as built by
+    the algorithms; it is split into real arguments first.
+    """
+    temporary = []
+    argv = fusionRuntime.argv(splitCommands(commands), temporary)
+    return argv, fusionRuntime.environment(), temporary
+
+
+def removeTemporary(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def launch(commands, fusionRuntime, **kwargs):
+    """
+    Starts a FUSION command without an intermediate shell, as a context
+    manager giving the subprocess.Popen. Leaving it waits for the command
+    and removes the temporary files written for it.
+    """
+    fusionRuntime.warm()
+    argv, env, temporary = launchArguments(commands, fusionRuntime)
+    try:
+        with subprocess.Popen(argv, env=env, **kwargs) as proc:
+            yield proc
+    finally:
+        removeTemporary(temporary)
+
+
+def shutdown():
+    with runtimesLock:
+        for r in runtimes.values():
+            r.shutdown()
+        runtimes.clear()
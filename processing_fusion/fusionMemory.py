@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionMemory.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Chooses between the 32-bit and 64-bit builds of FUSION tools.
+
+The 32-bit builds are faster on small inputs but can address no more than
+2 GB. The memory a run needs is estimated from its point count and the
+number of grid cells it produces; runs that do not fit use the 64-bit
+build. For runs that would not even fit in the available memory the plan
+gives the number of pieces they should be split into; splitting is left
+to the caller, e.g. tiled processing.
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import math
+import os
+import struct
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+
+# memory a 32-bit FUSION process can use for data, leaving room for the
+# executable, its libraries and heap fragmentation within the 2 GB limit
+LIMIT_32 = 1536 * MB
+# memory used by any run regardless of its inputs
+BASE_MEMORY = 64 * MB
+# fraction of the available memory a single 64-bit run may use
+AVAILABLE_FRACTION = 0.8
+
+# conservative bytes per point and per output cell of each tool
+MEMORY_PROFILES = {'ascii2dtm': (0, 8),
+                   'canopymodel': (16, 24),
+                   'clipdata': (0, 0),
+                   'cloudmetrics': (48, 0),
+                   'cover': (8, 16),
+                   'densitymetrics': (8, 16),
+                   'filterdata': (32, 0),
+                   'gridmetrics': (40, 64),
+                   'gridsurfacecreate': (24, 16),
+                   'gridsurfacestats': (0, 32),
+                   'groundfilter': (48, 8),
+                   'polyclipdata': (0, 0),
+                   'returndensity': (0, 16),
+                   'thindata': (32, 8),
+                   'topometrics': (0, 32),
+                   'treeseg': (16, 48)}
+DEFAULT_PROFILE = (40, 32)
+# recorded runs of a tool needed before its measured bytes per point are used
+MIN_MEASURED_RUNS = 3
+# percentile of the measured bytes per point used, leaving headroom for
+# runs that need more than the typical one
+MEASURED_PERCENTILE = 90
+# seconds a recorded run lasts at least for its peak memory to be used,
+# a few sample intervals of fusionStats.ResourceMonitor
+MIN_MEASURED_WALL = 2.0
+
+
+class MemoryPlan:
+    """
+    Outcome of planning a run: the build to use and the number of pieces
+    the run should be split into to fit in memory.
+    """
+
+    def __init__(self, use64, pieces, required, available):
+        self.use64 = use64
+        self.pieces = pieces
+        self.required = required
+        self.available = available
+
+    def describe(self):
+        text = 'estimated memory {:.0f} MB'.format(self.required / MB)
+        if self.available is not None:
+            text += ', {:.0f} MB available'.format(self.available / MB)
+        text += ', using the {}-bit build'.format(64 if self.use64 else 32)
+        if self.pieces > 1:
+            text += ' in {} pieces'.format(self.pieces)
+        return text
+
+
+def availableMemory():
+    """
+    Returns the physical memory available to new processes in bytes, or
+    None when it can not be determined.
+    """
+    if psutil is not None:
+        return psutil.virtual_memory().available
+
+    if os.name == 'nt':
+        import ctypes
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong),
+                        ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong),
+                        ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong),
+                        ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong),
+                        ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(MemoryStatus)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+        return None
+
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def gridCells(bounds, cellSize):
+    """
+    Number of cells of a grid with the given cell size covering bounds
+    (xmin, ymin, xmax, ymax).
+    """
+    if bounds is None or not cellSize or cellSize <= 0:
+        return 0
+    columns = math.ceil((bounds[2] - bounds[0]) / cellSize) + 1
+    rows = math.ceil((bounds[3] - bounds[1]) / cellSize) + 1
+    return max(columns, 0) * max(rows, 0)
+
+
+def requiredMemory(tool, points, cells):
+    perPoint, perCell = MEMORY_PROFILES.get(tool, DEFAULT_PROFILE)
+    return BASE_MEMORY + perPoint * (points or 0) + perCell * (cells or 0)
+
+
+def measuredBytesPerPoint(tool, records):
+    """
+    Bytes per point of a tool measured in recorded runs, from the peak
+    memory of runs with a known number of points less the base memory and
+    the memory of their cells. Runs without a peak, restored from the
+    cache or too short to be sampled are left out, their peak is not
+    known. Returns None with too few runs.
+    """
+    perCell = MEMORY_PROFILES.get(tool, DEFAULT_PROFILE)[1]
+    ratios = []
+    for r in records:
+        if r.get('tool') != tool or not r.get('points') or not r.get('peakRss'):
+            continue
+        if r.get('cached') or (r.get('wall') or 0) < MIN_MEASURED_WALL:
+            continue
+        data = r['peakRss'] - BASE_MEMORY - perCell * (r.get('cells') or 0)
+        if data > 0:
+            ratios.append(data / r['points'])
+    if len(ratios) < MIN_MEASURED_RUNS:
+        return None
+    ratios.sort()
+    return ratios[min(len(ratios) * MEASURED_PERCENTILE // 100, len(ratios) - 1)]
+
+
+def memoryProfile(tool, records=None):
+    """
+    Returns the bytes per point and per cell of a tool and whether the
+    bytes per point were measured in recorded runs. Measured bytes per
+    point only raise the profile of the tool: records written before
+    peaks were measured over the whole run under-report them.
+    """
+    perPoint, perCell = MEMORY_PROFILES.get(tool, DEFAULT_PROFILE)
+    measured = measuredBytesPerPoint(tool, records or [])
+    if measured is not None:
+        return max(measured, perPoint), perCell, True
+    return perPoint, perCell, False
+
+
+def memoryBudget(jobs, has64=True, available=None):
+    """
+    Memory for the data of each of 'jobs' concurrent runs, or None when the
+    available memory is unknown and the 64-bit build has no fixed limit.
+    """
+    if available is None:
+        available = availableMemory()
+    budget = LIMIT_32 if not has64 else None
+    if available:
+        share = AVAILABLE_FRACTION * available / max(jobs, 1)
+        budget = share if budget is None else min(budget, share)
+    if budget is None:
+        return None
+    return max(budget - BASE_MEMORY, MB)
+
+
+def plan(tool, points, cells, has32=True, has64=True, available=None):
+    """
+    Returns the MemoryPlan of a run of a tool over the given number of
+    points producing the given number of grid cells.
+    """
+    if available is None:
+        available = availableMemory()
+    required = requiredMemory(tool, points, cells)
+
+    if has32 and (required <= LIMIT_32 or not has64):
+        pieces = math.ceil(required / LIMIT_32)
+        return MemoryPlan(False, pieces, required, available)
+
+    limit = AVAILABLE_FRACTION * available if available else None
+    pieces = 1
+    if limit and required > limit:
+        # pieces share the base memory, only the data is divided
+        pieces = math.ceil((required - BASE_MEMORY) / max(limit - BASE_MEMORY, MB))
+    return MemoryPlan(True, pieces, required, available)
+
+
+def gridFileCells(path):
+    """
+    Number of cells of a FUSION .dtm or ASCII raster file, or 0 when the
+    file is neither.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(200)
+            if data[:21].rstrip(b'\0 ').startswith(b'PLANS-PC BINARY'):
+                columns, rows = struct.unpack_from('<ii', data, 142)
+                return max(columns, 0) * max(rows, 0)
+            f.seek(0)
+            header = {}
+            for _ in range(2):
+                key, value = f.readline().split()[:2]
+                header[key.lower()] = int(value)
+            return header[b'ncols'] * header[b'nrows']
+    except (OSError, ValueError, KeyError, struct.error):
+        return 0
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionProgress.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import os
+import re
+import time
+
+# "Processing file 3 of 12", "Reading tile 2 of 9", "file 4/10"
+COUNT_PATTERN = re.compile(r'\b(?:file|tile|point file|data file|pass|block|step)\s+(\d+)\s*(?:of|/)\s*(\d+)',
+                           re.IGNORECASE)
+# progress lines hold nothing but a percentage, e.g. "45%", "45% complete"
+# or "Progress: 45%", so that values such as "95% cover" are not progress
+PERCENT_PATTERN = re.compile(r'^\s*(?:(?:progress|processing|completed?)\s*:?\s*)?(\d{1,3}(?:\.\d+)?)\s*%'
+                             r'\s*(?:complete|completed|done)?[\s.]*$', re.IGNORECASE)
+ITERATION_PATTERN = re.compile(r'\biteration\s*(?:#\s*)?(\d+)', re.IGNORECASE)
+
+
+def toolName(commands):
+    """
+    Returns the lower case FUSION tool name of a command list, without
+    path, extension and 64-bit suffix, e.g. 'gridmetrics'.
+    """
+    if not commands:
+        return ''
+    executable = str(commands[0]).strip()
+    if executable.startswith('"'):
+        executable = executable[1:].split('"', 1)[0]
+    name = os.path.splitext(os.path.basename(executable))[0].lower()
+    if name.endswith('64'):
+        name = name[:-2]
+    return name
+
+
+def splitCommands(commands):
+    """
+    Splits a command list into single arguments the way the Windows command
+    line does: at whitespace outside double quotes, removing the quotes.
+    An element such as '/ascii /raster:cover' gives two arguments.
+    """
+    arguments = []
+    for c in commands:
+        current = []
+        quoted = False
+        started = False
+        for char in str(c):
+            if char == '"':
+                quoted = not quoted
+                started = True
+            elif char.isspace() and not quoted:
+                if started:
+                    arguments.append(''.join(current))
+                current = []
+                started = False
+            else:
+                current.append(char)
+                started = True
+        if started:
+            arguments.append(''.join(current))
+    return arguments
+
+
+def switchValue(commands, switch, default=None):
+    """
+    Returns the value of a '/switch:value' argument in a command list.
+    """
+    prefix = '/{}:'.format(switch).lower()
+    for token in splitCommands(commands):
+        if token.lower().startswith(prefix):
+            return token[len(prefix):]
+    return default
+
+
+class ProgressParser:
+    """
+    Turns FUSION console messages into a progress percentage.
+
+    Recognises 'file N of M' style counters and lines holding only a
+    percentage, see PERCENT_PATTERN. Since
+    FUSION tools restart their percentage for every input file, a
+    percentage is scaled into the slot of the current file when a file
+    counter has been seen.
+    """
+
+    def __init__(self, commands=None):
+        self.commands = commands or []
+        self.current = None
+        self.total = None
+        self.progress = 0.0
+
+    def parse(self, line):
+        """
+        Returns the new progress for a line, or None if it did not advance.
+        """
+        value = self.parseLine(line)
+        if value is None:
+            return None
+        value = max(0.0, min(100.0, value))
+        if value <= self.progress:
+            return None
+        self.progress = value
+        return value
+
+    def parseLine(self, line):
+        match = COUNT_PATTERN.search(line)
+        if match:
+            self.current = int(match.group(1))
+            self.total = int(match.group(2))
+            if self.total > 0:
+                return 100.0 * (self.current - 1) / self.total
+
+        match = PERCENT_PATTERN.search(line)
+        if match:
+            percent = float(match.group(1))
+            if self.current is not None and self.total:
+                return 100.0 * (self.current - 1 + percent / 100.0) / self.total
+            return percent
+
+        return None
+
+
+class IterationProgressParser(ProgressParser):
+    """
+    Progress of GroundFilter, which reports each filtering iteration.
+    """
+
+    def __init__(self, commands=None):
+        super().__init__(commands)
+        try:
+            self.iterations = int(switchValue(self.commands, 'iterations', 5))
+        except ValueError:
+            self.iterations = 5
+
+    def parseLine(self, line):
+        match = ITERATION_PATTERN.search(line)
+        if match and self.iterations > 0:
+            return 100.0 * (int(match.group(1)) - 1) / self.iterations
+        return super().parseLine(line)
+
+
+PARSERS = {
+    'groundfilter': IterationProgressParser,
+}
+
+
+def progressParser(commands):
+    """
+    Returns the progress parser for the tool run by a command list.
+    """
+    return PARSERS.get(toolName(commands), ProgressParser)(commands)
+
+
+class ConsoleBatcher:
+    """
+    Collects console lines and pushes them to the feedback in one call per
+    interval, so that the UI cost does not grow with the number of lines.
+    """
+
+    def __init__(self, feedback, interval=0.5):
+        self.feedback = feedback
+        self.interval = interval
+        self.lines = []
+        self.lastFlush = time.monotonic()
+
+    def add(self, line):
+        self.lines.append(line)
+        self.flushIfDue()
+
+    def flushIfDue(self):
+        if time.monotonic() - self.lastFlush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.feedback.pushConsoleInfo(''.join(self.lines).rstrip('\n'))
+            self.lines = []
+        self.lastFlush = time.monotonic()
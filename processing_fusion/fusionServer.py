@@ -0,0 +1,525 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionServer.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Distributes FUSION commands to worker daemons on other machines.
+
+The job server runs inside QGIS and hands out the commands submitted to a
+RemoteExecutor. Workers connect to it, pull one job at a time, run it with
+fusionUtils.execute() and stream output and progress back, which is pushed
+to the feedback of the job. Input and output paths must be reachable from
+all workers under the same names, e.g. on a shared drive; list files are
+sent along with the job.
+
+A worker is started with the Python of a QGIS installation:
+
+    python -m processing_fusion.fusionServer --host qgis-host --port 47300
+           --token secret --jobs 8 --fusion-directory C:/FUSION
+
+Messages are JSON objects, one per line. Both sides prove knowledge of the
+shared token with an HMAC of a random challenge before any job is sent, and
+workers only run executables from their own FUSION directory.
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import argparse
+import collections
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+from qgis.core import QgsProcessingFeedback
+
+from processing.core.ProcessingConfig import ProcessingConfig
+
+from processing_fusion import fusionUtils
+from processing_fusion.fusionCache import listedFiles
+from processing_fusion.fusionJobs import FusionJobExecutor, JobExecutor
+from processing_fusion.fusionProgress import splitCommands
+
+# longest message accepted, list files of large collections are sent inline
+MAX_MESSAGE = 64 * 1024 * 1024
+# seconds a worker request waits for a job before the worker asks again
+JOB_WAIT = 10
+# seconds between cancellation checks of a silent remote job
+CANCEL_POLL = 2
+
+
+def sendMessage(stream, message):
+    stream.write(json.dumps(message).encode('utf-8') + b'\n')
+    stream.flush()
+
+
+def receiveMessage(stream):
+    line = stream.readline(MAX_MESSAGE)
+    if not line:
+        raise ConnectionError('Connection closed')
+    if not line.endswith(b'\n'):
+        raise ConnectionError('Message too long')
+    return json.loads(line.decode('utf-8'))
+
+
+def digest(token, nonce):
+    return hmac.new(token.encode('utf-8'), nonce.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def jobSpec(commands, inputs=None, outputs=None, info=None):
+    """
+    Serializes a command list for a worker. Arguments naming list files
+    carry the listed files, since the temporary list file itself only
+    exists on this machine.
+    """
+    arguments = splitCommands(commands)
+    files = {}
+    for i, argument in enumerate(arguments):
+        if os.path.isfile(argument):
+            names = listedFiles(argument)
+            if names is not None:
+                files[str(i)] = names
+    if inputs is None:
+        inputs = [a for i, a in enumerate(arguments[1:], 1) if str(i) not in files and os.path.isfile(a)]
+        for names in files.values():
+            inputs.extend(names)
+    return {'arguments': arguments,
+            'listFiles': files,
+            'inputs': list(inputs),
+            'outputs': list(outputs or []),
+            'info': info}
+
+
+class JobServer(socketserver.ThreadingTCPServer):
+    """
+    Queue of remote jobs, served to authenticated workers over TCP.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host, port, token):
+        super().__init__((host, port), WorkerHandler)
+        self.token = token
+        self.pending = collections.deque()
+        self.running = {}
+        self.nextId = 1
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name='fusion-server', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        with self.condition:
+            jobs = list(self.pending) + list(self.running.values())
+            self.pending.clear()
+            self.running.clear()
+        for job in jobs:
+            self.finishJob(job, None, 'Job server stopped')
+
+    def address(self):
+        return self.server_address
+
+    def enqueue(self, job):
+        with self.condition:
+            job.id = self.nextId
+            self.nextId += 1
+            self.pending.append(job)
+            self.condition.notify()
+
+    def takeJob(self, timeout):
+        with self.condition:
+            end = time.monotonic() + timeout
+            while True:
+                while self.pending:
+                    job = self.pending.popleft()
+                    if job.feedback.isCanceled():
+                        job.skipped = True
+                        self.finishJob(job, None, None)
+                        continue
+                    self.running[job.id] = job
+                    job.started = time.monotonic()
+                    return job
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def requeue(self, job):
+        with self.condition:
+            self.running.pop(job.id, None)
+            self.pending.appendleft(job)
+            self.condition.notify()
+
+    def cancelPending(self, executor):
+        with self.condition:
+            canceled = [job for job in self.pending if job.executor is executor]
+            for job in canceled:
+                self.pending.remove(job)
+        for job in canceled:
+            job.skipped = True
+            self.finishJob(job, None, None)
+
+    def finishJob(self, job, returnCode, error):
+        with self.condition:
+            self.running.pop(job.id, None)
+        if job.future.done():
+            return
+        job.returnCode = returnCode
+        if error:
+            job.exception = RuntimeError(error)
+        if getattr(job, 'started', None) is not None:
+            job.elapsed = time.monotonic() - job.started
+        job.feedback.setProgress(100)
+        job.future.set_result(None)
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+    """
+    Conversation with one worker connection.
+    """
+
+    def handle(self):
+        server = self.server
+        try:
+            nonce = secrets.token_hex(16)
+            sendMessage(self.wfile, {'type': 'challenge', 'nonce': nonce})
+            hello = receiveMessage(self.rfile)
+            if hello.get('type') != 'hello' or not hmac.compare_digest(str(hello.get('digest')),
+                                                                       digest(server.token, nonce)):
+                sendMessage(self.wfile, {'type': 'denied'})
+                return
+            sendMessage(self.wfile, {'type': 'welcome', 'digest': digest(server.token, str(hello.get('nonce')))})
+            worker = str(hello.get('worker'))
+        except (OSError, ValueError, ConnectionError):
+            return
+
+        job = None
+        try:
+            while True:
+                message = receiveMessage(self.rfile)
+                kind = message.get('type')
+                if kind == 'request':
+                    job = server.takeJob(JOB_WAIT)
+                    if job is None:
+                        sendMessage(self.wfile, {'type': 'wait'})
+                    else:
+                        job.feedback.pushInfo('Running on worker {}'.format(worker))
+                        sendMessage(self.wfile, {'type': 'job', 'id': job.id, 'spec': job.spec})
+                    continue
+
+                if job is None or message.get('id') != job.id:
+                    sendMessage(self.wfile, {'type': 'error', 'message': 'No such job'})
+                    continue
+
+                if kind == 'console':
+                    job.feedback.pushConsoleInfo(message.get('text', ''))
+                elif kind == 'info':
+                    job.feedback.pushInfo(message.get('text', ''))
+                elif kind == 'command':
+                    job.feedback.pushCommandInfo(message.get('text', ''))
+                elif kind == 'progress':
+                    job.feedback.setProgress(float(message.get('value', 0)))
+                elif kind == 'done':
+                    server.finishJob(job, message.get('returnCode'), message.get('error'))
+                    job = None
+                    sendMessage(self.wfile, {'type': 'ok'})
+                    continue
+
+                if job.feedback.isCanceled():
+                    sendMessage(self.wfile, {'type': 'cancel'})
+                else:
+                    sendMessage(self.wfile, {'type': 'ok'})
+        except (OSError, ValueError, ConnectionError):
+            # the worker went away, give its job to another worker
+            if job is not None and not job.future.done():
+                if job.feedback.isCanceled():
+                    server.finishJob(job, None, None)
+                else:
+                    job.feedback.pushInfo('Worker {} disconnected, job requeued'.format(worker))
+                    server.requeue(job)
+
+
+class RemoteExecutor(JobExecutor):
+    """
+    Executor that runs its jobs on worker daemons connected to a JobServer
+    instead of local processes. Keyword arguments of submit() are 'inputs',
+    'outputs' and 'info', as for fusionUtils.execute().
+    """
+
+    def __init__(self, server, feedback=None):
+        super().__init__(feedback)
+        self.server = server
+
+    def submit(self, commands, label=None, **kwargs):
+        job = self.createJob(commands, label, kwargs)
+        job.executor = self
+        job.spec = jobSpec(commands, kwargs.get('inputs'), kwargs.get('outputs'), kwargs.get('info'))
+        job.future = Future()
+        self.server.enqueue(job)
+        return job
+
+    def gather(self, raiseOnError=True):
+        waiting = False
+        while not all(job.done() for job in self.jobs):
+            if self.isCanceled():
+                self.server.cancelPending(self)
+            if not waiting and not self.server.running:
+                self.feedback.pushInfo('Waiting for FUSION workers on {}:{}'.format(*self.server.address()))
+                waiting = True
+            time.sleep(fusionUtils.POLL_INTERVAL)
+        return super().gather(raiseOnError)
+
+
+class RemoteFeedback(QgsProcessingFeedback):
+    """
+    Feedback of a job running on a worker, sending everything to the job
+    server and learning from its replies whether the job was canceled.
+    """
+
+    def __init__(self, worker, jobId):
+        super().__init__()
+        self.worker = worker
+        self.jobId = jobId
+        self.lastPoll = time.monotonic()
+
+    def send(self, kind, **values):
+        values.update({'type': kind, 'id': self.jobId})
+        reply = self.worker.exchange(values)
+        self.lastPoll = time.monotonic()
+        if reply.get('type') == 'cancel':
+            self.cancel()
+
+    def isCanceled(self):
+        if not super().isCanceled() and time.monotonic() - self.lastPoll > CANCEL_POLL:
+            self.send('poll')
+        return super().isCanceled()
+
+    def setProgress(self, progress):
+        super().setProgress(progress)
+        self.send('progress', value=progress)
+
+    def pushInfo(self, info):
+        self.send('info', text=info)
+
+    def pushCommandInfo(self, info):
+        self.send('command', text=info)
+
+    def pushConsoleInfo(self, info):
+        self.send('console', text=info)
+
+    def pushDebugInfo(self, info):
+        self.send('info', text=info)
+
+    def reportError(self, error, fatalError=False):
+        self.send('info', text=error)
+
+
+class FusionWorker:
+    """
+    Worker daemon: pulls jobs from a job server and runs them one at a time.
+    Start several workers, e.g. with runWorkers(), to use more cores.
+    """
+
+    def __init__(self, host, port, token, fusionDirectory=None, name=None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.fusionDirectory = fusionDirectory or fusionUtils.fusionDirectory()
+        self.name = name or '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.stream = None
+        self.stopped = threading.Event()
+
+    def exchange(self, message):
+        sendMessage(self.stream, message)
+        return receiveMessage(self.stream)
+
+    def connect(self):
+        connection = socket.create_connection((self.host, self.port))
+        self.stream = connection.makefile('rwb')
+        challenge = receiveMessage(self.stream)
+        nonce = secrets.token_hex(16)
+        reply = self.exchange({'type': 'hello',
+                               'worker': self.name,
+                               'digest': digest(self.token, challenge.get('nonce', '')),
+                               'nonce': nonce})
+        if reply.get('type') != 'welcome' or not hmac.compare_digest(str(reply.get('digest')),
+                                                                     digest(self.token, nonce)):
+            raise ConnectionError('Job server refused the token or failed to authenticate')
+
+    def run(self, retry=5):
+        """
+        Serves jobs until stop() is called, reconnecting after
+        'retry' seconds when the connection to the server is lost.
+        """
+        while not self.stopped.is_set():
+            try:
+                self.connect()
+                while not self.stopped.is_set():
+                    reply = self.exchange({'type': 'request'})
+                    if reply.get('type') == 'job':
+                        self.runJob(reply['id'], reply['spec'])
+            except (OSError, ValueError, ConnectionError):
+                self.stopped.wait(retry)
+            finally:
+                if self.stream is not None:
+                    self.stream.close()
+                    self.stream = None
+
+    def stop(self):
+        self.stopped.set()
+
+    def runJob(self, jobId, spec):
+        feedback = RemoteFeedback(self, jobId)
+        returnCode = None
+        error = None
+        listFiles = []
+        try:
+            commands, listFiles = self.localCommands(spec)
+            missing = [p for p in spec.get('inputs', []) if not os.path.exists(p)]
+            if missing:
+                raise FileNotFoundError('Inputs not found on worker {}: {}'.format(self.name, ', '.join(missing)))
+            returnCode = fusionUtils.execute(commands, feedback,
+                                             outputs=spec.get('outputs') or None,
+                                             info=spec.get('info'))
+        except ConnectionError:
+            # the server is gone, run() reconnects
+            raise
+        except Exception as e:
+            # any other failure is the job's, the worker keeps serving
+            error = '{}: {}'.format(type(e).__name__, e)
+        finally:
+            for f in listFiles:
+                os.remove(f)
+        self.exchange({'type': 'done', 'id': jobId, 'returnCode': returnCode, 'error': error})
+
+    def localCommands(self, spec):
+        arguments = list(spec['arguments'])
+        executable = os.path.join(self.fusionDirectory, os.path.basename(arguments[0].replace('\\', '/')))
+        if not os.path.isfile(executable):
+            raise FileNotFoundError('{} is not a FUSION executable on worker {}'.format(executable, self.name))
+        arguments[0] = executable
+
+        listFiles = []
+        for index, names in spec.get('listFiles', {}).items():
+            handle, path = tempfile.mkstemp(suffix='.txt', prefix='fusion')
+            with os.fdopen(handle, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(names))
+            arguments[int(index)] = path
+            listFiles.append(path)
+
+        return ['"{}"'.format(a) for a in arguments], listFiles
+
+
+def runWorkers(host, port, token, jobs=1, fusionDirectory=None):
+    """
+    Starts a number of worker threads and returns the workers.
+    """
+    workers = []
+    for i in range(jobs):
+        worker = FusionWorker(host, port, token, fusionDirectory,
+                              '{}:{}:{}'.format(socket.gethostname(), os.getpid(), i + 1))
+        threading.Thread(target=worker.run, name='fusion-worker', daemon=True).start()
+        workers.append(worker)
+    return workers
+
+
+jobServer = None
+jobServerLock = threading.Lock()
+
+
+def serverSettings():
+    host = ProcessingConfig.getSetting(fusionUtils.FUSION_SERVER_HOST) or '127.0.0.1'
+    try:
+        port = int(ProcessingConfig.getSetting(fusionUtils.FUSION_SERVER_PORT))
+    except (TypeError, ValueError):
+        port = fusionUtils.SERVER_PORT
+    return host, port, ProcessingConfig.getSetting(fusionUtils.FUSION_SERVER_TOKEN) or ''
+
+
+def startServer():
+    """
+    Returns the job server of this session, starting it when needed.
+    """
+    global jobServer
+    with jobServerLock:
+        if jobServer is None:
+            host, port, token = serverSettings()
+            if not token:
+                raise ValueError('A token is required to distribute FUSION jobs')
+            jobServer = JobServer(host, port, token)
+            jobServer.start()
+        return jobServer
+
+
+def stopServer():
+    global jobServer
+    with jobServerLock:
+        if jobServer is not None:
+            jobServer.stop()
+            jobServer = None
+
+
+def jobExecutor(feedback=None):
+    """
+    Returns a RemoteExecutor when distribution to workers is enabled in the
+    provider settings, otherwise a local FusionJobExecutor.
+    """
+    if ProcessingConfig.getSetting(fusionUtils.FUSION_SERVER):
+        return RemoteExecutor(startServer(), feedback)
+    return FusionJobExecutor(feedback)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FUSION worker daemon')
+    parser.add_argument('--host', default='127.0.0.1', help='job server host')
+    parser.add_argument('--port', type=int, default=fusionUtils.SERVER_PORT, help='job server port')
+    parser.add_argument('--token', default=os.environ.get('FUSION_SERVER_TOKEN'),
+                        help='shared token, defaults to $FUSION_SERVER_TOKEN')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='concurrent jobs')
+    parser.add_argument('--fusion-directory', default=None, help='FUSION installation on this machine')
+    args = parser.parse_args()
+    if not args.token:
+        parser.error('a token is required')
+
+    workers = runWorkers(args.host, args.port, args.token, args.jobs, args.fusion_directory)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.stop()
+
+
+if __name__ == '__main__':
+    main()
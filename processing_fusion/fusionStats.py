@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionStats.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# seconds between two samples of the resources used by a process tree
+SAMPLE_INTERVAL = 0.5
+# size of a statistics file before it is rotated, and rotated files kept
+STATS_FILE_SIZE = 5 * 1024 * 1024
+STATS_FILE_BACKUPS = 5
+
+statsLock = threading.Lock()
+# run records by statistics file, with the modification time they were read at
+runsCache = {}
+statsLogger = logging.getLogger('processing_fusion.stats')
+statsLogger.propagate = False
+statsLogger.setLevel(logging.INFO)
+statsHandler = None
+
+
+class ResourceMonitor:
+    """
+    Measures CPU time, peak resident memory and I/O of a process and all
+    of its children. A process reaped with wait() on POSIX gives its peak
+    memory and CPU time through os.wait4(). Otherwise they come from
+    samples, where the high-water mark of each process Linux keeps and
+    Windows' peak working set cover the peaks between samples. Children
+    that exit between two samples are only accounted up to their last
+    sample. Without psutil and wait4() only the wall time is measured.
+    """
+
+    def __init__(self, pid):
+        self.start = time.monotonic()
+        # the first sample is taken once the process had time to start
+        self.lastSample = self.start
+        self.process = None
+        self.cpu = {}
+        self.io = {}
+        self.peakRss = None
+        self.usage = None
+        if psutil is not None:
+            try:
+                self.process = psutil.Process(pid)
+            except psutil.Error:
+                self.process = None
+
+    def sample(self, force=False):
+        if self.process is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.lastSample < SAMPLE_INTERVAL:
+            return
+        self.lastSample = now
+
+        try:
+            processes = [self.process] + self.process.children(recursive=True)
+        except psutil.Error:
+            return
+
+        rss = 0
+        peaks = 0
+        for p in processes:
+            try:
+                with p.oneshot():
+                    self.cpu[p.pid] = p.cpu_times()
+                    memory = p.memory_info()
+                    rss += memory.rss
+                    # peak working set on Windows, high-water mark on Linux
+                    peaks += getattr(memory, 'peak_wset', None) or highWaterMark(p.pid) or memory.rss
+                    if hasattr(p, 'io_counters'):
+                        self.io[p.pid] = p.io_counters()
+            except psutil.Error:
+                continue
+        if rss:
+            self.peakRss = max(self.peakRss or 0, rss, peaks)
+
+    def wait(self, proc):
+        """
+        Waits for a subprocess.Popen to exit and returns its exit code. On
+        POSIX the process is reaped with os.wait4(), whose peak resident
+        memory and CPU times cover the whole run of the process and of the
+        children it waited for.
+        """
+        if proc.returncode is not None or not hasattr(os, 'wait4'):
+            return proc.wait()
+        try:
+            pid, status, self.usage = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            return proc.wait()
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        return proc.returncode
+
+    def result(self):
+        record = {'wall': round(time.monotonic() - self.start, 3),
+                  'userCpu': None,
+                  'systemCpu': None,
+                  'peakRss': self.peakRss,
+                  'readBytes': None,
+                  'writeBytes': None}
+        if self.cpu:
+            record['userCpu'] = round(sum(c.user for c in self.cpu.values()), 3)
+            record['systemCpu'] = round(sum(c.system for c in self.cpu.values()), 3)
+        if self.usage is not None:
+            record['userCpu'] = round(self.usage.ru_utime, 3)
+            record['systemCpu'] = round(self.usage.ru_stime, 3)
+            # kilobytes except on macOS
+            peak = self.usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+            record['peakRss'] = max(self.peakRss or 0, peak) or None
+        if self.io:
+            record['readBytes'] = sum(c.read_bytes for c in self.io.values())
+            record['writeBytes'] = sum(c.write_bytes for c in self.io.values())
+        return record
+
+
+def highWaterMark(pid):
+    """
+    Peak resident memory of a process in bytes as kept by Linux, or None.
+    """
+    try:
+        with open('/proc/{}/status'.format(pid), 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def recordRun(path, record):
+    """
+    Appends a run record as one JSON line to a size-rotated statistics file.
+    """
+    global statsHandler
+    with statsLock:
+        # other handlers may be attached to the logger, only ours is replaced
+        if statsHandler is None or statsHandler.baseFilename != os.path.abspath(path):
+            if statsHandler is not None:
+                statsLogger.removeHandler(statsHandler)
+                statsHandler.close()
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            statsHandler = logging.handlers.RotatingFileHandler(path,
+                                                                maxBytes=STATS_FILE_SIZE,
+                                                                backupCount=STATS_FILE_BACKUPS,
+                                                                encoding='utf-8')
+            statsHandler.setFormatter(logging.Formatter('%(message)s'))
+            statsLogger.addHandler(statsHandler)
+        statsLogger.info(json.dumps(record, sort_keys=True))
+
+
+def cachedRuns(path):
+    """
+    Like readRuns(), reading the files again only when the statistics file
+    changed since the last call.
+    """
+    try:
+        stamp = os.stat(path).st_mtime_ns
+    except OSError:
+        return []
+    with statsLock:
+        cached = runsCache.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    records = readRuns(path)
+    with statsLock:
+        runsCache[path] = (stamp, records)
+    return records
+
+
+def readRuns(path):
+    """
+    Returns the run records of a statistics file and its rotated backups,
+    oldest first.
+    """
+    records = []
+    for i in range(STATS_FILE_BACKUPS, -1, -1):
+        name = path if i == 0 else '{}.{}'.format(path, i)
+        try:
+            with open(name, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+    return records
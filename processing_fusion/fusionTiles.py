@@ -0,0 +1,622 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    fusionTiles.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Splits gridded FUSION runs into tiles and stitches the tile outputs.
+
+Tiles are aligned to the cell lattice of the whole product, so every cell
+belongs to exactly one tile: the one whose core holds its center. Tiles are
+processed with a buffer around their core and only the cells of the core
+are kept when stitching. Tiles are either a regular grid or the leaves of
+a quadtree that splits tiles until their estimated work is balanced.
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import csv
+import math
+import os
+import shutil
+
+import numpy
+
+from processing_fusion import fusionDtm
+
+# tiles are never narrower than this number of cells
+MIN_TILE_CELLS = 50
+# quadtree leaves are never narrower than this number of cells
+QUADTREE_MIN_CELLS = 25
+# tiles per concurrent job, so that a slow tile does not idle the others
+TILES_PER_JOB = 2
+# tolerance in cells when locating cell centers on the lattice
+EPSILON = 1e-6
+# number format of stitched ASCII rasters, enough digits for float32 values
+VALUE_FORMAT = '%.9g'
+
+
+class Tile:
+    """
+    A tile of a gridded product, given by the bounds of its core and the
+    lattice columns and rows of the core, rows counted from the south.
+    """
+
+    def __init__(self, key, xmin, ymin, xmax, ymax, columns, rows):
+        self.key = key
+        self.xmin = xmin
+        self.ymin = ymin
+        self.xmax = xmax
+        self.ymax = ymax
+        self.columns = columns
+        self.rows = rows
+        self.files = []
+        self.points = 0
+
+    def name(self):
+        return self.key
+
+    def bounds(self, buffer=0):
+        return (self.xmin - buffer, self.ymin - buffer, self.xmax + buffer, self.ymax + buffer)
+
+    def width(self):
+        return self.xmax - self.xmin
+
+    def height(self):
+        return self.ymax - self.ymin
+
+    def pointEstimate(self, headers, buffer=0):
+        """
+        Estimates the points of the buffered tile from the headers of the
+        files it touches, assuming evenly distributed points in each file.
+        """
+        xmin, ymin, xmax, ymax = self.bounds(buffer)
+        points = 0
+        for h in headers:
+            if h is None:
+                continue
+            area = max(h.maxX - h.minX, EPSILON) * max(h.maxY - h.minY, EPSILON)
+            overlap = (max(min(xmax, h.maxX) - max(xmin, h.minX), 0) *
+                       max(min(ymax, h.maxY) - max(ymin, h.minY), 0))
+            points += h.pointCount * min(overlap / area, 1)
+        return int(points)
+
+    def __repr__(self):
+        return '<Tile {} ({}, {}, {}, {})>'.format(self.name(), self.xmin, self.ymin, self.xmax, self.ymax)
+
+
+class TileGrid:
+    """
+    Regular grid of tiles covering bounds, aligned to the cell lattice
+    with its origin at (originX, originY).
+    """
+
+    def __init__(self, bounds, cellSize, tileSize, originX=None, originY=None):
+        self.cellSize = cellSize
+        self.tileCells = max(int(round(tileSize / cellSize)), 1)
+        self.tileSize = self.tileCells * cellSize
+        xmin, ymin, xmax, ymax = bounds
+        if originX is None:
+            originX = math.floor(xmin / cellSize) * cellSize
+        if originY is None:
+            originY = math.floor(ymin / cellSize) * cellSize
+        # move the origin by whole tiles to the lower left of the bounds
+        self.originX = originX + math.floor((xmin - originX) / self.tileSize) * self.tileSize
+        self.originY = originY + math.floor((ymin - originY) / self.tileSize) * self.tileSize
+        self.columns = max(math.ceil((xmax - self.originX) / self.tileSize + EPSILON), 1)
+        self.rows = max(math.ceil((ymax - self.originY) / self.tileSize + EPSILON), 1)
+        # cells of the lattice covering bounds, the extent of the product
+        self.cellColumns = (self.cellColumn(xmin), max(math.ceil((xmax - self.originX) / cellSize - EPSILON),
+                                                       self.cellColumn(xmin) + 1))
+        self.cellRows = (self.cellRow(ymin), max(math.ceil((ymax - self.originY) / cellSize - EPSILON),
+                                                 self.cellRow(ymin) + 1))
+
+    def tiles(self):
+        """
+        Returns the tiles from north to south and west to east, the order
+        in which gridded products store their rows.
+        """
+        tiles = []
+        for row in range(self.rows):
+            cellRow = (self.rows - row - 1) * self.tileCells
+            for column in range(self.columns):
+                cellColumn = column * self.tileCells
+                tiles.append(self.tile('tile_{}_{}'.format(row, column),
+                                       (cellColumn, cellColumn + self.tileCells),
+                                       (cellRow, cellRow + self.tileCells)))
+        return tiles
+
+    def tile(self, key, columns, rows):
+        return Tile(key,
+                    self.originX + columns[0] * self.cellSize, self.originY + rows[0] * self.cellSize,
+                    self.originX + columns[1] * self.cellSize, self.originY + rows[1] * self.cellSize,
+                    columns, rows)
+
+    def split(self, tile):
+        """
+        Splits a tile on cell edges into its quadrants, from north west to
+        south east.
+        """
+        column = (tile.columns[0] + tile.columns[1]) // 2
+        row = (tile.rows[0] + tile.rows[1]) // 2
+        quadrants = []
+        for rows in ((row, tile.rows[1]), (tile.rows[0], row)):
+            for columns in ((tile.columns[0], column), (column, tile.columns[1])):
+                quadrants.append(self.tile('{}_{}'.format(tile.key, len(quadrants)), columns, rows))
+        return quadrants
+
+    def cellColumn(self, x):
+        """
+        Column of the cell lattice holding a cell center, counted from the
+        origin. Works both for centers at whole and at half cells.
+        """
+        return math.floor((x - self.originX) / self.cellSize + EPSILON)
+
+    def cellRow(self, y):
+        return math.floor((y - self.originY) / self.cellSize + EPSILON)
+
+    def holds(self, tile, x, y):
+        """
+        True if the cell centered at (x, y) belongs to the core of tile and
+        to the extent of the product.
+        """
+        column = self.cellColumn(x)
+        row = self.cellRow(y)
+        columns = self.coreColumns(tile)
+        rows = self.coreRows(tile)
+        return columns[0] <= column < columns[1] and rows[0] <= row < rows[1]
+
+    def coreColumns(self, tile):
+        """
+        Range of lattice columns of the core of tile within the product.
+        """
+        return (max(tile.columns[0], self.cellColumns[0]),
+                min(tile.columns[1], self.cellColumns[1]))
+
+    def coreRows(self, tile):
+        return (max(tile.rows[0], self.cellRows[0]),
+                min(tile.rows[1], self.cellRows[1]))
+
+
+def quadtreeSize(bounds, cellSize, minCells=QUADTREE_MIN_CELLS):
+    """
+    Side of the square quadtree root covering bounds, minCells cells times
+    a power of two so that quadrants split evenly down to minCells.
+    """
+    side = max(bounds[2] - bounds[0], bounds[3] - bounds[1], cellSize)
+    cells = minCells
+    while cells * cellSize < side:
+        cells *= 2
+    return cells * cellSize
+
+
+def bands(ranges):
+    """
+    Cuts the union of lattice ranges at every range end, returning the
+    consecutive bands in ascending order.
+    """
+    edges = sorted(set(e for r in ranges if r[0] < r[1] for e in r))
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def overlaps(first, second):
+    return first[0] < second[1] and second[0] < first[1]
+
+
+def balancedTiles(grid, tiles, headers, buffer, tooLarge, minCells=QUADTREE_MIN_CELLS):
+    """
+    Splits tiles into quadrants until tooLarge(points, cells) is false for
+    the points estimated from the LAS headers in each buffered tile and its
+    cells, or until quadrants would be narrower than minCells. Returns the
+    leaves holding points, with their estimated points.
+    """
+    leaves = []
+    pending = [(tile, [h for h in headers if h is not None]) for tile in tiles]
+    while pending:
+        tile, candidates = pending.pop()
+        xmin, ymin, xmax, ymax = tile.bounds(buffer)
+        # children only touch files their parent touches
+        candidates = [h for h in candidates
+                      if h.minX <= xmax and h.maxX >= xmin and h.minY <= ymax and h.maxY >= ymin]
+        if not candidates:
+            continue
+        tile.points = tile.pointEstimate(candidates, buffer)
+        cells = round(tile.width() / grid.cellSize + 2 * buffer / grid.cellSize) * \
+            round(tile.height() / grid.cellSize + 2 * buffer / grid.cellSize)
+        narrowest = min(tile.columns[1] - tile.columns[0], tile.rows[1] - tile.rows[0])
+        if narrowest >= 2 * minCells and tooLarge(tile.points, cells):
+            pending.extend((quadrant, candidates) for quadrant in grid.split(tile))
+        else:
+            leaves.append(tile)
+    # the heaviest tiles first, so that they do not end up last in the queue
+    leaves.sort(key=lambda t: -t.points)
+    return leaves
+
+
+def autoTileSize(bounds, cellSize, jobs=1, density=0, bytesPerPoint=0, bytesPerCell=0,
+                 budget=None, buffer=0):
+    """
+    Returns a tile size, a multiple of the cell size, that gives each of
+    'jobs' concurrent jobs TILES_PER_JOB tiles of bounds and keeps the
+    memory of a buffered tile within budget. The memory of a tile is
+    estimated from the point density, the bytes per point and the bytes
+    per cell.
+    """
+    xmin, ymin, xmax, ymax = bounds
+    count = max(TILES_PER_JOB * jobs, 1)
+    side = math.sqrt(max(xmax - xmin, cellSize) * max(ymax - ymin, cellSize) / count)
+    perArea = density * bytesPerPoint + bytesPerCell / (cellSize * cellSize)
+    if budget and perArea > 0:
+        side = min(side, math.sqrt(budget / perArea) - 2 * buffer)
+    cells = max(math.floor(side / cellSize + EPSILON), MIN_TILE_CELLS)
+    return cells * cellSize
+
+
+def tileOutputs(tiles, directories):
+    """
+    Maps the names of the files written to the tile directories to the
+    (tile, path) pairs of the tiles that wrote them.
+    """
+    outputs = {}
+    for tile, directory in zip(tiles, directories):
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                outputs.setdefault(name, []).append((tile, path))
+    return outputs
+
+
+def stitchOutputs(grid, tiles, directories, outputDirectory, feedback=None, skip=()):
+    """
+    Combines the files written by the tiles into files of the same names in
+    outputDirectory. CSV tables, ASCII rasters and DTMs are stitched, any other
+    file is taken from the first tile that wrote it. Files with an extension
+    in skip are left to the caller. Returns the paths of the combined files.
+    """
+    written = []
+    for name, parts in tileOutputs(tiles, directories).items():
+        if os.path.splitext(name)[1].lower() in skip:
+            continue
+        target = os.path.join(outputDirectory, name)
+        extension = os.path.splitext(name)[1].lower()
+        if feedback is not None:
+            feedback.pushInfo('Stitching {} tiles into {}'.format(len(parts), target))
+        if extension == '.csv':
+            stitchCsv(grid, parts, target)
+        elif extension == '.asc':
+            stitchAscii(grid, parts, target)
+        elif extension == '.dtm':
+            stitchDtm(grid, parts, target)
+        else:
+            shutil.copyfile(parts[0][1], target)
+        written.append(target)
+    return written
+
+
+def findColumn(header, *names):
+    normalized = [h.strip().strip('"').lower() for h in header]
+    for name in names:
+        if name in normalized:
+            return normalized.index(name)
+    return None
+
+
+def csvHeader(path):
+    with open(path, 'r', newline='') as f:
+        return next(csv.reader(f), None)
+
+
+def csvRows(path):
+    """
+    Yields the rows of a CSV table after its header, one at a time.
+    """
+    with open(path, 'r', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for r in reader:
+            if r:
+                yield r
+
+
+def stitchCsv(grid, parts, target):
+    """
+    Stitches per-cell CSV tables such as the GridMetrics output. Rows of
+    cells outside the core of their tile are dropped, and the row and col
+    fields are renumbered for the combined grid, keeping the numbering
+    base and direction used by FUSION. Tables are read one band of rows
+    at a time. Tables without cell center columns are concatenated.
+    """
+    header = None
+    for tile, path in parts:
+        header = csvHeader(path)
+        if header is not None:
+            break
+    if header is None:
+        open(target, 'w').close()
+        return
+
+    xColumn = findColumn(header, 'center x')
+    yColumn = findColumn(header, 'center y')
+    rowColumn = findColumn(header, 'row')
+    colColumn = findColumn(header, 'col')
+    if xColumn is None or yColumn is None:
+        with open(target, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for tile, path in parts:
+                writer.writerows(csvRows(path))
+        return
+
+    def tileCells(path):
+        for r in csvRows(path):
+            x = float(r[xColumn])
+            y = float(r[yColumn])
+            yield grid.cellColumn(x), grid.cellRow(y), x, y, r
+
+    def coreCells(tile, path):
+        for column, row, x, y, r in tileCells(path):
+            if grid.holds(tile, x, y):
+                yield column, row, r
+
+    numbering = None
+    if rowColumn is not None and colColumn is not None:
+        numbering = csvNumbering(grid, [tileCells(path) for tile, path in parts], rowColumn, colColumn)
+
+    # bands of rows from north to south, each read from the tiles crossing it
+    rowBands = bands([grid.coreRows(tile) for tile, path in parts])[::-1]
+    if numbering is not None and not numbering['topDown']:
+        rowBands.reverse()
+
+    with open(target, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for band in rowBands:
+            cells = {}
+            for tile, path in parts:
+                if overlaps(grid.coreRows(tile), band):
+                    for column, row, r in coreCells(tile, path):
+                        if band[0] <= row < band[1]:
+                            cells.setdefault((column, row), r)
+            if numbering is None:
+                writer.writerows(cells.values())
+                continue
+            rows = []
+            for (column, row), r in cells.items():
+                r = list(r)
+                r[colColumn] = numbering['colBase'] + column - numbering['minColumn']
+                if numbering['topDown']:
+                    r[rowColumn] = numbering['rowBase'] + numbering['maxRow'] - row
+                else:
+                    r[rowColumn] = numbering['rowBase'] + row - numbering['minRow']
+                rows.append(r)
+            rows.sort(key=lambda r: (r[rowColumn], r[colColumn]))
+            writer.writerows(rows)
+
+
+def csvNumbering(grid, tables, rowColumn, colColumn):
+    """
+    Finds the base of the row and col numbers FUSION wrote for the cells of
+    each tile and whether rows are counted from the north, from the cells
+    of the tile tables given as iterables of (column, row, x, y, record).
+    Within a table the col number less the lattice column is the same for
+    every cell, as is the row number plus the lattice row when rows are
+    counted from the north, or less it when they are counted from the
+    south, so only these offsets and the extent of each table are kept.
+    The numbering of the combined product starts at the lattice cells of
+    the product extent. Returns None when the numbers can not be read.
+    """
+    colBase = None
+    bases = {True: None, False: None}
+    consistent = {True: True, False: True}
+    for cells in tables:
+        minColumn = minRow = maxRow = None
+        colOffset = None
+        offsets = {True: set(), False: set()}
+        lowest = {True: None, False: None}
+        for column, row, x, y, r in cells:
+            try:
+                c = int(float(r[colColumn]))
+                rr = int(float(r[rowColumn]))
+            except ValueError:
+                return None
+            minColumn = column if minColumn is None else min(minColumn, column)
+            minRow = row if minRow is None else min(minRow, row)
+            maxRow = row if maxRow is None else max(maxRow, row)
+            colOffset = c - column if colOffset is None else min(colOffset, c - column)
+            # two offsets are enough to tell the numbering is not consistent
+            for topDown, offset in ((True, rr + row), (False, rr - row)):
+                if len(offsets[topDown]) < 2:
+                    offsets[topDown].add(offset)
+                lowest[topDown] = offset if lowest[topDown] is None else min(lowest[topDown], offset)
+        if minColumn is None:
+            continue
+        base = colOffset + minColumn
+        colBase = base if colBase is None else min(colBase, base)
+        for topDown in (True, False):
+            consistent[topDown] = consistent[topDown] and len(offsets[topDown]) == 1
+            base = lowest[topDown] - maxRow if topDown else lowest[topDown] + minRow
+            bases[topDown] = base if bases[topDown] is None else min(bases[topDown], base)
+    if colBase is None:
+        return None
+    topDown = consistent[True] or not consistent[False]
+    return {'colBase': colBase,
+            'rowBase': bases[topDown],
+            'topDown': topDown,
+            'minColumn': grid.cellColumns[0],
+            'minRow': grid.cellRows[0],
+            'maxRow': grid.cellRows[1] - 1}
+
+
+def readAsciiHeader(f):
+    """
+    Reads the header of an ESRI ASCII raster from an open file and returns
+    it as a dictionary with lower case keys, with the lower left corner in
+    xllcorner and yllcorner.
+    """
+    header = {}
+    while True:
+        position = f.tell()
+        line = f.readline()
+        parts = line.split()
+        if len(parts) != 2 or not parts[0][0].isalpha():
+            f.seek(position)
+            break
+        header[parts[0].lower()] = float(parts[1])
+    cellSize = header['cellsize']
+    if 'xllcenter' in header:
+        header['xllcorner'] = header['xllcenter'] - cellSize / 2
+    if 'yllcenter' in header:
+        header['yllcorner'] = header['yllcenter'] - cellSize / 2
+    header['ncols'] = int(header['ncols'])
+    header['nrows'] = int(header['nrows'])
+    return header
+
+
+def stitchAscii(grid, parts, target, nodata=-9999.0):
+    """
+    Stitches ESRI ASCII rasters of tiles into one raster covering all tile
+    cores, one band of rows at a time so that memory is bounded by the
+    tiles crossing a band.
+    """
+    cores = []
+    for tile, path in parts:
+        with open(path, 'r') as f:
+            header = readAsciiHeader(f)
+        cellSize = header['cellsize']
+        nodata = header.get('nodata_value', nodata)
+        # lattice cells of the first column and of the top row of the raster
+        firstColumn = grid.cellColumn(header['xllcorner'] + cellSize / 2)
+        topRow = grid.cellRow(header['yllcorner'] + (header['nrows'] - 0.5) * cellSize)
+        coreColumns = grid.coreColumns(tile)
+        coreRows = grid.coreRows(tile)
+        columns = (max(firstColumn, coreColumns[0]), min(firstColumn + header['ncols'], coreColumns[1]))
+        rows = (max(topRow - header['nrows'] + 1, coreRows[0]), min(topRow + 1, coreRows[1]))
+        if columns[0] < columns[1] and rows[0] < rows[1]:
+            cores.append((tile, path, header, firstColumn, topRow, columns, rows))
+
+    if not cores:
+        open(target, 'w').close()
+        return
+
+    cellSize = grid.cellSize
+    minColumn = min(c[5][0] for c in cores)
+    maxColumn = max(c[5][1] for c in cores)
+    minRow = min(c[6][0] for c in cores)
+    maxRow = max(c[6][1] for c in cores)
+    ncols = maxColumn - minColumn
+    nrows = maxRow - minRow
+
+    with open(target, 'w') as out:
+        out.write('ncols {}\n'.format(ncols))
+        out.write('nrows {}\n'.format(nrows))
+        out.write('xllcorner {!r}\n'.format(grid.originX + minColumn * cellSize))
+        out.write('yllcorner {!r}\n'.format(grid.originY + minRow * cellSize))
+        out.write('cellsize {!r}\n'.format(cellSize))
+        out.write('NODATA_value {}\n'.format(formatValue(nodata)))
+
+        # lattice row below the last row written, rows run north to south
+        written = maxRow
+        loaded = {}
+        for bandBottom, bandTop in bands([c[6] for c in cores])[::-1]:
+            if written > bandTop:
+                numpy.savetxt(out, numpy.full((written - bandTop, ncols), nodata), fmt=VALUE_FORMAT)
+            values = numpy.full((bandTop - bandBottom, ncols), nodata, dtype=numpy.float64)
+            for tile, path, header, firstColumn, topRow, columns, rows in cores:
+                if not overlaps(rows, (bandBottom, bandTop)):
+                    continue
+                if path not in loaded:
+                    with open(path, 'r') as f:
+                        readAsciiHeader(f)
+                        data = numpy.loadtxt(f, dtype=numpy.float64, ndmin=2)
+                    tileNodata = header.get('nodata_value', nodata)
+                    if tileNodata != nodata:
+                        data[data == tileNodata] = nodata
+                    loaded[path] = data
+                data = loaded[path]
+                bottom = max(rows[0], bandBottom)
+                top = min(rows[1], bandTop)
+                part = data[topRow + 1 - top:topRow + 1 - bottom,
+                            columns[0] - firstColumn:columns[1] - firstColumn]
+                values[bandTop - top:bandTop - bottom,
+                       columns[0] - minColumn:columns[1] - minColumn] = part
+                # tiles are kept until the bands pass their southern edge
+                if rows[0] >= bandBottom:
+                    del loaded[path]
+            numpy.savetxt(out, values, fmt=VALUE_FORMAT)
+            written = bandBottom
+        if written > minRow:
+            numpy.savetxt(out, numpy.full((written - minRow, ncols), nodata), fmt=VALUE_FORMAT)
+
+
+def stitchDtm(grid, parts, target):
+    """
+    Stitches PLANS DTM files of tiles into one DTM covering the extent of
+    the product. Cells come from the core of their tile only, cells no tile
+    covers are voids. The output is written through a memory map one band
+    of columns at a time, DTMs store columns from west to east.
+    """
+    cores = []
+    for tile, path in parts:
+        header = fusionDtm.readHeader(path)
+        # lattice cells of the origin of the tile DTM
+        firstColumn = grid.cellColumn(header.originX)
+        firstRow = grid.cellRow(header.originY)
+        coreColumns = grid.coreColumns(tile)
+        coreRows = grid.coreRows(tile)
+        columns = (max(firstColumn, coreColumns[0]), min(firstColumn + header.columns, coreColumns[1]))
+        rows = (max(firstRow, coreRows[0]), min(firstRow + header.rows, coreRows[1]))
+        if columns[0] < columns[1] and rows[0] < rows[1]:
+            cores.append((tile, path, header, firstColumn, firstRow, columns, rows))
+    if not cores:
+        raise ValueError('No tile covers the product')
+
+    first = cores[0][2]
+    minColumn, maxColumn = grid.cellColumns
+    minRow, maxRow = grid.cellRows
+    nrows = maxRow - minRow
+    # grid nodes keep the offset from the lattice the tiles were run with
+    originX = first.originX + (minColumn - cores[0][3]) * grid.cellSize
+    originY = first.originY + (minRow - cores[0][4]) * grid.cellSize
+    header = first.copy(originX=originX, originY=originY,
+                        columns=maxColumn - minColumn, rows=nrows,
+                        minZ=0.0, maxZ=0.0)
+
+    values = fusionDtm.createDtm(target, header)
+    # the product edges are band edges, columns no tile covers stay voids
+    for columns in bands([c[5] for c in cores] + [(minColumn, maxColumn)]):
+        for tile, path, tileHeader, firstColumn, firstRow, tileColumns, tileRows in cores:
+            if not overlaps(tileColumns, columns):
+                continue
+            first = max(tileColumns[0], columns[0])
+            last = min(tileColumns[1], columns[1])
+            data = fusionDtm.openValues(path, tileHeader)[1]
+            values[first - minColumn:last - minColumn, tileRows[0] - minRow:tileRows[1] - minRow] = \
+                data[first - firstColumn:last - firstColumn, tileRows[0] - firstRow:tileRows[1] - firstRow]
+            del data
+        values.flush()
+    fusionDtm.finishDtm(target, header, values)
+    del values
+
+
+def formatValue(value):
+    return VALUE_FORMAT % value
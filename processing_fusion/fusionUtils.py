@@ -25,10 +25,18 @@ __copyright__ = '(C) 2019, Alexander Bruy'
 
 __revision__ = '$Format:%H$'
 
+import collections
+import gzip
 import os
+import queue
+import signal
 import subprocess
+import threading
+import time
+import uuid
 
 from qgis.core import (Qgis,
+                       QgsApplication,
                        QgsMessageLog,
                        QgsProcessingFeedback,
                        QgsProcessingUtils
@@ -36,18 +44,200 @@ from qgis.core import (Qgis,
 # from processing.core.ProcessingLog import ProcessingLog
 from processing.core.ProcessingConfig import ProcessingConfig
 
+from processing_fusion.fusionCache import OutputWatch, ResultCache, releaseOutputs
+from processing_fusion.fusionLauncher import RUNTIMES, launch, runtime
+from processing_fusion.fusionProgress import ConsoleBatcher, progressParser, toolName
+from processing_fusion.fusionStats import ResourceMonitor, recordRun
+from processing_fusion.lasCatalog import catalog
+
 FUSION_ACTIVE = 'FUSION_ACTIVE'
 FUSION_VERBOSE = 'FUSION_VERBOSE'
 FUSION_DIRECTORY = 'FUSION_DIRECTORY'
+FUSION_MAX_JOBS = 'FUSION_MAX_JOBS'
+FUSION_LOG_DIRECTORY = 'FUSION_LOG_DIRECTORY'
+FUSION_LOG_LINES = 'FUSION_LOG_LINES'
+FUSION_CACHE = 'FUSION_CACHE'
+FUSION_CACHE_DIRECTORY = 'FUSION_CACHE_DIRECTORY'
+FUSION_CACHE_SIZE = 'FUSION_CACHE_SIZE'
+FUSION_STATS_FILE = 'FUSION_STATS_FILE'
+FUSION_RUNTIME = 'FUSION_RUNTIME'
+FUSION_WINE = 'FUSION_WINE'
+FUSION_WINE_PREFIX = 'FUSION_WINE_PREFIX'
+FUSION_CATALOG = 'FUSION_CATALOG'
+FUSION_SERVER = 'FUSION_SERVER'
+FUSION_SERVER_HOST = 'FUSION_SERVER_HOST'
+FUSION_SERVER_PORT = 'FUSION_SERVER_PORT'
+FUSION_SERVER_TOKEN = 'FUSION_SERVER_TOKEN'
+FUSION_VRT_SIDECARS = 'FUSION_VRT_SIDECARS'
+
+# output lines kept in memory per command when no setting is available
+LOG_LINES = 1000
+# default size limit of the result cache in MB
+CACHE_SIZE = 10240
+# default port of the job server workers connect to
+SERVER_PORT = 47300
+
+# seconds between checks for cancellation while waiting for output
+POLL_INTERVAL = 0.2
+# seconds a canceled process tree gets to exit before it is killed
+KILL_TIMEOUT = 5
+# seconds between console updates, output lines are pushed in batches
+CONSOLE_INTERVAL = 0.5
 
 
 def fusionDirectory():
     filePath = ProcessingConfig.getSetting(FUSION_DIRECTORY)
     return filePath if filePath is not None else 'C:/FUSION'  # ugly workaround to use in standalone scripts
-    
 
 
-def execute(commands, feedback=None):
+def maxJobs():
+    try:
+        jobs = int(ProcessingConfig.getSetting(FUSION_MAX_JOBS))
+    except (TypeError, ValueError):
+        jobs = 0
+    return jobs if jobs > 0 else (os.cpu_count() or 1)
+
+
+def logLines():
+    try:
+        lines = int(ProcessingConfig.getSetting(FUSION_LOG_LINES))
+    except (TypeError, ValueError):
+        lines = 0
+    return lines if lines > 0 else LOG_LINES
+
+
+def cacheDirectory():
+    directory = ProcessingConfig.getSetting(FUSION_CACHE_DIRECTORY)
+    if directory:
+        return directory
+    return os.path.join(QgsApplication.qgisSettingsDirPath(), 'fusion_cache')
+
+
+def resultCache():
+    """
+    Returns the result cache, or None when caching is disabled.
+    """
+    if not ProcessingConfig.getSetting(FUSION_CACHE):
+        return None
+    try:
+        size = int(ProcessingConfig.getSetting(FUSION_CACHE_SIZE))
+    except (TypeError, ValueError):
+        size = CACHE_SIZE
+    return ResultCache(cacheDirectory(), size * 1024 * 1024)
+
+
+def fusionRuntime():
+    """
+    Returns the runtime used to start FUSION executables, as configured in
+    the provider settings.
+    """
+    name = ProcessingConfig.getSetting(FUSION_RUNTIME, readable=True)
+    if name not in RUNTIMES:
+        name = RUNTIMES[0]
+    return runtime(name,
+                   ProcessingConfig.getSetting(FUSION_WINE),
+                   ProcessingConfig.getSetting(FUSION_WINE_PREFIX))
+
+
+def statsFile():
+    path = ProcessingConfig.getSetting(FUSION_STATS_FILE)
+    if path is None:
+        return os.path.join(QgsApplication.qgisSettingsDirPath(), 'fusion_runs.jsonl')
+    return path
+
+
+def catalogFile():
+    path = ProcessingConfig.getSetting(FUSION_CATALOG)
+    if path is None:
+        return os.path.join(QgsApplication.qgisSettingsDirPath(), 'fusion_catalog.sqlite')
+    return path
+
+
+def lasCatalog():
+    """
+    Returns the LAS header catalog, or None when it is disabled.
+    """
+    path = catalogFile()
+    return catalog(path) if path else None
+
+
+def recordStats(commands, info, record):
+    """
+    Writes the resource usage of a run to the statistics file, if enabled.
+    """
+    path = statsFile()
+    if not path:
+        return
+    record.update(info or {})
+    record['time'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    record['tool'] = toolName(commands)
+    record['command'] = ' '.join(str(c) for c in commands)
+    try:
+        recordRun(path, record)
+    except OSError as e:
+        QgsMessageLog.logMessage('Could not write FUSION statistics: {}'.format(e),
+                                 'Processing', Qgis.MessageLevel.Warning)
+
+
+class OutputLog:
+    """
+    Output of a FUSION command. Only the last lines are kept in memory,
+    the full output is optionally written to a gzip compressed file in the
+    FUSION log directory.
+    """
+
+    def __init__(self, commands, maxLines=None, directory=None):
+        self.lines = collections.deque(maxlen=maxLines or logLines())
+        self.count = 0
+        self.path = None
+        self.file = None
+
+        if directory is None:
+            directory = ProcessingConfig.getSetting(FUSION_LOG_DIRECTORY)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, '{}_{}_{}.log.gz'.format(time.strftime('%Y%m%d-%H%M%S'),
+                                                                         toolName(commands) or 'fusion',
+                                                                         uuid.uuid4().hex[:8]))
+            self.file = gzip.open(self.path, 'wt', encoding='utf-8')
+            self.file.write(' '.join(str(c) for c in commands) + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    def append(self, line):
+        self.lines.append(line)
+        self.count += 1
+        if self.file is not None:
+            self.file.write(line)
+
+    def tail(self):
+        text = ''.join(self.lines).rstrip('\n')
+        skipped = self.count - len(self.lines)
+        if skipped > 0:
+            text = '[{} earlier lines omitted]\n{}'.format(skipped, text)
+        return text
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def execute(commands, feedback=None, outputs=None, info=None):
+    """
+    Runs a FUSION command and returns its exit code. The command is split
+    into arguments and started without a shell, using the native or Wine
+    runtime selected in the provider settings. When the output files
+    are given and the result cache is enabled, a run with the same
+    arguments and unchanged inputs restores the cached outputs instead.
+    The resources used are recorded in the statistics file together with
+    the values in info, such as the algorithm name and its parameters.
+    """
     if feedback is None:
         feedback = QgsProcessingFeedback()
 
@@ -55,24 +245,143 @@ def execute(commands, feedback=None):
     QgsMessageLog.logMessage(fused_command, 'Processing', Qgis.MessageLevel.Info)
     feedback.pushInfo('FUSION command:')
     feedback.pushCommandInfo(fused_command)
+
+    cache = resultCache() if outputs else None
+    if cache is not None:
+        started = time.monotonic()
+        key = cache.key(commands, outputs)
+        if cache.restore(key, outputs):
+            feedback.pushInfo('FUSION outputs restored from cache')
+            feedback.setProgress(100)
+            recordStats(commands, info, {'wall': round(time.monotonic() - started, 3),
+                                         'exitCode': 0,
+                                         'cached': True})
+            return 0
+        releaseOutputs(outputs)
+
     feedback.pushInfo('FUSION command output:')
+    # files written next to the outputs are found by listing them before
+    # and after the run
+    with OutputWatch(outputs if cache is not None else []) as watch:
+        console = ConsoleBatcher(feedback, CONSOLE_INTERVAL)
+        parser = progressParser(commands)
+        log = OutputLog(commands)
+        with log, launch(commands,
+                         fusionRuntime(),
+                         stdout=subprocess.PIPE,
+                         stdin=subprocess.DEVNULL,
+                         stderr=subprocess.STDOUT,
+                         universal_newlines=True,
+                         errors='replace',
+                         **processGroupArguments()) as proc:
+            monitor = ResourceMonitor(proc.pid)
+            lines = queue.Queue()
+            reader = threading.Thread(target=readOutput, args=(proc.stdout, lines), daemon=True)
+            reader.start()
+            while True:
+                if feedback.isCanceled():
+                    feedback.pushInfo('FUSION command canceled, terminating process tree')
+                    killProcessTree(proc)
+                    break
+                monitor.sample()
+                try:
+                    line = lines.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    console.flushIfDue()
+                    continue
+                if line is None:
+                    break
+                console.add(line)
+                log.append(line)
+                progress = parser.parse(line)
+                if progress is not None:
+                    feedback.setProgress(progress)
+            reader.join(KILL_TIMEOUT)
+            console.flush()
+            monitor.sample(force=True)
+            monitor.wait(proc)
+
+        record = monitor.result()
+        record['exitCode'] = proc.returncode
+        record['cached'] = False
+        record['canceled'] = feedback.isCanceled()
+        recordStats(commands, info, record)
+
+        if cache is not None and proc.returncode == 0 and not feedback.isCanceled():
+            cache.store(key, outputs, watch)
+
+    if log.path:
+        feedback.pushInfo('Full FUSION output written to {}'.format(log.path))
+    if ProcessingConfig.getSetting(FUSION_VERBOSE):
+        message = log.tail()
+        if log.path:
+            message += '\n[full output in {}]'.format(log.path)
+        QgsMessageLog.logMessage(message, 'Processing', Qgis.MessageLevel.Info)
+
+    return proc.returncode
+
 
-    loglines = []
-    with subprocess.Popen(fused_command,
-                          shell=True,
-                          stdout=subprocess.PIPE,
-                          stdin=subprocess.DEVNULL,
-                          stderr=subprocess.STDOUT,
-                          universal_newlines=True) as proc:
+def readOutput(stream, lines):
+    """
+    Reads process output line by line into a queue, None marks the end.
+    """
+    try:
+        for line in iter(stream.readline, ''):
+            lines.put(line)
+    except (OSError, ValueError):
+        # the pipe was closed because the process was killed
+        pass
+    finally:
+        lines.put(None)
+
+
+def processGroupArguments():
+    """
+    Popen arguments that start the command in its own process group, so
+    the command and everything it spawns can be terminated together.
+    """
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def killProcessTree(proc, timeout=KILL_TIMEOUT):
+    """
+    Terminates a process started with processGroupArguments() together with
+    all of its children, waiting at most about twice the timeout.
+    """
+    if proc.poll() is not None:
+        return
+
+    if os.name == 'nt':
+        try:
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)],
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL,
+                           timeout=timeout)
+        except (subprocess.TimeoutExpired, OSError):
+            # the process itself is still killed below
+            pass
+    else:
         try:
-            for line in iter(proc.stdout.readline, ''):
-                feedback.pushConsoleInfo(line)
-                loglines.append(line)
-        except:
+            os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                # the group exited after the timeout
+                pass
+        except ProcessLookupError:
             pass
 
-    if ProcessingConfig.getSetting(FUSION_VERBOSE):
-        QgsMessageLog.logMessage('\n'.join(loglines), 'Processing', Qgis.MessageLevel.Info)
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
 
 
 def layersToFile(fileName, alg, parameters, parameter, context, quote=True):
@@ -89,6 +398,21 @@ def layersToFile(fileName, alg, parameters, parameter, context, quote=True):
 
     return listFile
 
+def mergeCommands(parts, outputFile):
+    """
+    Returns the command merging LAS files into outputFile. MergeData is run
+    as MergeData.exe like the MergeData algorithm, whatever build the
+    tool that wrote the parts used.
+    """
+    commands = ['"' + os.path.join(fusionDirectory(), 'MergeData.exe') + '"']
+    if len(parts) == 1:
+        commands.append('"%s"' % parts[0])
+    else:
+        commands.append(filenamesToFile(parts))
+    commands.append('"%s"' % outputFile)
+    return commands
+
+
 def filenamesToFile(files):
     listFile = QgsProcessingUtils.generateTempFilename("inputfiles.txt")
     with open(listFile, 'w', encoding='utf-8') as f:
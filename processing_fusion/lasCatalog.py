@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    lasCatalog.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Persistent catalog of LAS/LAZ headers.
+
+Headers are kept in a SQLite database together with the size and
+modification time of their file, so only new and changed files are read
+again when a collection is indexed a second time. File extents are kept
+in an R-tree for spatial queries.
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from processing_fusion.fusionCache import normalizedPath
+from processing_fusion.lasHeader import LasHeader, headerBounds, readHeaders
+
+# concurrent header reads, reads are small and mostly wait for the disk
+HEADER_READERS = 16
+# files stat'ed or read per task of the reader pool
+BATCH_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    version TEXT,
+    pointFormat INTEGER,
+    pointLength INTEGER,
+    pointCount INTEGER,
+    pointsByReturn TEXT,
+    scale TEXT,
+    offset TEXT,
+    minX REAL, minY REAL, minZ REAL,
+    maxX REAL, maxY REAL, maxZ REAL,
+    compressed INTEGER
+)
+"""
+
+
+def statFiles(paths):
+    result = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            result.append((path, st.st_size, st.st_mtime_ns))
+        except OSError:
+            result.append((path, None, None))
+    return result
+
+
+def batches(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class LasCatalog:
+    """
+    Catalog of LAS/LAZ file headers stored in a SQLite database.
+
+        catalog = LasCatalog(path)
+        catalog.update(files)
+        tiles = catalog.intersecting((xmin, ymin, xmax, ymax), files)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(SCHEMA)
+        try:
+            self.connection.execute('CREATE VIRTUAL TABLE IF NOT EXISTS extents '
+                                    'USING rtree(id, minX, maxX, minY, maxY)')
+            self.rtree = True
+        except sqlite3.OperationalError:
+            # SQLite built without the R-tree module, fall back to a table scan
+            self.rtree = False
+        self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def update(self, paths, feedback=None):
+        """
+        Brings the catalog up to date for the given files: headers of new
+        and changed files are read, files that no longer exist are removed.
+        Returns the number of headers read.
+        """
+        paths = list(dict.fromkeys(normalizedPath(p) for p in paths))
+        if not paths:
+            return 0
+
+        known = {row[0]: (row[1], row[2]) for row in self.selectPaths('path, size, mtime', paths)}
+
+        with ThreadPoolExecutor(max_workers=HEADER_READERS, thread_name_prefix='las-header') as pool:
+            stats = []
+            for result in pool.map(statFiles, batches(paths)):
+                stats.extend(result)
+
+            missing = [path for path, size, mtime in stats if size is None and path in known]
+            changed = [(path, size, mtime) for path, size, mtime in stats
+                       if size is not None and known.get(path) != (size, mtime)]
+
+            if feedback is not None and changed:
+                feedback.pushInfo('Reading {} of {} LAS headers'.format(len(changed), len(paths)))
+
+            rows = []
+            done = 0
+            for chunk, headers in zip(batches(changed),
+                                      pool.map(readHeaders, ([c[0] for c in chunk] for chunk in batches(changed)))):
+                for (path, size, mtime), header in zip(chunk, headers):
+                    if header is not None:
+                        rows.append((path, size, mtime, header))
+                    else:
+                        missing.append(path)
+                done += len(chunk)
+                if feedback is not None:
+                    if feedback.isCanceled():
+                        break
+                    feedback.setProgress(100.0 * done / len(changed))
+
+        with self.lock:
+            with self.connection:
+                self.removePaths(missing)
+                self.removePaths([r[0] for r in rows])
+                for path, size, mtime, h in rows:
+                    cursor = self.connection.execute(
+                        'INSERT INTO files (path, size, mtime, version, pointFormat, pointLength, pointCount, '
+                        'pointsByReturn, scale, offset, minX, minY, minZ, maxX, maxY, maxZ, compressed) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (path, size, mtime, h.version, h.pointFormat, h.pointLength, h.pointCount,
+                         json.dumps(h.pointsByReturn), json.dumps(h.scale), json.dumps(h.offset),
+                         h.minX, h.minY, h.minZ, h.maxX, h.maxY, h.maxZ, int(h.compressed)))
+                    if self.rtree:
+                        self.connection.execute('INSERT INTO extents VALUES (?, ?, ?, ?, ?)',
+                                                (cursor.lastrowid, h.minX, h.maxX, h.minY, h.maxY))
+        return len(rows)
+
+    def removePaths(self, paths):
+        for chunk in batches(paths, 500):
+            marks = ','.join('?' * len(chunk))
+            if self.rtree:
+                self.connection.execute('DELETE FROM extents WHERE id IN '
+                                        '(SELECT id FROM files WHERE path IN ({}))'.format(marks), chunk)
+            self.connection.execute('DELETE FROM files WHERE path IN ({})'.format(marks), chunk)
+
+    def selectPaths(self, columns, paths):
+        """
+        Returns the rows of the given files, or of all files when paths is
+        None, so a large catalog is not scanned for a few files.
+        """
+        with self.lock:
+            if paths is None:
+                return self.connection.execute('SELECT {} FROM files'.format(columns)).fetchall()
+            rows = []
+            for chunk in batches(list(dict.fromkeys(normalizedPath(p) for p in paths)), 500):
+                rows.extend(self.connection.execute(
+                    'SELECT {} FROM files WHERE path IN ({})'.format(columns, ','.join('?' * len(chunk))),
+                    chunk).fetchall())
+            return rows
+
+    def headers(self, paths=None):
+        """
+        Returns a dictionary of the stored headers by normalized path,
+        limited to the given files.
+        """
+        return {row[1]: self.rowHeader(row) for row in self.selectPaths('*', paths)}
+
+    def header(self, path):
+        with self.lock:
+            row = self.connection.execute('SELECT * FROM files WHERE path = ?',
+                                          (normalizedPath(path),)).fetchone()
+        return self.rowHeader(row) if row is not None else None
+
+    def rowHeader(self, row):
+        return LasHeader(row[4], row[5], row[6], row[7],
+                         tuple(json.loads(row[8])),
+                         tuple(json.loads(row[9])),
+                         tuple(json.loads(row[10])),
+                         row[11], row[12], row[13], row[14], row[15], row[16],
+                         bool(row[17]))
+
+    def intersecting(self, bounds, paths=None):
+        """
+        Returns the files whose extent intersects bounds (xmin, ymin, xmax,
+        ymax), limited to the given files and in their order. The catalog
+        should be up to date for them, see update().
+        """
+        xmin, ymin, xmax, ymax = bounds
+        with self.lock:
+            if self.rtree:
+                rows = self.connection.execute(
+                    'SELECT f.path FROM extents e JOIN files f ON f.id = e.id '
+                    'WHERE e.minX <= ? AND e.maxX >= ? AND e.minY <= ? AND e.maxY >= ?',
+                    (xmax, xmin, ymax, ymin)).fetchall()
+            else:
+                rows = self.connection.execute(
+                    'SELECT path FROM files WHERE minX <= ? AND maxX >= ? AND minY <= ? AND maxY >= ?',
+                    (xmax, xmin, ymax, ymin)).fetchall()
+        found = set(row[0] for row in rows)
+        if paths is None:
+            return sorted(found)
+        return [p for p in paths if normalizedPath(p) in found]
+
+    def bounds(self, paths=None):
+        """
+        Returns the combined extent (xmin, ymin, xmax, ymax) of files, or
+        None when none of them is in the catalog.
+        """
+        return headerBounds(list(self.headers(paths).values()))
+
+
+catalogs = {}
+catalogsLock = threading.Lock()
+
+
+def catalog(path):
+    """
+    Returns the shared catalog stored in a database file.
+    """
+    with catalogsLock:
+        if path not in catalogs:
+            catalogs[path] = LasCatalog(path)
+        return catalogs[path]
+
+
+def closeCatalogs():
+    with catalogsLock:
+        for c in catalogs.values():
+            c.close()
+        catalogs.clear()
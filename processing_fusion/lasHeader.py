@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    lasHeader.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import collections
+import struct
+
+# public header block of LAS 1.0 - 1.3, LAS 1.4 adds 64-bit counts after it
+HEADER_SIZE = 227
+HEADER_SIZE_14 = 375
+
+LasHeader = collections.namedtuple('LasHeader', ['version',
+                                                 'pointFormat',
+                                                 'pointLength',
+                                                 'pointCount',
+                                                 'pointsByReturn',
+                                                 'scale',
+                                                 'offset',
+                                                 'minX', 'minY', 'minZ',
+                                                 'maxX', 'maxY', 'maxZ',
+                                                 'compressed'])
+
+
+def parseHeader(data):
+    """
+    Parses the public header block of a LAS or LAZ file. LAZ files keep the
+    header uncompressed and flag the point format with bit 7.
+    """
+    if len(data) < HEADER_SIZE or data[:4] != b'LASF':
+        raise ValueError('Not a LAS file')
+
+    major, minor = struct.unpack_from('<BB', data, 24)
+    pointFormat, pointLength, legacyCount = struct.unpack_from('<BHI', data, 104)
+    legacyByReturn = struct.unpack_from('<5I', data, 111)
+    scale = struct.unpack_from('<3d', data, 131)
+    offset = struct.unpack_from('<3d', data, 155)
+    maxX, minX, maxY, minY, maxZ, minZ = struct.unpack_from('<6d', data, 179)
+
+    pointCount = legacyCount
+    pointsByReturn = legacyByReturn
+    if (major, minor) >= (1, 4) and len(data) >= HEADER_SIZE_14:
+        count = struct.unpack_from('<Q', data, 247)[0]
+        if count:
+            pointCount = count
+            pointsByReturn = struct.unpack_from('<15Q', data, 255)
+
+    compressed = bool(pointFormat & 0x80)
+    return LasHeader('{}.{}'.format(major, minor),
+                     pointFormat & 0x3f,
+                     pointLength,
+                     pointCount,
+                     tuple(pointsByReturn),
+                     scale,
+                     offset,
+                     minX, minY, minZ,
+                     maxX, maxY, maxZ,
+                     compressed)
+
+
+def readHeader(path):
+    """
+    Reads the header of a LAS or LAZ file.
+    """
+    with open(path, 'rb') as f:
+        return parseHeader(f.read(HEADER_SIZE_14))
+
+
+def readHeaders(paths):
+    """
+    Returns the headers of files, with None for files that are not LAS
+    or LAZ files or can not be read.
+    """
+    headers = []
+    for path in paths:
+        try:
+            headers.append(readHeader(path))
+        except (OSError, ValueError, struct.error):
+            headers.append(None)
+    return headers
+
+
+def headerBounds(headers):
+    """
+    Returns the combined extent (xmin, ymin, xmax, ymax) of headers, or
+    None without headers.
+    """
+    if not headers:
+        return None
+    return (min(h.minX for h in headers), min(h.minY for h in headers),
+            max(h.maxX for h in headers), max(h.maxY for h in headers))
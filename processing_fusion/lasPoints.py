@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    lasPoints.py
+    ---------------------
+    Date                 : October 2026
+    Copyright            : (C) 2026 by Fredrik Lindberg
+    Email                : fredrikl at gvc dot gu dot se
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Streams the point records of LAS files in chunks.
+
+Uncompressed files are memory mapped and only the fields needed are
+decoded. LAZ files are read with laspy when it is installed.
+"""
+
+__author__ = 'Fredrik Lindberg'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Fredrik Lindberg'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+import struct
+
+import numpy
+
+try:
+    import laspy
+except ImportError:
+    laspy = None
+
+from processing_fusion.lasHeader import HEADER_SIZE_14, parseHeader
+
+# points decoded at a time
+CHUNK_POINTS = 1000000
+# errors reading the points of a corrupt or truncated file
+READ_ERRORS = (OSError, ValueError, struct.error)
+if laspy is not None:
+    READ_ERRORS += (laspy.errors.LaspyException,)
+
+
+class PointChunk:
+    """
+    Coordinates, intensities and return numbers of a run of points.
+    """
+
+    def __init__(self, x, y, z, intensity, returnNumber):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.intensity = intensity
+        self.returnNumber = returnNumber
+
+    def __len__(self):
+        return len(self.x)
+
+
+def canRead(header):
+    return not header.compressed or laspy is not None
+
+
+def recordType(pointFormat, pointLength):
+    """
+    Numpy type of the fields of a point record used here. Formats 6 and
+    up keep four bits for the return number, the older ones three.
+    """
+    return numpy.dtype({'names': ['X', 'Y', 'Z', 'intensity', 'returns'],
+                        'formats': ['<i4', '<i4', '<i4', '<u2', 'u1'],
+                        'offsets': [0, 4, 8, 12, 14],
+                        'itemsize': pointLength})
+
+
+def readChunks(path, chunkPoints=CHUNK_POINTS):
+    """
+    Yields the points of a LAS or LAZ file as PointChunks with scaled
+    coordinates.
+    """
+    with open(path, 'rb') as f:
+        data = f.read(HEADER_SIZE_14)
+    header = parseHeader(data)
+    if header.compressed:
+        if laspy is None:
+            raise ValueError('Reading LAZ files needs laspy')
+        yield from readLaspyChunks(path, chunkPoints)
+        return
+
+    pointOffset = struct.unpack_from('<I', data, 96)[0]
+    records = numpy.memmap(path, dtype=recordType(header.pointFormat, header.pointLength),
+                           mode='r', offset=pointOffset, shape=(header.pointCount,))
+    returnMask = 0x0f if header.pointFormat >= 6 else 0x07
+    sx, sy, sz = header.scale
+    ox, oy, oz = header.offset
+    try:
+        for start in range(0, header.pointCount, chunkPoints):
+            r = records[start:start + chunkPoints]
+            yield PointChunk(r['X'] * sx + ox, r['Y'] * sy + oy, r['Z'] * sz + oz,
+                             numpy.array(r['intensity']), r['returns'] & returnMask)
+    finally:
+        del records
+
+
+def readLaspyChunks(path, chunkPoints):
+    with laspy.open(path) as reader:
+        for points in reader.chunk_iterator(chunkPoints):
+            yield PointChunk(numpy.asarray(points.x), numpy.asarray(points.y), numpy.asarray(points.z),
+                             numpy.asarray(points.intensity), numpy.asarray(points.return_number))
@@ -62,8 +62,9 @@ from processing_fusion.algs.tinsurfacecreate import TinSurfaceCreate
 from processing_fusion.algs.topometrics import TopoMetrics
 from processing_fusion.algs.treeseg import TreeSeg
 from processing_fusion.algs.openviewer import OpenViewer
+from processing_fusion.algs.setprojectgrid import SetProjectGrid
 
-from processing_fusion import fusionUtils
+from processing_fusion import fusionLauncher, fusionServer, fusionUtils, lasCatalog
 import os.path
 from qgis.PyQt.QtGui import QIcon
 import inspect
@@ -82,6 +83,25 @@ class ProcessingFUSIONProvider(QgsProcessingProvider):
     def unload(self):
         ProcessingConfig.removeSetting(fusionUtils.FUSION_ACTIVE)
         ProcessingConfig.removeSetting(fusionUtils.FUSION_VERBOSE)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_MAX_JOBS)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_LOG_DIRECTORY)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_LOG_LINES)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_CACHE)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_CACHE_DIRECTORY)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_CACHE_SIZE)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_STATS_FILE)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_RUNTIME)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_WINE)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_WINE_PREFIX)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_VRT_SIDECARS)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_CATALOG)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_SERVER)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_SERVER_HOST)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_SERVER_PORT)
+        ProcessingConfig.removeSetting(fusionUtils.FUSION_SERVER_TOKEN)
+        fusionServer.stopServer()
+        fusionLauncher.shutdown()
+        lasCatalog.closeCatalogs()
         pass
 
     def loadAlgorithms(self):
@@ -115,6 +135,7 @@ class ProcessingFUSIONProvider(QgsProcessingProvider):
         self.addAlgorithm(TreeSeg())
         self.addAlgorithm(TopoMetrics())
         self.addAlgorithm(OpenViewer())
+        self.addAlgorithm(SetProjectGrid())
 
     def id(self):
         return 'fusion'
@@ -136,10 +157,86 @@ class ProcessingFUSIONProvider(QgsProcessingProvider):
                                             self.tr('FUSION directory'),
                                             fusionUtils.fusionDirectory(),
                                             valuetype=Setting.FOLDER))        
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_RUNTIME,
+                                            self.tr('Run FUSION executables'),
+                                            fusionLauncher.RUNTIMES[0],
+                                            valuetype=Setting.SELECTION,
+                                            options=fusionLauncher.RUNTIMES))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_WINE,
+                                            self.tr('Wine executable'),
+                                            'wine',
+                                            valuetype=Setting.FILE))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_WINE_PREFIX,
+                                            self.tr('Wine prefix (empty for the default prefix)'),
+                                            '',
+                                            valuetype=Setting.FOLDER))
         ProcessingConfig.addSetting(Setting(self.name(),
                                             fusionUtils.FUSION_VERBOSE,
                                             self.tr('Log commands output'),
                                             False))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_MAX_JOBS,
+                                            self.tr('Maximum number of concurrent FUSION processes'),
+                                            os.cpu_count() or 1,
+                                            valuetype=Setting.INT))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_LOG_LINES,
+                                            self.tr('Number of output lines kept in memory per command'),
+                                            fusionUtils.LOG_LINES,
+                                            valuetype=Setting.INT))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_LOG_DIRECTORY,
+                                            self.tr('Directory for compressed command output logs (empty to disable)'),
+                                            '',
+                                            valuetype=Setting.FOLDER))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_CACHE,
+                                            self.tr('Reuse cached outputs of identical FUSION commands'),
+                                            False))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_CACHE_DIRECTORY,
+                                            self.tr('Result cache directory'),
+                                            fusionUtils.cacheDirectory(),
+                                            valuetype=Setting.FOLDER))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_CACHE_SIZE,
+                                            self.tr('Maximum size of the result cache (MB)'),
+                                            fusionUtils.CACHE_SIZE,
+                                            valuetype=Setting.INT))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_STATS_FILE,
+                                            self.tr('File for resource usage statistics of FUSION commands (empty to disable)'),
+                                            fusionUtils.statsFile(),
+                                            valuetype=Setting.FILE))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_VRT_SIDECARS,
+                                            self.tr('Write a GDAL VRT next to .dtm outputs to open them in QGIS'),
+                                            True))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_CATALOG,
+                                            self.tr('Database of LAS file headers (empty to disable)'),
+                                            fusionUtils.catalogFile(),
+                                            valuetype=Setting.FILE))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_SERVER,
+                                            self.tr('Distribute parallel FUSION jobs to worker daemons'),
+                                            False))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_SERVER_HOST,
+                                            self.tr('Address the job server listens on (0.0.0.0 for all interfaces)'),
+                                            '127.0.0.1'))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_SERVER_PORT,
+                                            self.tr('Job server port'),
+                                            fusionUtils.SERVER_PORT,
+                                            valuetype=Setting.INT))
+        ProcessingConfig.addSetting(Setting(self.name(),
+                                            fusionUtils.FUSION_SERVER_TOKEN,
+                                            self.tr('Shared token of the job server and its workers'),
+                                            ''))
         ProcessingConfig.readSettings()
         self.refreshAlgorithms()
         return True
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests of the modules of the plugin that do not need QGIS. Run them
+from the root of the repository with
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
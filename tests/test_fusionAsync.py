@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runs fake FUSION tools with fusionAsync. Needs the QGIS Python bindings,
+the tests are skipped without them.
+"""
+
+import asyncio
+import os
+import signal
+
+import pytest
+
+pytest.importorskip('qgis.core')
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason='the fake FUSION tools are shell scripts')
+
+from processing_fusion import fusionAsync, fusionUtils  # noqa: E402
+from processing_fusion.fusionCache import ResultCache  # noqa: E402
+from processing_fusion.fusionStats import readRuns  # noqa: E402
+
+
+@pytest.fixture
+def statsFile(monkeypatch, tmp_path):
+    path = str(tmp_path / 'runs.jsonl')
+    monkeypatch.setattr(fusionUtils, 'statsFile', lambda: path)
+    monkeypatch.setattr(fusionUtils, 'resultCache', lambda: None)
+    return path
+
+
+def writeTool(directory, name, script):
+    tool = directory / name
+    tool.write_text('#!/bin/sh\n' + script)
+    tool.chmod(0o755)
+    return '"{}"'.format(tool)
+
+
+def test_start_iterate_and_wait(tmp_path, statsFile):
+    tool = writeTool(tmp_path, 'Tool.exe', 'echo "ran $1"\necho "100%"\nexit "$2"\n')
+
+    async def run():
+        process = await fusionAsync.start([tool, 'a', '3'], info={'algorithm': 'test'})
+        lines = [line async for line in process]
+        return lines, await process.wait()
+
+    lines, result = asyncio.run(run())
+    assert lines == ['ran a\n', '100%\n']
+    assert result.returnCode == 3 and not result.succeeded()
+    assert result.output == 'ran a\n100%\n'
+    record = readRuns(statsFile)[-1]
+    assert (record['exitCode'], record['cached'], record['algorithm']) == (3, False, 'test')
+
+
+def test_cancel_kills_the_process_tree(tmp_path, statsFile):
+    psutil = pytest.importorskip('psutil')
+    child = tmp_path / 'child.pid'
+    tool = writeTool(tmp_path, 'Sleep.exe', 'sleep 30 &\necho $! > "{}"\nwait\n'.format(child))
+
+    async def run():
+        process = await fusionAsync.start([tool])
+        task = asyncio.ensure_future(process.wait())
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return process
+
+    process = asyncio.run(run())
+    assert process.process.returncode is not None
+    # the child is gone, or a zombie left to be reaped by init
+    try:
+        assert psutil.Process(int(child.read_text())).status() == psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        pass
+
+
+def test_kill_of_a_group_that_exits_meanwhile(tmp_path, statsFile, monkeypatch):
+    # the tool ignores SIGTERM, and its group exits right before SIGKILL
+    tool = writeTool(tmp_path, 'Stubborn.exe', "trap '' TERM\nsleep 30\n")
+    killpg = os.killpg
+
+    def exitingGroup(pid, sig):
+        killpg(pid, sig)
+        if sig == signal.SIGKILL:
+            raise ProcessLookupError()
+
+    monkeypatch.setattr(fusionAsync.os, 'killpg', exitingGroup)
+
+    async def run():
+        process = await fusionAsync.start([tool])
+        await asyncio.sleep(0.2)
+        await process.kill(timeout=0.2)
+        return process
+
+    assert asyncio.run(run()).process.returncode is not None
+
+
+def test_execute_many_limits_concurrent_jobs(tmp_path, statsFile):
+    log = tmp_path / 'log.txt'
+    tool = writeTool(tmp_path, 'Job.exe', 'echo start >> "{0}"\nsleep 0.2\necho end >> "{0}"\nexit "$1"\n'.format(log))
+
+    results = asyncio.run(fusionAsync.executeMany([[tool, str(i % 2)] for i in range(5)], maxJobs=2))
+    assert [r.returnCode for r in results] == [0, 1, 0, 1, 0]
+    running = peak = 0
+    for line in log.read_text().split():
+        running += 1 if line == 'start' else -1
+        peak = max(peak, running)
+    assert peak == 2
+
+
+def test_cache_hits_are_recorded(tmp_path, statsFile, monkeypatch):
+    cache = ResultCache(str(tmp_path / 'cache'), 1 << 20)
+    monkeypatch.setattr(fusionUtils, 'resultCache', lambda: cache)
+    output = tmp_path / 'out.txt'
+    tool = writeTool(tmp_path, 'Write.exe', 'echo surface > "$1"\n')
+
+    first = asyncio.run(fusionAsync.executeAsync([tool, '"{}"'.format(output)], outputs=[str(output)]))
+    second = asyncio.run(fusionAsync.executeAsync([tool, '"{}"'.format(output)], outputs=[str(output)]))
+    assert not first.cached and second.cached
+    assert output.read_text() == 'surface\n'
+    assert [r['cached'] for r in readRuns(statsFile)] == [False, True]
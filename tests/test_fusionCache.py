@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from processing_fusion.fusionCache import OutputWatch, ResultCache
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_store_and_restore(tmp_path):
+    source = str(tmp_path / 'in.las')
+    output = str(tmp_path / 'out' / 'surface.dtm')
+    os.makedirs(os.path.dirname(output))
+    write(source, 'points')
+    write(os.path.join(os.path.dirname(output), 'other.dtm'), 'not ours')
+    cache = ResultCache(str(tmp_path / 'cache'), 1 << 20)
+    commands = ['"CanopyModel.exe"', '"{}"'.format(output), '1', 'M', 'M', '0', '0', '0', '0', source]
+    key = cache.key(commands, [output])
+
+    with OutputWatch([output]) as watch:
+        write(output, 'surface')
+        write(output[:-4] + '.asc', 'ascii copy')
+        cache.store(key, [output], watch)
+
+    os.remove(output)
+    os.remove(output[:-4] + '.asc')
+    assert cache.key(commands, [output]) == key
+    assert cache.restore(key, [output])
+    assert open(output).read() == 'surface'
+    assert open(output[:-4] + '.asc').read() == 'ascii copy'
+
+
+def test_unchanged_files_are_not_produced(tmp_path):
+    output = str(tmp_path / 'metrics.csv')
+    write(str(tmp_path / 'metrics_old.csv'), 'earlier run')
+    with OutputWatch([output]) as watch:
+        write(output, 'new')
+    assert watch.produced(0) == [output]
+
+
+def test_changed_input_changes_key(tmp_path):
+    source = str(tmp_path / 'in.las')
+    write(source, 'points')
+    cache = ResultCache(str(tmp_path / 'cache'), 1 << 20)
+    key = cache.key(['tool.exe', source, 'out.dtm'], ['out.dtm'])
+    write(source, 'more points')
+    assert cache.key(['tool.exe', source, 'out.dtm'], ['out.dtm']) != key
+
+
+def test_concurrent_runs_with_shared_names_are_not_stored(tmp_path):
+    first = str(tmp_path / 'tile.csv')
+    second = str(tmp_path / 'tile_2.csv')
+    cache = ResultCache(str(tmp_path / 'cache'), 1 << 20)
+    with OutputWatch([first]) as watch:
+        with OutputWatch([second]):
+            write(second, 'other run')
+        write(first, 'this run')
+        assert watch.conflicted
+        cache.store('key', [first], watch)
+    assert not cache.restore('key', [first])
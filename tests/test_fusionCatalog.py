@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import struct
+
+import numpy
+
+from processing_fusion import fusionCatalog
+from processing_fusion.fusionTiles import readAsciiHeader
+from processing_fusion.lasHeader import HEADER_SIZE, readHeaders
+
+
+def writeLas(path, points):
+    """
+    Writes a LAS 1.2 file of point format 1 from (x, y, z, intensity,
+    return number) tuples, coordinates in hundredths.
+    """
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    data = bytearray(HEADER_SIZE)
+    data[:4] = b'LASF'
+    struct.pack_into('<BB', data, 24, 1, 2)
+    struct.pack_into('<HI', data, 94, HEADER_SIZE, HEADER_SIZE)
+    struct.pack_into('<BHI', data, 104, 1, 28, len(points))
+    struct.pack_into('<5I', data, 111, len(points), 0, 0, 0, 0)
+    struct.pack_into('<3d', data, 131, 0.01, 0.01, 0.01)
+    struct.pack_into('<6d', data, 179, max(xs), min(xs), max(ys), min(ys), 10.0, 0.0)
+    with open(path, 'wb') as f:
+        f.write(data)
+        for x, y, z, intensity, returnNumber in points:
+            record = bytearray(28)
+            struct.pack_into('<iiiHB', record, 0, round(x * 100), round(y * 100), round(z * 100),
+                             intensity, returnNumber | 0x08)
+            f.write(record)
+    return str(path)
+
+
+def files(tmp_path):
+    a = writeLas(tmp_path / 'a.las', [(0.5, 0.5, 1, 10, 1), (1.5, 0.5, 1, 20, 2), (1.5, 1.5, 1, 30, 1)])
+    b = writeLas(tmp_path / 'b.las', [(2.5, 0.5, 1, 40, 1), (3.5, 1.5, 1, 50, 1)])
+    text = tmp_path / 'notes.txt'
+    text.write_text('not a point cloud')
+    return [a, b, str(text)]
+
+
+def test_report_and_images(tmp_path):
+    names = files(tmp_path)
+    specs = [fusionCatalog.parseImageSpec('density', '1,0,10'),
+             fusionCatalog.parseImageSpec('intensity', '1,0,255')]
+    written = fusionCatalog.runCatalog(names, readHeaders(names), str(tmp_path / 'report.html'), specs, jobs=2)
+    assert written[0].endswith('report.html')
+    report = open(written[0]).read()
+    assert 'not a readable LAS file' in report
+
+    with open(str(tmp_path / 'report.csv'), newline='') as f:
+        rows = list(csv.reader(f))
+    assert [r[4] for r in rows[1:]] == ['3', '2', '']
+
+    with open(str(tmp_path / 'report_return_density.asc')) as f:
+        header = readAsciiHeader(f)
+        density = numpy.loadtxt(f)
+    assert (header['ncols'], header['nrows']) == (4, 2)
+    # rows from north to south
+    assert density.tolist() == [[0, 1, 0, 1], [1, 1, 1, 0]]
+    with open(str(tmp_path / 'report_intensity.asc')) as f:
+        readAsciiHeader(f)
+        intensity = numpy.loadtxt(f)
+    assert intensity[1].tolist() == [10, 20, 40, fusionCatalog.NODATA]
+
+
+def test_coverage_shapefile(tmp_path):
+    names = files(tmp_path)
+    path = fusionCatalog.writeCoverage(str(tmp_path / 'coverage.shp'), names, readHeaders(names))
+    data = open(path, 'rb').read()
+    code, words = struct.unpack_from('>i20xi', data, 0)
+    version, shapeType = struct.unpack_from('<ii', data, 28)
+    assert (code, version, shapeType) == (9994, 1000, 5)
+    assert words * 2 == len(data)
+    assert struct.unpack_from('<4d', data, 36) == (0.5, 0.5, 3.5, 1.5)
+
+    number, length = struct.unpack_from('>ii', data, 100)
+    shapeType, xmin, ymin, xmax, ymax, parts, points = struct.unpack_from('<i4dii', data, 108)
+    assert (number, shapeType, parts, points) == (1, 5, 1, 5)
+    assert (xmin, ymin, xmax, ymax) == (0.5, 0.5, 1.5, 1.5)
+    ring = struct.unpack_from('<10d', data, 108 + 48)
+    assert ring[:2] == ring[-2:]
+
+    shx = open(path[:-4] + '.shx', 'rb').read()
+    assert struct.unpack_from('>i20xi', shx, 0)[1] * 2 == len(shx) == 100 + 2 * 8
+    assert struct.unpack_from('>ii', shx, 108) == ((100 + 8 + length * 2) // 2, length)
+
+    dbf = open(path[:-4] + '.dbf', 'rb').read()
+    records, headerSize, recordSize = struct.unpack_from('<IHH', dbf, 4)
+    assert records == 2
+    assert len(dbf) == headerSize + records * recordSize + 1
+    second = dbf[headerSize + recordSize:headerSize + 2 * recordSize]
+    assert second[1:255].rstrip().decode() == names[1]
+    assert second[255:273].strip() == b'2'
+
+
+def test_no_coverage_without_readable_files(tmp_path):
+    assert fusionCatalog.writeCoverage(str(tmp_path / 'coverage.shp'), ['x.las'], [None]) is None
+
+
+def test_truncated_files_are_reported(tmp_path):
+    names = files(tmp_path)
+    truncated = str(tmp_path / 'truncated.las')
+    with open(names[0], 'rb') as f, open(truncated, 'wb') as g:
+        g.write(f.read()[:HEADER_SIZE + 40])
+    names.insert(1, truncated)
+    specs = [fusionCatalog.parseImageSpec('density', '1,0,10')]
+    fusionCatalog.runCatalog(names, readHeaders(names), str(tmp_path / 'report.html'), specs, jobs=2)
+    report = open(str(tmp_path / 'report.html')).read()
+    assert 'truncated.las' in report
+    with open(str(tmp_path / 'report_return_density.asc')) as f:
+        readAsciiHeader(f)
+        density = numpy.loadtxt(f)
+    # the points of the other files are counted
+    assert density.sum() == 5
+
+
+def test_decoder_errors_are_reported(tmp_path, monkeypatch):
+    path = files(tmp_path)[0]
+
+    def corrupt(path):
+        raise struct.error('unpack requires a buffer of 28 bytes')
+        yield
+
+    monkeypatch.setattr(fusionCatalog.lasPoints, 'readChunks', corrupt)
+    grid = fusionCatalog.ImageGrid(fusionCatalog.parseImageSpec('density', '1,0,10'), (0, 0, 4, 2))
+    assert fusionCatalog.fileGrids(path, [grid.description()]) == (path, None, 'unpack requires a buffer of 28 bytes')
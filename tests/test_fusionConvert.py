@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+import pytest
+
+from processing_fusion import fusionConvert, fusionDtm
+from processing_fusion.fusionTiles import readAsciiHeader
+
+
+def writeSurface(path, columns=5, rows=4):
+    """
+    Writes a DTM whose values are column * 100 + row with a void in the
+    first column of the top line, returns its header and values indexed
+    [column, row].
+    """
+    values = numpy.array([[c * 100.0 + r for r in range(rows)] for c in range(columns)], dtype=numpy.float32)
+    values[0, rows - 1] = fusionDtm.VOID
+    header = fusionDtm.DtmHeader(originX=10.0, originY=20.0, columnSpacing=2.0, pointSpacing=2.0,
+                                 columns=columns, rows=rows)
+    return fusionDtm.writeDtm(str(path), header, [values]), values
+
+
+def test_raster_lines_run_north_to_south(tmp_path):
+    header, values = writeSurface(tmp_path / 'surface.dtm')
+    lines = fusionConvert.rasterLines(values, header, 1, 3)
+    assert lines.tolist() == [[c * 100.0 + 2 for c in range(5)], [c * 100.0 + 1 for c in range(5)]]
+    assert not numpy.shares_memory(lines, values)
+
+
+def test_bands_read_at_least_a_page_of_each_column():
+    header = fusionDtm.DtmHeader(columns=1 << 22, rows=5000)
+    lines = fusionConvert.bandLines(header)
+    assert lines * header.dtype().itemsize >= fusionConvert.COLUMN_READ_BYTES
+    blocks = list(fusionConvert.lineBlocks(header))
+    assert blocks[0] == (0, lines)
+    assert blocks[-1][1] == 5000
+
+
+def readAscii(path):
+    with open(path) as f:
+        return readAsciiHeader(f), numpy.loadtxt(f, ndmin=2)
+
+
+def test_ascii_grid(tmp_path):
+    path = str(tmp_path / 'surface.dtm')
+    header, values = writeSurface(path)
+    asciiHeader, lines = readAscii(fusionConvert.dtmToAscii(path, str(tmp_path / 'surface.asc')))
+    assert (asciiHeader['ncols'], asciiHeader['nrows']) == (5, 4)
+    assert (asciiHeader['xllcorner'], asciiHeader['yllcorner']) == (10.0, 20.0)
+    assert lines[0, 0] == fusionConvert.ASCII_NODATA
+    expected = values.T[::-1].copy()
+    expected[0, 0] = fusionConvert.ASCII_NODATA
+    assert numpy.array_equal(lines, expected)
+
+
+def test_ascii_raster_with_multiplier(tmp_path):
+    path = str(tmp_path / 'surface.dtm')
+    writeSurface(path)
+    asciiHeader, lines = readAscii(fusionConvert.dtmToAscii(path, str(tmp_path / 'surface.asc'),
+                                                            mode='raster', multiplier=0.5))
+    assert (asciiHeader['xllcorner'], asciiHeader['yllcorner']) == (9.0, 19.0)
+    # voids are not multiplied
+    assert lines[0, 0] == fusionConvert.ASCII_NODATA
+    assert lines[-1, 1] == 50.0
+
+
+def test_ascii_csv(tmp_path):
+    path = str(tmp_path / 'surface.dtm')
+    writeSurface(path)
+    with open(fusionConvert.dtmToAscii(path, str(tmp_path / 'surface.csv'), mode='csv')) as f:
+        rows = [line.rstrip('\n').split(',') for line in f]
+    assert rows[0] == ['', '10.0', '12.0', '14.0', '16.0', '18.0']
+    # lines from north to south, each starting with its Y
+    assert [float(r[0]) for r in rows[1:]] == [26.0, 24.0, 22.0, 20.0]
+    assert rows[-1][1:] == ['0', '100', '200', '300', '400']
+
+
+def test_convert_in_processes(tmp_path):
+    pairs = []
+    for name in ('a', 'b', 'c'):
+        path = str(tmp_path / (name + '.dtm'))
+        writeSurface(path)
+        pairs.append((path, str(tmp_path / (name + '.asc'))))
+    pairs.append((str(tmp_path / 'missing.dtm'), str(tmp_path / 'missing.asc')))
+    written, errors = fusionConvert.convertDtms(pairs, fusionConvert.dtmToAscii, 2, processes=True,
+                                                mode='grid')
+    assert written == [target for _, target in pairs[:3]]
+    assert [dtm for dtm, error in errors] == [pairs[3][0]]
+    assert numpy.array_equal(readAscii(written[0])[1], readAscii(written[2])[1])
+
+
+def test_tiff_values_and_mask(tmp_path):
+    gdal = pytest.importorskip('osgeo.gdal')
+    path = str(tmp_path / 'surface.dtm')
+    header, values = writeSurface(path)
+    for mask in (False, True):
+        target = fusionConvert.dtmToTiff(path, str(tmp_path / 'surface{}.tif'.format(int(mask))), mask=mask)
+        band = gdal.Open(target).GetRasterBand(1)
+        lines = band.ReadAsArray()
+        if mask:
+            assert lines[0, 0] == 0 and (lines != 0).sum() == values.size - 1
+        else:
+            assert band.GetNoDataValue() == fusionDtm.VOID
+            assert numpy.array_equal(lines, values.T[::-1])
+
+
+def readPoints(path, skip=0):
+    with open(path) as f:
+        return numpy.loadtxt(f, delimiter=',' if path.endswith('.csv') else None, skiprows=skip, ndmin=2)
+
+
+def test_xyz_drops_voids(tmp_path):
+    path = str(tmp_path / 'surface.dtm')
+    header, values = writeSurface(path)
+    points = readPoints(fusionConvert.dtmToXyz(path, str(tmp_path / 'surface.xyz')))
+    assert len(points) == values.size - 1
+    # in the order of the file, column by column from south to north
+    assert points[:3].tolist() == [[10.0, 20.0, 0.0], [10.0, 22.0, 1.0], [10.0, 24.0, 2.0]]
+    assert points[3].tolist() == [12.0, 20.0, 100.0]
+
+
+def test_xyz_csv_with_voids(tmp_path):
+    path = str(tmp_path / 'surface.dtm')
+    header, values = writeSurface(path)
+    target = fusionConvert.dtmToXyz(path, str(tmp_path / 'surface.csv'), csv=True, voids=True)
+    with open(target) as f:
+        assert f.readline() == 'X,Y,Z\n'
+    points = readPoints(target, skip=1)
+    assert len(points) == values.size
+    assert points[3].tolist() == [10.0, 26.0, fusionConvert.ASCII_NODATA]
+
+    target = fusionConvert.dtmToXyz(path, str(tmp_path / 'bare.csv'), csv=True, header=False)
+    assert len(readPoints(target)) == values.size - 1
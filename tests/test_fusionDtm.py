@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import os
+import xml.etree.ElementTree as ElementTree
+
+import numpy
+import pytest
+
+from processing_fusion import fusionDtm
+
+
+def grid(columns=4, rows=3):
+    """
+    Values indexed [column, row] with a void and a value below zero.
+    """
+    values = numpy.arange(columns * rows, dtype=numpy.float32).reshape((columns, rows)) + 10
+    values[1, 2] = fusionDtm.VOID
+    values[2, 0] = -3.5
+    return values
+
+
+def header(values, **kwargs):
+    return fusionDtm.DtmHeader(originX=100.0, originY=200.0, columnSpacing=2.0, pointSpacing=2.0,
+                               columns=values.shape[0], rows=values.shape[1], **kwargs)
+
+
+def test_write_and_read(tmp_path):
+    values = grid()
+    path = str(tmp_path / 'surface.dtm')
+    written = fusionDtm.writeDtm(path, header(values), [values[:2], values[2:]])
+    assert (written.minZ, written.maxZ) == (-3.5, 21.0)
+    assert os.path.getsize(path) == fusionDtm.HEADER_SIZE + values.size * 4
+
+    read = fusionDtm.readHeader(path)
+    assert (read.columns, read.rows, read.originX, read.minZ) == (4, 3, 100.0, -3.5)
+    assert numpy.array_equal(fusionDtm.openValues(path)[1], values)
+    assert numpy.array_equal(fusionDtm.readColumns(path, read, 1, 3), values[1:3])
+
+
+def test_write_checks_the_columns(tmp_path):
+    values = grid()
+    with pytest.raises(ValueError):
+        fusionDtm.writeDtm(str(tmp_path / 'short.dtm'), header(values), [values[:3]])
+    with pytest.raises(ValueError):
+        fusionDtm.writeDtm(str(tmp_path / 'rows.dtm'), header(values), [values[:, :2]])
+
+
+def test_create_and_finish(tmp_path):
+    values = grid()
+    path = str(tmp_path / 'created.dtm')
+    dtmHeader = header(values)
+    created = fusionDtm.createDtm(path, dtmHeader)
+    assert (created == fusionDtm.VOID).all()
+    created[1:3] = values[1:3]
+    finished = fusionDtm.finishDtm(path, dtmHeader, created)
+    del created
+    assert (finished.minZ, finished.maxZ) == (-3.5, 18.0)
+    assert fusionDtm.readHeader(path).maxZ == 18.0
+
+
+def test_short_file_is_rejected(tmp_path):
+    values = grid()
+    path = str(tmp_path / 'short.dtm')
+    with open(path, 'wb') as f:
+        f.write(header(values).pack())
+    with pytest.raises(ValueError):
+        fusionDtm.openValues(path)
+
+
+def test_voids_are_the_void_value():
+    values = grid()
+    mask = fusionDtm.voidMask(values)
+    assert mask.sum() == 1 and mask[1, 2]
+    assert fusionDtm.valueRange(values) == (-3.5, 21.0)
+    assert fusionDtm.valueRange(numpy.full((2, 2), fusionDtm.VOID)) is None
+
+
+@pytest.mark.parametrize('datum,zone,units,srs', [(1, 10, 1, 'EPSG:26710'),
+                                                  (1, 22, 1, 'EPSG:26722'),
+                                                  (1, 23, 1, None),
+                                                  (2, 23, 1, 'EPSG:26923'),
+                                                  (2, 24, 1, None),
+                                                  (2, 10, 0, None),
+                                                  (3, 10, 1, None)])
+def test_header_srs(datum, zone, units, srs):
+    dtmHeader = fusionDtm.DtmHeader(coordinateSystem=1, horizontalDatum=datum, zone=zone, planUnits=units)
+    assert fusionDtm.headerSrs(dtmHeader) == srs
+    assert fusionDtm.headerSrs(fusionDtm.DtmHeader(coordinateSystem=0, horizontalDatum=2, zone=10,
+                                                   planUnits=1)) is None
+
+
+def test_vrt_maps_the_values(tmp_path):
+    values = grid()
+    path = str(tmp_path / 'surface.dtm')
+    fusionDtm.writeDtm(path, header(values, coordinateSystem=1, horizontalDatum=2, zone=10, planUnits=1), [values])
+    vrt = ElementTree.parse(fusionDtm.writeVrt(path)).getroot()
+    assert (vrt.get('rasterXSize'), vrt.get('rasterYSize')) == ('4', '3')
+    assert vrt.findtext('SRS') == 'EPSG:26910'
+    geoTransform = [float(v) for v in vrt.findtext('GeoTransform').split(',')]
+    # the top left corner is half a cell from the north west grid node
+    assert geoTransform == [99.0, 2.0, 0.0, 205.0, 0.0, -2.0]
+
+    band = vrt.find('VRTRasterBand')
+    assert band.findtext('SourceFilename') == 'surface.dtm'
+    assert float(band.findtext('NoDataValue')) == fusionDtm.VOID
+    imageOffset = int(band.findtext('ImageOffset'))
+    pixelOffset = int(band.findtext('PixelOffset'))
+    lineOffset = int(band.findtext('LineOffset'))
+
+    # read the raster through the offsets like GDAL does
+    data = open(path, 'rb').read()
+    lines = numpy.array([[numpy.frombuffer(data, numpy.float32, 1, imageOffset + line * lineOffset + pixel * pixelOffset)[0]
+                          for pixel in range(4)] for line in range(3)])
+    assert numpy.array_equal(lines, values.T[::-1])
+
+
+def test_vrt_elsewhere_uses_the_absolute_path(tmp_path):
+    values = grid()
+    path = str(tmp_path / 'surface.dtm')
+    fusionDtm.writeDtm(path, header(values), [values])
+    band = ElementTree.fromstring(fusionDtm.vrtXml(path, relative=False)).find('VRTRasterBand')
+    assert band.findtext('SourceFilename') == os.path.abspath(path)
+    assert band.find('SourceFilename').get('relativeToVRT') == '0'
+    assert ElementTree.fromstring(fusionDtm.vrtXml(path)).find('SRS') is None
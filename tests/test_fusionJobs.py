@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of fusionJobs. Needs the QGIS Python bindings, the tests are
+skipped without them.
+"""
+
+import pytest
+
+pytest.importorskip('qgis.core')
+
+from processing_fusion.fusionJobs import FusionJobExecutor, JobExecutor  # noqa: E402
+
+
+def test_executors_must_submit():
+    class Incomplete(JobExecutor):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    with pytest.raises(TypeError):
+        JobExecutor()
+    FusionJobExecutor(maxJobs=1).shutdown()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from processing_fusion import fusionLauncher
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason='Wine paths are converted on POSIX hosts')
+
+
+def listFile(tmp_path):
+    names = [tmp_path / 'a.las', tmp_path / 'b.las']
+    for name in names:
+        name.write_bytes(b'LASF')
+    path = tmp_path / 'inputs.txt'
+    path.write_text('\n'.join(str(n) for n in names))
+    return path
+
+
+def test_wine_list_files_are_converted_in_the_temporary_folder(tmp_path):
+    path = listFile(tmp_path)
+    wine = fusionLauncher.WineRuntime('wine')
+    argv, env, temporary = fusionLauncher.launchArguments(['"C:\\FUSION\\Tool.exe"', '/verbose', str(path)], wine)
+    assert argv[:3] == ['wine', 'C:\\FUSION\\Tool.exe', '/verbose']
+    assert len(temporary) == 1
+    assert argv[3] == 'Z:' + temporary[0].replace('/', '\\')
+    assert os.path.dirname(temporary[0]) != str(tmp_path)
+    assert sorted(os.listdir(str(tmp_path))) == ['a.las', 'b.las', 'inputs.txt']
+    with open(temporary[0], encoding='utf-8') as f:
+        assert f.read().split('\n') == ['Z:' + str(tmp_path / n).replace('/', '\\') for n in ('a.las', 'b.las')]
+    fusionLauncher.removeTemporary(temporary)
+    assert not os.path.exists(temporary[0])
+
+
+def test_launch_removes_the_temporary_files(tmp_path):
+    path = listFile(tmp_path)
+    # echo stands in for wine, the runtime is taken as started
+    wine = fusionLauncher.WineRuntime('echo')
+    wine.warmed = True
+    with fusionLauncher.launch(['Tool.exe', str(path)], wine, stdout=fusionLauncher.subprocess.PIPE,
+                               universal_newlines=True) as proc:
+        converted = proc.stdout.read().split()[-1]
+    assert proc.returncode == 0
+    assert converted.startswith('Z:\\')
+    assert not os.path.exists(converted[2:].replace('\\', '/'))
+
+
+def test_native_arguments_are_kept(tmp_path):
+    path = listFile(tmp_path)
+    argv, env, temporary = fusionLauncher.launchArguments(['"/opt/fusion/Tool"', str(path)],
+                                                          fusionLauncher.NativeRuntime())
+    assert argv == ['/opt/fusion/Tool', str(path)]
+    assert env is None and temporary == []
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+from processing_fusion import fusionMemory
+from processing_fusion.fusionMemory import LIMIT_32, MB
+
+
+def test_small_runs_use_the_32_bit_build():
+    plan = fusionMemory.plan('canopymodel', 1000000, 10000, available=8192 * MB)
+    assert not plan.use64
+    assert plan.pieces == 1
+
+
+def test_large_runs_use_the_64_bit_build():
+    points = 2 * LIMIT_32 // 16
+    plan = fusionMemory.plan('canopymodel', points, 0, available=64 * 1024 * MB)
+    assert plan.use64
+    assert plan.pieces == 1
+
+
+def test_runs_beyond_the_available_memory_need_pieces():
+    points = 4096 * MB // 16
+    plan = fusionMemory.plan('canopymodel', points, 0, available=1024 * MB)
+    assert plan.use64
+    assert plan.pieces > 1
+    assert 'pieces' in plan.describe()
+
+
+def test_only_32_bit_installed():
+    points = LIMIT_32 // 16
+    plan = fusionMemory.plan('canopymodel', points, 0, has64=False, available=64 * 1024 * MB)
+    assert not plan.use64
+    assert plan.pieces == 2
+
+
+def test_grid_cells():
+    assert fusionMemory.gridCells((0, 0, 10, 20), 1) == 11 * 21
+    assert fusionMemory.gridCells(None, 1) == 0
+    assert fusionMemory.gridCells((0, 0, 10, 20), 0) == 0
+
+
+def runRecord(bytesPerPoint, wall=10.0, **values):
+    record = {'tool': 'gridmetrics', 'points': 1000000, 'cells': 0, 'wall': wall,
+              'peakRss': fusionMemory.BASE_MEMORY + bytesPerPoint * 1000000}
+    record.update(values)
+    return record
+
+
+def test_measured_bytes_per_point():
+    records = [runRecord(60)] * 3
+    perPoint, perCell, measured = fusionMemory.memoryProfile('gridmetrics', records)
+    assert measured
+    assert perPoint == 60
+    assert not fusionMemory.memoryProfile('gridmetrics', records[:2])[2]
+
+
+def test_measured_bytes_per_point_only_raise_the_profile():
+    perPoint, perCell, measured = fusionMemory.memoryProfile('gridmetrics', [runRecord(20)] * 3)
+    assert measured
+    assert perPoint == fusionMemory.MEMORY_PROFILES['gridmetrics'][0]
+
+
+def test_runs_without_a_known_peak_are_not_measured():
+    records = [runRecord(60, wall=0.3), runRecord(60, cached=True), runRecord(60, peakRss=0),
+               runRecord(60, peakRss=None), runRecord(60), runRecord(60)]
+    assert fusionMemory.measuredBytesPerPoint('gridmetrics', records) is None
+
+
+def test_grid_file_cells(tmp_path):
+    path = tmp_path / 'surface.asc'
+    path.write_text('ncols 30\nnrows 20\nxllcorner 0\n')
+    assert fusionMemory.gridFileCells(str(path)) == 600
+    assert fusionMemory.gridFileCells(str(tmp_path / 'missing.asc')) == 0
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+from processing_fusion.fusionProgress import ProgressParser, progressParser, splitCommands, toolName
+
+
+def test_percentage_lines_are_progress():
+    parser = ProgressParser()
+    assert parser.parse('10%\n') == 10.0
+    assert parser.parse('  45% complete\n') == 45.0
+    assert parser.parse('Progress: 60.5%\n') == 60.5
+
+
+def test_percentages_in_text_are_not_progress():
+    parser = ProgressParser()
+    assert parser.parse('95% cover computed for 12 cells\n') is None
+    assert parser.parse('Percentile 95%: 12.3\n') is None
+    assert parser.parse('Height break 2.0 (95%)\n') is None
+
+
+def test_percentage_is_scaled_into_file_slot():
+    parser = ProgressParser()
+    assert parser.parse('Reading file 2 of 4\n') == 25.0
+    assert parser.parse('50%\n') == 37.5
+
+
+def test_groundfilter_counts_iterations():
+    parser = progressParser(['"C:/FUSION/GroundFilter64.exe"', '/iterations:4', 'out.las', '5', 'in.las'])
+    assert parser.parse('Iteration 3\n') == 50.0
+
+
+def test_split_and_tool_name():
+    commands = ['"C:/Program Files/FUSION/GridMetrics.exe"', '/ascii /raster:cover', '"a b.las"']
+    assert toolName(commands) == 'gridmetrics'
+    assert splitCommands(commands) == ['C:/Program Files/FUSION/GridMetrics.exe', '/ascii', '/raster:cover', 'a b.las']
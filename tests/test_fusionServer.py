@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runs a job server and its workers on localhost. Needs the QGIS Python
+bindings, the test is skipped without them.
+"""
+
+import os
+import stat
+
+import pytest
+
+pytest.importorskip('qgis.core')
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason='the fake FUSION tool is a shell script')
+
+from qgis.core import QgsProcessingFeedback  # noqa: E402
+
+from processing_fusion.fusionServer import FusionWorker, JobServer, RemoteExecutor, runWorkers  # noqa: E402
+
+TOKEN = 'secret'
+
+
+class ConsoleLog(QgsProcessingFeedback):
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def pushConsoleInfo(self, info):
+        self.lines.append(info)
+
+
+@pytest.fixture
+def fusionDirectory(tmp_path):
+    tool = tmp_path / 'Tool.exe'
+    tool.write_text('#!/bin/sh\necho "ran $1"\necho "50%"\necho "100%"\nexit "$2"\n')
+    tool.chmod(tool.stat().st_mode | stat.S_IXUSR)
+    return str(tmp_path)
+
+
+@pytest.fixture
+def server():
+    server = JobServer('127.0.0.1', 0, TOKEN)
+    server.start()
+    yield server
+    server.stop()
+
+
+def startWorkers(server, fusionDirectory, jobs=1):
+    host, port = server.address()[:2]
+    return runWorkers(host, port, TOKEN, jobs, fusionDirectory)
+
+
+def test_jobs_run_on_workers(server, fusionDirectory):
+    workers = startWorkers(server, fusionDirectory, 2)
+    try:
+        feedback = ConsoleLog()
+        with RemoteExecutor(server, feedback) as executor:
+            jobs = [executor.submit(['"C:\\FUSION\\Tool.exe"', str(i), '0']) for i in range(4)]
+            executor.gather()
+        assert [job.returnCode for job in jobs] == [0, 0, 0, 0]
+        for job in jobs:
+            assert any(line.startswith('[{}] ran'.format(job.label)) for line in feedback.lines)
+    finally:
+        for worker in workers:
+            worker.stop()
+
+
+def test_failures_are_reported_and_the_worker_survives(server, fusionDirectory):
+    workers = startWorkers(server, fusionDirectory)
+    try:
+        with RemoteExecutor(server) as executor:
+            missing = executor.submit(['"Missing.exe"'])
+            failed = executor.submit(['"Tool.exe"', 'x', '3'])
+            ok = executor.submit(['"Tool.exe"', 'y', '0'])
+            with pytest.raises(Exception):
+                executor.gather()
+        assert 'Missing.exe' in missing.failure()
+        assert failed.failure() == 'exit code 3'
+        assert ok.succeeded()
+    finally:
+        for worker in workers:
+            worker.stop()
+
+
+def test_wrong_token_is_refused(server, fusionDirectory):
+    host, port = server.address()[:2]
+    worker = FusionWorker(host, port, 'wrong', fusionDirectory)
+    with pytest.raises(ConnectionError):
+        worker.connect()
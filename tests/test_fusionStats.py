@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import subprocess
+import sys
+
+import pytest
+
+from processing_fusion import fusionStats
+
+MB = 1024 * 1024
+# allocates and touches 200 MB for a moment, far shorter than a sample interval
+ALLOCATE = 'data = bytearray({}); data[::4096] = b"x" * len(data[::4096])'.format(200 * MB)
+
+
+@pytest.mark.skipif(not hasattr(fusionStats.os, 'wait4'), reason='the peak comes from wait4() on POSIX')
+def test_peak_of_a_short_run():
+    proc = subprocess.Popen([sys.executable, '-c', ALLOCATE])
+    monitor = fusionStats.ResourceMonitor(proc.pid)
+    monitor.sample()
+    assert monitor.wait(proc) == 0
+    record = monitor.result()
+    assert record['peakRss'] >= 200 * MB
+    assert record['userCpu'] is not None and record['systemCpu'] is not None
+
+
+def test_exit_code_of_a_failed_run():
+    proc = subprocess.Popen([sys.executable, '-c', 'raise SystemExit(3)'])
+    monitor = fusionStats.ResourceMonitor(proc.pid)
+    assert monitor.wait(proc) == 3
+    assert proc.wait() == 3
+
+
+def test_unknown_peak_is_not_zero():
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    # the process is gone before it was sampled
+    monitor = fusionStats.ResourceMonitor(proc.pid)
+    monitor.sample(force=True)
+    assert monitor.wait(proc) == 0
+    assert monitor.result()['peakRss'] is None
+
+
+def test_records_are_appended(tmp_path):
+    path = str(tmp_path / 'runs.jsonl')
+    fusionStats.recordRun(path, {'tool': 'gridmetrics', 'points': 10})
+    fusionStats.recordRun(path, {'tool': 'cover', 'points': 20})
+    assert [r['tool'] for r in fusionStats.readRuns(path)] == ['gridmetrics', 'cover']
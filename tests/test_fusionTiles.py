@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import os
+
+import numpy
+import pytest
+
+from processing_fusion import fusionDtm, fusionTiles
+from processing_fusion.lasHeader import LasHeader
+
+# product of 95 x 75 cells of 1 unit, cut into tiles of 30 cells with a
+# buffer of 3 cells
+BOUNDS = (0.0, 0.0, 95.0, 75.0)
+BUFFER = 3
+
+
+def cellValue(column, row):
+    return float(column * 1000 + row)
+
+
+def tileRun(grid, tile):
+    """
+    Lattice columns and rows a FUSION run over the buffered tile writes,
+    clipped to the extent of the product like the data.
+    """
+    columns = (max(tile.columns[0] - BUFFER, grid.cellColumns[0]), min(tile.columns[1] + BUFFER, grid.cellColumns[1]))
+    rows = (max(tile.rows[0] - BUFFER, grid.cellRows[0]), min(tile.rows[1] + BUFFER, grid.cellRows[1]))
+    return columns, rows
+
+
+def runTiles(tmp_path, write):
+    """
+    Writes the output of every tile with write(grid, columns, rows, path)
+    and returns the grid and the (tile, path) parts.
+    """
+    grid = fusionTiles.TileGrid(BOUNDS, 1.0, 30.0)
+    parts = []
+    for tile in grid.tiles():
+        columns, rows = tileRun(grid, tile)
+        directory = tmp_path / tile.name()
+        directory.mkdir()
+        path = str(directory / 'out')
+        parts.append((tile, write(grid, columns, rows, path)))
+    return grid, parts
+
+
+def writeTable(path, columns, rows, topDown, base):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['row', 'col', 'center X', 'center Y', 'value'])
+        for row in range(rows[1] - 1, rows[0] - 1, -1):
+            for column in range(*columns):
+                number = base + (rows[1] - 1 - row if topDown else row - rows[0])
+                writer.writerow([number, base + column - columns[0], column + 0.5, row + 0.5,
+                                 cellValue(column, row)])
+    return path
+
+
+def readTable(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+@pytest.mark.parametrize('topDown,base', [(True, 1), (False, 0)])
+def test_stitch_csv(tmp_path, topDown, base):
+    grid, parts = runTiles(tmp_path, lambda grid, columns, rows, path:
+                           writeTable(path + '.csv', columns, rows, topDown, base))
+    target = str(tmp_path / 'stitched.csv')
+    fusionTiles.stitchCsv(grid, parts, target)
+    single = writeTable(str(tmp_path / 'single.csv'), grid.cellColumns, grid.cellRows, topDown, base)
+    stitched = readTable(target)
+    expected = readTable(single)
+    if not topDown:
+        # bottom-up tables are stitched from south to north
+        expected = expected[:1] + sorted(expected[1:], key=lambda r: (int(r[0]), int(r[1])))
+    assert stitched == expected
+
+
+def test_csv_numbering_is_streamed(tmp_path):
+    grid, parts = runTiles(tmp_path, lambda grid, columns, rows, path:
+                           writeTable(path + '.csv', columns, rows, True, 1))
+
+    def cells(path):
+        for r in fusionTiles.csvRows(path):
+            yield grid.cellColumn(float(r[2])), grid.cellRow(float(r[3])), float(r[2]), float(r[3]), r
+
+    # generators are consumed once, nothing is collected
+    numbering = fusionTiles.csvNumbering(grid, (cells(path) for tile, path in parts), 0, 1)
+    assert numbering == {'colBase': 1, 'rowBase': 1, 'topDown': True,
+                         'minColumn': 0, 'minRow': 0, 'maxRow': 74}
+
+
+def writeAscii(path, columns, rows):
+    values = numpy.array([[cellValue(c, r) for c in range(*columns)] for r in range(rows[1] - 1, rows[0] - 1, -1)])
+    with open(path, 'w') as f:
+        f.write('ncols {}\nnrows {}\n'.format(columns[1] - columns[0], rows[1] - rows[0]))
+        f.write('xllcorner {}\nyllcorner {}\ncellsize 1\nNODATA_value -9999\n'.format(columns[0], rows[0]))
+        numpy.savetxt(f, values, fmt='%.9g')
+    return path
+
+
+def test_stitch_ascii(tmp_path):
+    grid, parts = runTiles(tmp_path, lambda grid, columns, rows, path: writeAscii(path + '.asc', columns, rows))
+    target = str(tmp_path / 'stitched.asc')
+    fusionTiles.stitchAscii(grid, parts, target)
+    single = writeAscii(str(tmp_path / 'single.asc'), grid.cellColumns, grid.cellRows)
+    with open(target) as f:
+        header = fusionTiles.readAsciiHeader(f)
+        values = numpy.loadtxt(f)
+    with open(single) as f:
+        expected = fusionTiles.readAsciiHeader(f)
+        expectedValues = numpy.loadtxt(f)
+    assert header == expected
+    assert numpy.array_equal(values, expectedValues)
+
+
+def writeTileDtm(path, columns, rows):
+    header = fusionDtm.DtmHeader(originX=columns[0] + 0.5, originY=rows[0] + 0.5,
+                                 columns=columns[1] - columns[0], rows=rows[1] - rows[0])
+    values = numpy.array([[cellValue(c, r) for r in range(*rows)] for c in range(*columns)])
+    fusionDtm.writeDtm(path, header, [values])
+    return path
+
+
+def test_stitch_dtm(tmp_path):
+    grid, parts = runTiles(tmp_path, lambda grid, columns, rows, path: writeTileDtm(path + '.dtm', columns, rows))
+    target = str(tmp_path / 'stitched.dtm')
+    fusionTiles.stitchDtm(grid, parts, target)
+    single = writeTileDtm(str(tmp_path / 'single.dtm'), grid.cellColumns, grid.cellRows)
+    with open(target, 'rb') as f, open(single, 'rb') as g:
+        assert f.read() == g.read()
+
+
+def test_stitch_outputs_by_name(tmp_path):
+    grid, parts = runTiles(tmp_path, lambda grid, columns, rows, path: writeAscii(path + '.asc', columns, rows))
+    for tile, path in parts:
+        with open(os.path.join(os.path.dirname(path), 'notes.txt'), 'w') as f:
+            f.write(tile.name())
+    output = tmp_path / 'output'
+    output.mkdir()
+    written = fusionTiles.stitchOutputs(grid, [t for t, p in parts], [os.path.dirname(p) for t, p in parts],
+                                        str(output))
+    assert sorted(os.path.basename(p) for p in written) == ['notes.txt', 'out.asc']
+    assert (output / 'notes.txt').read_text() == parts[0][0].name()
+
+
+def test_tile_grid_is_aligned_to_the_origin():
+    grid = fusionTiles.TileGrid((12.3, 7.9, 80.0, 50.0), 2.0, 22.5, originX=1.0, originY=1.0)
+    assert grid.tileSize == 22.0
+    assert (grid.originX - 1.0) % 22.0 == 0 and grid.originX <= 12.3
+    assert (grid.originY - 1.0) % 22.0 == 0 and grid.originY <= 7.9
+    tiles = grid.tiles()
+    assert len(tiles) == grid.columns * grid.rows
+    # tiles come from north to south
+    assert tiles[0].ymin > tiles[-1].ymin
+
+
+def test_quadtree_size_splits_evenly():
+    size = fusionTiles.quadtreeSize((0, 0, 1000, 300), 1.0, minCells=25)
+    assert size == 1600.0
+    assert fusionTiles.quadtreeSize((0, 0, 10, 10), 1.0, minCells=25) == 25.0
+
+
+def header(bounds, points):
+    return LasHeader('1.2', 1, 28, points, (points, 0, 0, 0, 0), (0.01, 0.01, 0.01), (0, 0, 0),
+                     bounds[0], bounds[1], 0.0, bounds[2], bounds[3], 10.0, False)
+
+
+def test_balanced_tiles():
+    # a dense file in the south west corner of a sparse extent
+    headers = [header((0, 0, 400, 400), 4000), header((0, 0, 100, 100), 1000000), None]
+    size = fusionTiles.quadtreeSize((0, 0, 400, 400), 1.0)
+    grid = fusionTiles.TileGrid((0, 0, 400, 400), 1.0, size)
+    leaves = fusionTiles.balancedTiles(grid, grid.tiles(), headers, 0,
+                                       lambda points, cells: points > 100000)
+    # leaves are split until they are small enough or minimal, and they
+    # cover the product without overlapping
+    assert all(t.points <= 100000 or t.columns[1] - t.columns[0] < 2 * fusionTiles.QUADTREE_MIN_CELLS
+               for t in leaves)
+    covered = numpy.zeros((grid.cellColumns[1], grid.cellRows[1]), dtype=int)
+    for t in leaves:
+        columns = grid.coreColumns(t)
+        rows = grid.coreRows(t)
+        covered[columns[0]:columns[1], rows[0]:rows[1]] += 1
+    assert covered.max() == 1 and covered.min() == 1
+    assert leaves == sorted(leaves, key=lambda t: -t.points)
+    assert min(t.width() for t in leaves) < max(t.width() for t in leaves)
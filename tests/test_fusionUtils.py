@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of fusionUtils. Needs the QGIS Python bindings, the tests are
+skipped without them.
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip('qgis.core')
+
+from processing_fusion import fusionUtils  # noqa: E402
+
+
+def test_merge_uses_the_only_mergedata_build(monkeypatch, tmp_path):
+    monkeypatch.setattr(fusionUtils, 'fusionDirectory', lambda: str(tmp_path))
+    parts = [str(tmp_path / 'a.las'), str(tmp_path / 'b.las')]
+    commands = fusionUtils.mergeCommands(parts, str(tmp_path / 'merged.las'))
+    assert commands[0] == '"' + os.path.join(str(tmp_path), 'MergeData.exe') + '"'
+    assert commands[-1] == '"{}"'.format(tmp_path / 'merged.las')
+    with open(commands[1], encoding='utf-8') as f:
+        assert f.read().split('\n') == parts
+
+
+def test_merge_of_a_single_part(monkeypatch, tmp_path):
+    monkeypatch.setattr(fusionUtils, 'fusionDirectory', lambda: str(tmp_path))
+    commands = fusionUtils.mergeCommands(['a.las'], 'merged.las')
+    assert commands[1:] == ['"a.las"', '"merged.las"']
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+
+from processing_fusion.lasCatalog import LasCatalog
+from processing_fusion.lasHeader import HEADER_SIZE, HEADER_SIZE_14, headerBounds, readHeader, readHeaders
+
+
+def lasHeader(bounds, pointCount, version=(1, 2), pointFormat=1):
+    """
+    Public header block of a LAS file without points.
+    """
+    size = HEADER_SIZE_14 if version >= (1, 4) else HEADER_SIZE
+    data = bytearray(size)
+    data[:4] = b'LASF'
+    struct.pack_into('<BB', data, 24, *version)
+    struct.pack_into('<H', data, 94, size)
+    legacyCount = pointCount if version < (1, 4) else 0
+    struct.pack_into('<BHI', data, 104, pointFormat, 28, legacyCount)
+    struct.pack_into('<5I', data, 111, legacyCount, 0, 0, 0, 0)
+    struct.pack_into('<3d', data, 131, 0.01, 0.01, 0.01)
+    xmin, ymin, xmax, ymax = bounds
+    struct.pack_into('<6d', data, 179, xmax, xmin, ymax, ymin, 100.0, 0.0)
+    if version >= (1, 4):
+        struct.pack_into('<Q', data, 247, pointCount)
+        struct.pack_into('<Q', data, 255, pointCount)
+    return bytes(data)
+
+
+def writeLas(path, bounds, pointCount, **kwargs):
+    with open(path, 'wb') as f:
+        f.write(lasHeader(bounds, pointCount, **kwargs))
+    return str(path)
+
+
+def test_read_header(tmp_path):
+    header = readHeader(writeLas(tmp_path / 'a.las', (10, 20, 110, 220), 5000))
+    assert header.version == '1.2'
+    assert header.pointCount == 5000
+    assert (header.minX, header.minY, header.maxX, header.maxY) == (10, 20, 110, 220)
+    assert not header.compressed
+
+
+def test_las_14_counts_and_laz_flag(tmp_path):
+    path = writeLas(tmp_path / 'a.laz', (0, 0, 1, 1), 2 ** 33, version=(1, 4), pointFormat=6 | 0x80)
+    header = readHeader(path)
+    assert header.pointCount == 2 ** 33
+    assert header.pointFormat == 6
+    assert header.compressed
+
+
+def test_unreadable_files_have_no_header(tmp_path):
+    text = tmp_path / 'notes.txt'
+    text.write_text('not a point cloud')
+    assert readHeaders([str(text), str(tmp_path / 'missing.las')]) == [None, None]
+
+
+def test_header_bounds(tmp_path):
+    headers = readHeaders([writeLas(tmp_path / 'a.las', (0, 0, 10, 10), 1),
+                           writeLas(tmp_path / 'b.las', (5, -5, 20, 8), 1)])
+    assert headerBounds(headers) == (0, -5, 20, 10)
+    assert headerBounds([]) is None
+
+
+def test_catalog(tmp_path):
+    a = writeLas(tmp_path / 'a.las', (0, 0, 10, 10), 100)
+    b = writeLas(tmp_path / 'b.las', (10, 0, 20, 10), 200)
+    other = writeLas(tmp_path / 'other.las', (100, 100, 110, 110), 300)
+    catalog = LasCatalog(str(tmp_path / 'catalog.sqlite'))
+    try:
+        assert catalog.update([a, b, other]) == 3
+        assert catalog.update([a, b]) == 0
+        assert catalog.intersecting((12, 2, 15, 5), [a, b, other]) == [b]
+        assert catalog.bounds([a, b]) == (0, 0, 20, 10)
+        assert set(catalog.headers([a])) == {os.path.normcase(os.path.abspath(a))}
+
+        writeLas(a, (0, 0, 5, 5), 50)
+        os.utime(a, ns=(0, 0))
+        os.remove(other)
+        assert catalog.update([a, b, other]) == 1
+        assert catalog.header(a).pointCount == 50
+        assert catalog.header(other) is None
+    finally:
+        catalog.close()